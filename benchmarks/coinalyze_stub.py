@@ -0,0 +1,191 @@
+import json
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Bar length of every interval the stand-in serves.
+_INTERVAL_SECONDS = {
+    '1min': 60, '5min': 300, '15min': 900, '30min': 1800, '1hour': 3600,
+    '2hour': 7200, '4hour': 14400, '6hour': 21600, '12hour': 43200, 'daily': 86400,
+}
+
+
+def _ohlc(o: float, c: float) -> dict:
+    return {'o': o, 'h': max(o, c) * 1.01, 'l': min(o, c) * 0.99, 'c': c}
+
+
+# endpoint -> bar(t, open, close) for every history endpoint the stub serves
+_HISTORY_BARS = {
+    'ohlcv-history': lambda t, o, c: {
+        't': t, **_ohlc(o, c),
+        'v': 1000.0 + t % 97, 'bv': 500.0 + t % 89, 'tx': 100 + t % 13, 'btx': 50 + t % 7,
+    },
+    'open-interest-history': lambda t, o, c: {'t': t, **_ohlc(o * 1e4, c * 1e4)},
+    'funding-rate-history': lambda t, o, c: {'t': t, **_ohlc(o * 1e-5, c * 1e-5)},
+    'predicted-funding-rate-history': lambda t, o, c: {'t': t, **_ohlc(c * 1e-5, o * 1e-5)},
+    'liquidation-history': lambda t, o, c: {'t': t, 'l': 100.0 + t % 31, 's': 80.0 + t % 29},
+    'long-short-ratio-history': lambda t, o, c: {'t': t, 'r': o / c, 'l': 50.0 + t % 7, 's': 50.0 - t % 7},
+}
+
+
+@dataclass
+class StubConfig:
+    """
+    Shape of the fake Coinalyze universe and the faults to inject.
+
+    `symbols_per_exchange` perpetual USDT markets are listed on each of the
+    Binance ('A') and Hyperliquid ('H') venues, each with `history_bars` bars
+    ending at the current bar. Every request waits `latency_ms` (+/- jitter),
+    and fails with a 429 (with `Retry-After: retry_after`) or a 500 with the
+    given probabilities.
+    """
+    symbols_per_exchange: int = 300
+    history_bars: int = 2000
+    max_points: int = 2000
+    latency_ms: float = 50.0
+    latency_jitter_ms: float = 10.0
+    error_429_rate: float = 0.0
+    retry_after: float = 1.0
+    error_500_rate: float = 0.0
+    seed: int = 0
+
+
+class CoinalyzeStub:
+    """
+    Local HTTP stand-in implementing the `future-markets` endpoint and the
+    `*-history` endpoints, used to benchmark the adapter and refresh jobs offline.
+
+    Usage:
+        with CoinalyzeStub(StubConfig(latency_ms=20)) as stub:
+            os.environ['COINALYZE_BASE_URL'] = stub.base_url
+    """
+
+    def __init__(self, config: StubConfig = None, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.config = config or StubConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'ok': 0, '429': 0, '500': 0, 'bytes': 0}
+        self.markets = [
+            {
+                'symbol': f'C{i:04d}USDT_PERP.{exchange}',
+                'exchange': exchange,
+                'symbol_on_exchange': f'C{i:04d}USDT',
+                'base_asset': f'C{i:04d}',
+                'quote_asset': 'USDT',
+                'is_perpetual': True,
+                'margined': 'STABLE',
+                'expire_at': None,
+                'has_long_short_ratio_data': True,
+                'has_ohlcv_data': True,
+                'has_buy_sell_data': True,
+            }
+            for exchange in ('A', 'H')
+            for i in range(self.config.symbols_per_exchange)
+        ]
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='coinalyze-stub', daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1/'
+
+    def start(self) -> 'CoinalyzeStub':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'CoinalyzeStub':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += n
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def history(self, endpoint: str, symbols, interval: str, from_t: int, to_t: int):
+        """
+        Deterministic bars of any supported `*-history` endpoint, derived from a synthetic price path.
+        """
+        step = _INTERVAL_SECONDS[interval]
+        last_t = int(time.time()) // step * step
+        first_t = last_t - (self.config.history_bars - 1) * step
+        start = max(from_t, first_t)
+        start = -(-start // step) * step
+        end = min(to_t, last_t)
+        ts = list(range(start, end + 1, step))[-self.config.max_points:]
+        make_bar = _HISTORY_BARS[endpoint]
+        out = []
+        for symbol in symbols:
+            base = 1 + zlib.crc32(symbol.encode()) % 1000
+            history = []
+            for t in ts:
+                o = base * (1 + 0.01 * ((t // step) % 17))
+                c = o * (1 + 0.002 * ((t // step) % 5 - 2))
+                history.append(make_bar(t, o, c))
+            out.append({'symbol': symbol, 'history': history})
+        return out
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body, headers: dict = None) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                stub._count('bytes', len(payload))
+
+            def do_GET(self) -> None:
+                config = stub.config
+                stub._count('requests')
+                delay = config.latency_ms + config.latency_jitter_ms * (2 * stub._roll() - 1)
+                time.sleep(max(0.0, delay) / 1000)
+
+                roll = stub._roll()
+                if roll < config.error_429_rate:
+                    stub._count('429')
+                    return self._send(429, {'message': 'rate limited'}, {'Retry-After': str(config.retry_after)})
+                if roll < config.error_429_rate + config.error_500_rate:
+                    stub._count('500')
+                    return self._send(500, {'message': 'internal error'})
+
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+                if endpoint == 'future-markets':
+                    body = stub.markets
+                elif endpoint in _HISTORY_BARS:
+                    body = stub.history(
+                        endpoint, query['symbols'].split(','), query['interval'], int(query['from']), int(query['to'])
+                    )
+                else:
+                    return self._send(404, {'message': f'unknown endpoint {endpoint}'})
+                stub._count('ok')
+                self._send(200, body)
+
+        return Handler
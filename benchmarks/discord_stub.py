@@ -0,0 +1,174 @@
+"""
+Local stand-in for Discord webhooks, used to exercise utils/discord_delivery.py offline.
+
+Each webhook URL is its own rate-limit bucket of `bucket_limit` requests per
+`reset_after` seconds, reported through the `X-RateLimit-*` headers; going
+over it returns a 429 with `retry_after`, like Discord does.
+
+Usage (from the repo root):
+    python -m benchmarks.discord_stub            # flood alerts through the delivery queue
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class DiscordStubConfig:
+    bucket_limit: int = 5
+    reset_after: float = 2.0
+    latency_ms: float = 20.0
+
+
+class DiscordStub:
+    """
+    Records every message posted to `http://host:port/api/webhooks/<id>/<token>`.
+
+    Usage:
+        with DiscordStub() as stub:
+            url = stub.webhook_url('alerts')
+    """
+
+    def __init__(self, config: DiscordStubConfig = None, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.config = config or DiscordStubConfig()
+        self._lock = threading.Lock()
+        self._buckets = {}   # webhook path -> (window start, requests in window)
+        self.messages = []   # (path, payload, attachment file names, bytes received)
+        self.counters = {'requests': 0, '204': 0, '429': 0}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='discord-stub', daemon=True)
+
+    def webhook_url(self, name: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api/webhooks/{name}/token'
+
+    def start(self) -> 'DiscordStub':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'DiscordStub':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _take(self, path: str):
+        """
+        Counts a request against the webhook's bucket; returns (allowed, remaining, reset_after).
+        """
+        now = time.monotonic()
+        with self._lock:
+            start, used = self._buckets.get(path, (now, 0))
+            if now - start >= self.config.reset_after:
+                start, used = now, 0
+            reset_after = self.config.reset_after - (now - start)
+            if used >= self.config.bucket_limit:
+                self._buckets[path] = (start, used)
+                return False, 0, reset_after
+            self._buckets[path] = (start, used + 1)
+            return True, self.config.bucket_limit - used - 1, reset_after
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body=None, headers: dict = None) -> None:
+                payload = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self) -> None:
+                raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(stub.config.latency_ms / 1000)
+                with stub._lock:
+                    stub.counters['requests'] += 1
+
+                allowed, remaining, reset_after = stub._take(self.path)
+                headers = {
+                    'X-RateLimit-Bucket': self.path.rsplit('/', 2)[-2],
+                    'X-RateLimit-Limit': str(stub.config.bucket_limit),
+                    'X-RateLimit-Remaining': str(remaining),
+                    'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+                }
+                if not allowed:
+                    with stub._lock:
+                        stub.counters['429'] += 1
+                    return self._send(429, {'message': 'You are being rate limited.', 'retry_after': reset_after,
+                                            'global': False}, headers)
+
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/form-data'):
+                    match = re.search(rb'name="payload_json"[^\n]*\n[^\n]*\n\r\n(.*?)\r\n--', raw, re.S)
+                    payload = json.loads(match.group(1)) if match else {}
+                    file_names = [name.decode() for name in re.findall(rb'filename="([^"]*)"', raw)]
+                else:
+                    payload, file_names = json.loads(raw or b'{}'), []
+                with stub._lock:
+                    stub.messages.append((self.path, payload, file_names, len(raw)))
+                    stub.counters['204'] += 1
+                self._send(204, headers=headers)
+
+        return Handler
+
+
+def main() -> None:
+    # Imported here so the stub itself has no dependency on the repo's modules
+    from utils.discord_delivery import DiscordDeliveryQueue, PRIORITY_EMERGENCY
+
+    parser = argparse.ArgumentParser(description='Flood alerts through the Discord delivery queue against the stub.')
+    parser.add_argument('--alerts', type=int, default=200, help='Alerts to send (spread over 3 webhooks).')
+    args = parser.parse_args()
+
+    with DiscordStub() as stub, tempfile.TemporaryDirectory() as tmp:
+        chart = os.path.join(tmp, 'chart.png')
+        with open(chart, 'wb') as f:
+            f.write(os.urandom(256 * 1024))
+
+        delivery = DiscordDeliveryQueue(coalesce_window=0.2)
+        started = time.perf_counter()
+        futures = [
+            delivery.send(stub.webhook_url(f'hook{i % 3}'), content=f'alert {i}: SYMBOL{i} crossed its band',
+                          username='screener', files={'chart.png': chart} if i % 50 == 0 else None)
+            for i in range(args.alerts)
+        ]
+        emergency = delivery.send(stub.webhook_url('emergency'), content='script is down', priority=PRIORITY_EMERGENCY)
+        statuses = [future.result(120) for future in futures]
+        elapsed = time.perf_counter() - started
+        delivery.close()
+
+        order = [path for path, _, _, _ in stub.messages]
+        emergency_position = next(i for i, path in enumerate(order) if '/emergency/' in path)
+        print(json.dumps({
+            'alerts': args.alerts,
+            'delivered': sum(1 for s in statuses if s == 204),
+            'emergency_status': emergency.result(),
+            'emergency_position': emergency_position,
+            'http_requests': stub.counters,
+            'discord_messages': len(stub.messages),
+            'attachments': sum(len(files) for _, _, files, _ in stub.messages),
+            'elapsed_s': round(elapsed, 3),
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Import-time budget for the cron entry points.
+
+Each entry point is imported in a fresh interpreter `--runs` times; the
+median import time must stay under its budget and none of the modules it
+must not load (heavy dependencies only needed deeper in the run) may show up
+in `sys.modules`. Exits non-zero on any violation, so it can gate CI.
+
+Usage (from the repo root):
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --runs 9 --scale 2   # looser budgets on a slow machine
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# entry point -> (modules imported, budget in ms, modules that must not be loaded)
+BUDGETS = {
+    # `python -m cron_jobs ...` before a subcommand runs
+    'cli': (['cron_jobs.__main__'], 50, ['requests', 'numpy', 'pandas', 'tqdm', 'dotenv', 'pyarrow']),
+    # dry-run / list-markets: the refresh module without the API client
+    'dry-run': (['cron_jobs.refresh_db_4h_candles'], 120, ['requests', 'numpy', 'pandas', 'tqdm', 'dotenv', 'pyarrow']),
+    # refresh: everything needed before the first request goes out
+    'refresh': (['cron_jobs.refresh_db_4h_candles', 'utils.coinalyze_rest_adapter'], 300,
+                ['numpy', 'pandas', 'tqdm', 'pyarrow']),
+}
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{'ms': elapsed_ms, 'loaded': [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(modules, forbidden, runs: int) -> dict:
+    """
+    Imports `modules` in `runs` fresh interpreters; returns the median time and any forbidden modules loaded.
+    """
+    env = dict(os.environ, COINALYZE_API_KEY=os.environ.get('COINALYZE_API_KEY', 'benchmark'), LOG_JSON='0')
+    samples, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(modules=modules, forbidden=forbidden)],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        samples.append(result['ms'])
+        loaded.update(result['loaded'])
+    return {'median_ms': round(statistics.median(samples), 1), 'loaded': sorted(loaded)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the cron entry points.")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per entry point (default: 5).")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget (slow or loaded machines).")
+    args = parser.parse_args()
+
+    failures = []
+    for name, (modules, budget_ms, forbidden) in BUDGETS.items():
+        result = measure(modules, forbidden, args.runs)
+        budget = budget_ms * args.scale
+        status = 'ok'
+        if result['median_ms'] > budget:
+            status = 'over budget'
+            failures.append(f"{name}: {result['median_ms']} ms > {budget:.0f} ms")
+        if result['loaded']:
+            status = 'forbidden imports'
+            failures.append(f"{name}: imports {', '.join(result['loaded'])}")
+        print(f"{name:<8} {result['median_ms']:>7.1f} ms  (budget {budget:.0f} ms)  {status}")
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
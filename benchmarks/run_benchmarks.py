@@ -0,0 +1,189 @@
+"""
+Offline benchmarks for the Coinalyze adapter and the 4h candle refresh job.
+
+Each scenario starts a local Coinalyze stand-in (benchmarks/coinalyze_stub.py)
+in this process and runs every registered refresh job (`refresh_jobs`)
+against it in a fresh child process, so peak RSS and import costs are
+measured per scenario. Results are written as JSON and can be compared
+against a saved baseline.
+
+Usage (from the repo root):
+    python -m benchmarks.run_benchmarks                      # run all scenarios
+    python -m benchmarks.run_benchmarks --scenario cold_start
+    python -m benchmarks.run_benchmarks --save-baseline      # write benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+from benchmarks.coinalyze_stub import CoinalyzeStub, StubConfig
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+DEFAULT_RESULTS_PATH = os.path.join(BENCH_DIR, 'results.json')
+DEFAULT_BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+# name -> (stub config, whether to pre-fill the DB with an untimed run first)
+SCENARIOS = {
+    # Empty DB: every symbol pulls the full 2000-bar lookback.
+    'cold_start': (StubConfig(), False),
+    # Typical cron run: DB is up to date, only the newest bars are fetched.
+    'incremental': (StubConfig(), True),
+    # 10% of requests are rate limited with a 1s Retry-After.
+    'rate_limited': (StubConfig(error_429_rate=0.1, retry_after=1.0), False),
+    # 10% of requests fail with a 500.
+    'server_errors': (StubConfig(error_500_rate=0.1), False),
+    # Bigger universe with slower responses.
+    'large_universe': (StubConfig(symbols_per_exchange=1000, latency_ms=150.0), False),
+}
+
+# Metrics where a higher value is a regression.
+LOWER_IS_BETTER = ('wall_s', 'requests', 'peak_rss_mb')
+# Metrics where a lower value is a regression.
+HIGHER_IS_BETTER = ('rows_per_s',)
+
+
+def _run_child(db_path: str, warmup: bool, rate_limit_per_minute: float) -> dict:
+    """
+    Runs the refresh jobs once (after an optional untimed warm-up run) and
+    returns the measurements. Executed inside the child process.
+    """
+    os.environ.setdefault('COINALYZE_API_KEY', 'benchmark')
+
+    import_started = time.perf_counter()
+    from cron_jobs.refresh_db_4h_candles import refresh_jobs
+    from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+    from utils.reference_cache import ReferenceCache
+    import_s = time.perf_counter() - import_started
+
+    def make_adapter():
+        return CoinalyzeRestAdapter(
+            reference_cache=ReferenceCache(cache_dir=None),
+            rate_limit_per_minute=rate_limit_per_minute,
+        )
+
+    if warmup:
+        ca = make_adapter()
+        refresh_jobs(ca=ca, db_path=db_path)
+        ca.close()
+
+    ca = make_adapter()
+    started = time.perf_counter()
+    results = list(refresh_jobs(ca=ca, db_path=db_path).values())
+    wall_s = time.perf_counter() - started
+    ca.close()
+
+    rows = sum(r.rows_fetched for r in results if r is not None)
+    transport = ca.transport_stats
+    return {
+        'import_s': round(import_s, 4),
+        'wall_s': round(wall_s, 4),
+        'requests': transport['requests'],
+        'retries': transport['retries'],
+        'retry_sleep_s': transport['sleep_seconds'],
+        'rows': rows,
+        'rows_per_s': round(rows / wall_s, 1) if wall_s > 0 else None,
+        # ru_maxrss is reported in KiB on Linux and bytes on macOS
+        'peak_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1
+        ),
+        'failed_jobs': sum(1 for r in results if r is None),
+    }
+
+
+def run_scenario(name: str, rate_limit_per_minute: float, verbose: bool = False) -> dict:
+    """
+    Runs one scenario end to end and returns its measurements.
+    """
+    config, warmup = SCENARIOS[name]
+    with tempfile.TemporaryDirectory() as tmp_dir, CoinalyzeStub(config) as stub:
+        env = dict(os.environ, COINALYZE_BASE_URL=stub.base_url, COINALYZE_API_KEY='benchmark')
+        cmd = [
+            sys.executable, '-m', 'benchmarks.run_benchmarks', '--child',
+            '--db', os.path.join(tmp_dir, 'bench.db'),
+            '--rate-limit', str(rate_limit_per_minute),
+        ]
+        if warmup:
+            cmd.append('--warmup')
+        proc = subprocess.run(
+            cmd, cwd=REPO_ROOT, env=env, stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.DEVNULL, text=True, check=True,
+        )
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result['stub'] = dict(stub.counters)
+        result['stub_config'] = asdict(config)
+        return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns human-readable regressions of `results` against `baseline`.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (metric in LOWER_IS_BETTER and change > tolerance) or (metric in HIGHER_IS_BETTER and change < -tolerance):
+                regressions.append(f'{name}.{metric}: {old} -> {new} ({change:+.1%})')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the candle refresh pipeline.')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Scenario(s) to run (default: all).')
+    parser.add_argument('--rate-limit', type=float, default=6000,
+                        help='Adapter token-bucket rate per minute (default: effectively unthrottled).')
+    parser.add_argument('--output', default=DEFAULT_RESULTS_PATH, help='Where to write the results JSON.')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against; exits 1 on regressions.')
+    parser.add_argument('--save-baseline', action='store_true', help=f'Also write results to {DEFAULT_BASELINE_PATH}.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative change before flagging (default: 0.2).')
+    parser.add_argument('--verbose', action='store_true', help='Show the refresh logs of each run.')
+    # internal: run one measurement inside a child process
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--warmup', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_child(args.db, args.warmup, args.rate_limit)))
+        return 0
+
+    results = {}
+    for name in args.scenario or list(SCENARIOS):
+        print(f'running {name}...', flush=True)
+        results[name] = run_scenario(name, args.rate_limit, args.verbose)
+        summary = {k: results[name][k] for k in ('wall_s', 'requests', 'retries', 'rows', 'rows_per_s', 'peak_rss_mb')}
+        print(f'  {summary}', flush=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'baseline written to {DEFAULT_BASELINE_PATH}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Command-line entry point for the cron jobs:
+
+    python -m cron_jobs refresh [--job NAME ...]
+    python -m cron_jobs backfill [--since YYYY-MM-DD] [--job NAME ...]
+    python -m cron_jobs dry-run [--job NAME ...] [--json]
+    python -m cron_jobs list-markets [--job NAME | --exchange A] [--market-type future] [--fetch]
+    python -m cron_jobs replay [--since YYYY-MM-DD] [--job NAME ...] [--store DIR]
+
+Only argparse is imported up front; each subcommand imports what it needs
+when it runs, so `--help` or listing markets never pays for requests, numpy or tqdm.
+Each subcommand logs to its own `logs/<job>.jsonl`, the same file as the
+job's standalone script (see `LOG_NAMES`).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+# JSON log file of each subcommand; `utils.logging` reads LOG_NAME when the command first imports it.
+LOG_NAMES = {
+    'refresh': 'refresh_db_4h_candles',
+    'backfill': 'backfill_candles',
+    'replay': 'replay_responses',
+    'dry-run': 'dry_run',
+    'list-markets': 'list_markets',
+}
+
+
+def _select_jobs(names):
+    from cron_jobs.refresh_db_4h_candles import load_refresh_jobs
+
+    jobs = load_refresh_jobs()
+    if not names:
+        return jobs
+    by_name = {job['name']: job for job in jobs}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown job(s): {', '.join(unknown)} (known: {', '.join(by_name)})")
+    return [by_name[name] for name in names]
+
+
+def _format_t(t) -> str:
+    return datetime.fromtimestamp(t, tz=timezone.utc).strftime('%Y-%m-%d %H:%M') if t is not None else '-'
+
+
+def cmd_refresh(args) -> int:
+    from cron_jobs.refresh_db_4h_candles import refresh_once
+
+    return 0 if refresh_once(_select_jobs(args.job)) else 1
+
+
+def cmd_backfill(args) -> int:
+    from cron_jobs.backfill_candles import backfill_jobs, parse_date
+
+    return 0 if backfill_jobs(parse_date(args.since) if args.since else None, _select_jobs(args.job)) else 1
+
+
+def cmd_replay(args) -> int:
+    from cron_jobs.backfill_candles import parse_date
+    from cron_jobs.refresh_db_4h_candles import replay_once
+    from utils.response_store import ResponseStore
+
+    store = ResponseStore(args.store) if args.store else None
+    return 0 if replay_once(parse_date(args.since) if args.since else None, _select_jobs(args.job), store) else 1
+
+
+def cmd_dry_run(args) -> int:
+    from cron_jobs.refresh_db_4h_candles import describe_refresh
+    from utils.request_planner import RequestPlan
+
+    ca = None
+    try:
+        # Only used for its request planner; nothing is sent, and no cache or response store touches the disk
+        from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+        from utils.reference_cache import ReferenceCache
+        ca = CoinalyzeRestAdapter(reference_cache=ReferenceCache(cache_dir=None), store_responses=False)
+    except ValueError as e:
+        print(f"No request plan ({e}); set COINALYZE_API_KEY to estimate the quota cost.", file=sys.stderr)
+
+    plans = describe_refresh(_select_jobs(args.job), ca=ca)
+    total = RequestPlan(rate_limit_per_minute=ca.rate_limit_per_minute) if ca is not None else None
+    for plan in plans:
+        if plan['plan'] is not None:
+            total.extend(plan['plan'])
+            plan['plan'] = plan['plan'].summary()
+
+    if args.json:
+        print(json.dumps({'jobs': plans, 'total': total.summary() if total is not None else None}, indent=2))
+        return 0
+    for plan in plans:
+        print(f"{plan['name']} ({plan['interval']}) -> {plan['db_path']}")
+        print(f"  tables:   {', '.join(plan['tables'])}")
+        if plan['rollups']:
+            print(f"  rollups:  {', '.join(plan['rollups'])}")
+        print(f"  tickers:  {plan['tickers']} ({plan['tickers_without_history']} without history)")
+        print(f"  candles:  oldest watermark {_format_t(plan['oldest_watermark'])}, "
+              f"newest {_format_t(plan['newest_watermark'])} UTC")
+        if plan['plan'] is not None:
+            summary = plan['plan']
+            per_endpoint = ', '.join(f'{endpoint} {n}' for endpoint, n in summary['requests_per_endpoint'].items())
+            print(f"  requests: {summary['requests']} ({per_endpoint or 'none'})")
+            print(f"  bars:     {summary['needed_points']} needed, {summary['fetched_points']} at most fetched")
+    if total is not None:
+        summary = total.summary()
+        print(f"total: {summary['requests']} request(s), ~{summary['estimated_seconds']}s at "
+              f"{total.rate_limit_per_minute:g} requests/min ({summary['quota_minutes']} min of quota)")
+    return 0
+
+
+def cmd_list_markets(args) -> int:
+    from utils.db_util import get_db_path, connect_db
+    from utils.market_store import list_markets, sync_markets
+
+    filters = {'market_type': args.market_type}
+    if args.job:
+        job = _select_jobs([args.job])[0]
+        filters = {'market_type': job['market_type'], **job['filter']}
+    if args.exchange:
+        filters['exchange'] = args.exchange
+
+    conn, _ = connect_db(get_db_path())
+    if not conn:
+        return 1
+    try:
+        if args.fetch:
+            from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+
+            ca = CoinalyzeRestAdapter()
+            fetch = ca.get_supported_future_markets if filters['market_type'] == 'future' else ca.get_supported_spot_markets
+            sync_markets(conn, fetch(), market_type=filters['market_type'])
+        try:
+            markets = list_markets(conn, **filters)
+        except sqlite3.OperationalError:
+            print("No markets stored yet; run with --fetch.", file=sys.stderr)
+            return 1
+    finally:
+        conn.close()
+
+    for market in markets:
+        print('\t'.join(str(market[col]) for col in ('symbol', 'exchange', 'base_asset', 'quote_asset', 'margined')))
+    print(f"{len(markets)} market(s)", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m cron_jobs', description="Candle database cron jobs.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    refresh = subparsers.add_parser('refresh', help="Refresh the registered jobs once (skipped if a refresh is running).")
+    refresh.add_argument('--job', action='append', help="Only this job (repeatable); defaults to every registered job.")
+    refresh.set_defaults(func=cmd_refresh)
+
+    backfill = subparsers.add_parser('backfill', help="Detect and fill gaps in the candle tables.")
+    backfill.add_argument('--since', help="Also backfill history from this UTC date (YYYY-MM-DD).")
+    backfill.add_argument('--job', action='append', help="Only this job (repeatable).")
+    backfill.set_defaults(func=cmd_backfill)
+
+    dry_run = subparsers.add_parser('dry-run', help="Show what a refresh would do, without API calls or writes.")
+    dry_run.add_argument('--job', action='append', help="Only this job (repeatable).")
+    dry_run.add_argument('--json', action='store_true', help="Print the plan as JSON.")
+    dry_run.set_defaults(func=cmd_dry_run)
+
+    replay = subparsers.add_parser('replay', help="Rebuild the tables from stored raw API responses, without API calls.")
+    replay.add_argument('--since', help="Only responses stored from this UTC date (YYYY-MM-DD).")
+    replay.add_argument('--job', action='append', help="Only this job (repeatable).")
+    replay.add_argument('--store', help="Response store directory; defaults to COINALYZE_RESPONSE_STORE or db/responses.")
+    replay.set_defaults(func=cmd_replay)
+
+    markets = subparsers.add_parser('list-markets', help="List the stored markets, optionally re-fetching them first.")
+    markets.add_argument('--job', help="Apply the market filter of this job.")
+    markets.add_argument('--exchange', help="Coinalyze exchange code, e.g. A (Binance) or H (Hyperliquid).")
+    markets.add_argument('--market-type', choices=['future', 'spot'], default='future')
+    markets.add_argument('--fetch', action='store_true', help="Fetch the market list from Coinalyze first.")
+    markets.set_defaults(func=cmd_list_markets)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    os.environ.setdefault('LOG_NAME', LOG_NAMES[args.command])
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import argparse
+
+from utils.archive import archive_closed_months
+from utils.db_util import connect_db
+from utils.scheduler import RunLock
+from utils.logging import logger
+from cron_jobs.refresh_db_4h_candles import REFRESH_LOCK_PATH, load_refresh_jobs, job_db_path
+
+
+def archive_tables(keep_months: int = 12, archive_dir: str = None) -> None:
+    """
+    Moves closed months older than the hot window of every registered table into the Parquet archive.
+
+    Args:
+        keep_months: Calendar months (including the current one) kept in SQLite.
+        archive_dir: Optional archive root; defaults to `db/archive`.
+    """
+    for job in load_refresh_jobs():
+        # Each job's tables live in its shard with the sharded layout
+        conn, _ = connect_db(job_db_path(job))
+        if not conn:
+            continue
+        try:
+            for table_name in [job['table_name'], *job.get('metrics', {}).values()]:
+                logger.info(f"--- Archiving '{table_name}' (keeping {keep_months} months) ---")
+                rows = archive_closed_months(conn, table_name, keep_months=keep_months, archive_dir=archive_dir)
+                logger.info(f"--- Archived {rows} rows of '{table_name}' ---")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact closed months of the candle tables into Parquet.")
+    parser.add_argument('--keep-months', type=int, default=12, help="Calendar months kept in SQLite (default: 12).")
+    parser.add_argument('--archive-dir', help="Archive root (default: db/archive).")
+    args = parser.parse_args()
+
+    # Deleting archived rows must not interleave with a refresh
+    with RunLock(REFRESH_LOCK_PATH) as acquired:
+        if not acquired:
+            logger.warning("A refresh is running; skipping the archive run.")
+        else:
+            archive_tables(args.keep_months, args.archive_dir)
@@ -0,0 +1,102 @@
+import argparse
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List
+from utils.backfill import run_backfill
+from utils.db_util import get_db_path, connect_db
+from utils.rollups import update_rollups
+from utils.changelog import abandon_unfinished_runs, begin_run, finish_run
+from utils.logging import logger
+from utils.scheduler import RunLock
+from cron_jobs.refresh_db_4h_candles import REFRESH_LOCK_PATH, load_refresh_jobs, job_db_path, _select_job_symbols
+
+if TYPE_CHECKING:
+    from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+
+
+def backfill_table(config: dict, start_t: int = None, ca: 'CoinalyzeRestAdapter' = None, run_id: int = None,
+                   symbols: List[str] = None, db_path: str = None):
+    """
+    Fills missing bars of one configured candle table and updates its rollups.
+
+    Args:
+        config: A refresh job config (see `load_refresh_jobs`).
+        start_t: Optional earliest timestamp the table should cover.
+        ca: An optional adapter to reuse.
+        run_id: Optional changelog run id.
+        symbols: The job's tickers; with `start_t`, those without any stored bars are backfilled from `start_t`.
+        db_path: Optional catalog database path; defaults to `get_db_path()`.
+    """
+    db_path = job_db_path(config, db_path)
+    table_name = config['table_name']
+    logger.info(f"--- Starting backfill of '{table_name}' ---")
+    result = run_backfill(db_path=db_path, table_name=table_name, interval=config['interval'], start_t=start_t,
+                          symbols=symbols, ca=ca, run_id=run_id)
+
+    if result is not None and result.touched and config.get('rollups'):
+        conn, _ = connect_db(db_path)
+        if conn:
+            try:
+                update_rollups(conn, table_name, result.touched, config['rollups'])
+            finally:
+                conn.close()
+    logger.info(f"--- Finished backfill of '{table_name}' ---")
+
+
+def backfill_jobs(start_t: int = None, jobs: List[Dict[str, Any]] = None, ca: 'CoinalyzeRestAdapter' = None,
+                  db_path: str = None) -> bool:
+    """
+    Backfills every job's candle table under one changelog run.
+
+    Runs under the refresh lock, as it writes the same tables, watermarks
+    and changelog as the refresh job and daemon. The tickers are selected
+    like the refresh selects them, so with `start_t` newly listed markets
+    without any stored bars are backfilled as well.
+
+    Args:
+        start_t: Optional earliest timestamp the tables should cover.
+        jobs: Job configs; defaults to `load_refresh_jobs()`.
+        ca: An optional adapter to reuse.
+        db_path: Optional catalog database path; defaults to `get_db_path()`.
+
+    Returns:
+        False if a refresh held the lock and the backfill was skipped.
+    """
+    from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+
+    with RunLock(REFRESH_LOCK_PATH) as acquired:
+        if not acquired:
+            logger.warning("A refresh is running; skipping the backfill.")
+            return False
+        db_path = db_path or get_db_path()
+        conn, _ = connect_db(db_path)
+        try:
+            abandon_unfinished_runs(conn)
+            run_id = begin_run(conn, job='backfill_candles')
+            try:
+                ca = ca if ca is not None else CoinalyzeRestAdapter()
+                jobs = jobs if jobs is not None else load_refresh_jobs()
+                symbols, _ = _select_job_symbols(
+                    db_path, jobs, ca, job_paths={job['name']: job_db_path(job, db_path) for job in jobs}
+                )
+                for job in jobs:
+                    backfill_table(job, start_t, ca, run_id, symbols=symbols.get(job['name']), db_path=db_path)
+            finally:
+                finish_run(conn, run_id)
+        finally:
+            conn.close()
+        return True
+
+
+def parse_date(value: str) -> int:
+    """
+    Returns the unix timestamp of a UTC date given as YYYY-MM-DD.
+    """
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect and fill gaps in the candle tables.")
+    parser.add_argument('--since', help="Also backfill history from this UTC date (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    backfill_jobs(parse_date(args.since) if args.since else None)
@@ -0,0 +1,15 @@
+from utils.db_util import get_db_path, migrate_db
+from utils.logging import logger
+from cron_jobs.refresh_db_4h_candles import load_refresh_jobs
+
+# One-shot migration of the candle tables to the WITHOUT ROWID / WAL layout.
+# Stop the refresh cron (or make sure it isn't running) before running this.
+
+if __name__ == "__main__":
+    db_path = get_db_path()
+    logger.info(f"--- Migrating candle tables in {db_path} ---")
+    migrate_db(
+        db_path=db_path,
+        table_names=[job['table_name'] for job in load_refresh_jobs()]
+    )
+    logger.info("--- Finished migrating candle tables ---")
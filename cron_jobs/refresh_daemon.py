@@ -0,0 +1,97 @@
+import argparse
+import signal
+import threading
+import traceback
+
+from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter, INTERVAL_SECONDS
+from utils.db_util import get_db_path, connect_db
+from utils.scheduler import CandleCloseScheduler, RunLock
+from utils.logging import logger
+from cron_jobs.refresh_db_4h_candles import REFRESH_LOCK_PATH, load_refresh_jobs, run_refresh
+
+# Liquid symbol whose newest bar signals that the candle has closed upstream.
+DEFAULT_PROBE_SYMBOL = 'BTCUSDT_PERP.A'
+
+
+def run_daemon(probe_symbol: str = DEFAULT_PROBE_SYMBOL, poll_seconds: float = 10, max_wait: float = 15 * 60,
+               run_now: bool = False) -> None:
+    """
+    Keeps one warm process that refreshes the candle tables as soon as each bar closes.
+
+    Imports, the adapter (HTTP session, rate limiter, market cache) and the
+    changelog connection are set up once and reused by every run. Each cycle
+    sleeps until the next interval boundary, polls a single probe symbol
+    until the new bar is served, then runs the same refresh as the crontab
+    job under the shared run lock. SIGTERM/SIGINT stop the daemon after the
+    current refresh finishes.
+
+    Args:
+        probe_symbol: The symbol polled to detect the candle close.
+        poll_seconds: Delay between probes.
+        max_wait: Seconds after the boundary after which the refresh runs even if the probe never saw the new bar.
+        run_now: Run one refresh immediately on startup to catch up.
+    """
+    stop_event = threading.Event()
+
+    def request_stop(signum, _frame):
+        logger.info(f"Received {signal.Signals(signum).name}; stopping after the current run.")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    # Fire at the close of the shortest interval any registered job refreshes
+    jobs = load_refresh_jobs()
+    interval = min((job['interval'] for job in jobs), key=INTERVAL_SECONDS.get)
+    step = INTERVAL_SECONDS[interval]
+    db_path = get_db_path()
+    ca = CoinalyzeRestAdapter()
+    conn, _ = connect_db(db_path)
+    if not conn:
+        return
+
+    scheduler = CandleCloseScheduler(
+        step=step,
+        probe=lambda boundary: ca.get_latest_bar_t(probe_symbol, interval, since=boundary - step),
+        stop_event=stop_event,
+        poll_seconds=poll_seconds,
+        max_wait=max_wait,
+    )
+
+    def refresh_once() -> None:
+        with RunLock(REFRESH_LOCK_PATH) as acquired:
+            if not acquired:
+                logger.warning("Another refresh is already running; skipping this cycle.")
+                return
+            try:
+                run_refresh(ca, conn, db_path, jobs)
+            except Exception as e:
+                # Keep the daemon alive; the next boundary retries
+                logger.error(f"Refresh run failed: {e}")
+                logger.error(traceback.format_exc())
+
+    logger.info(f"Refresh daemon started (interval={interval}, probe={probe_symbol}).")
+    try:
+        if run_now:
+            refresh_once()
+        while not stop_event.is_set():
+            boundary = scheduler.wait_for_boundary()
+            if boundary is None or not scheduler.wait_until_visible(boundary):
+                break
+            refresh_once()
+    finally:
+        conn.close()
+        ca.close()
+        logger.info("Refresh daemon stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the candle tables at every 4h candle close.")
+    parser.add_argument('--probe-symbol', default=DEFAULT_PROBE_SYMBOL, help="Symbol polled to detect the candle close.")
+    parser.add_argument('--poll-seconds', type=float, default=10, help="Delay between probes.")
+    parser.add_argument('--max-wait', type=float, default=15 * 60,
+                        help="Seconds after the close after which the refresh runs regardless of the probe.")
+    parser.add_argument('--run-now', action='store_true', help="Also refresh once immediately on startup.")
+    args = parser.parse_args()
+
+    run_daemon(args.probe_symbol, args.poll_seconds, args.max_wait, args.run_now)
@@ -1,114 +1,550 @@
+import json
 import os
+import sqlite3
+import time
 import traceback
-from typing import Callable, Dict, Any, List
-from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
-from utils.db_util import refresh_data, get_db_path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+from utils.db_util import (
+    METRICS, RefreshResult, refresh_metrics, get_db_path, connect_db, connect_db_read_only, create_metric_table,
+    get_metric_watermarks, get_empty_fetch_watermarks, plan_metrics
+)
+from utils.market_store import sync_markets, select_market_symbols
+from utils.rollups import update_rollups
+from utils.changelog import abandon_unfinished_runs, begin_run, finish_run
+from utils.scheduler import RunLock
+from utils.shards import ShardManager, default_shard_manager
+from utils.sqlite_writer import SQLiteWriter
 from utils.logging import logger
+from utils.metrics import run_metrics
+
+# The adapter pulls in requests; it is only imported once a run actually talks to the API.
+if TYPE_CHECKING:
+    from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+    from utils.response_store import ResponseStore
+
+# Run summaries: one JSON line per run, plus a node_exporter textfile for alerting.
+LOGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'logs'))
+METRICS_JSONL_PATH = os.path.join(LOGS_DIR, 'refresh_db_4h_candles_metrics.jsonl')
+METRICS_PROM_PATH = os.path.join(LOGS_DIR, 'refresh_db_4h_candles.prom')
+
+# Held for the whole run by both the crontab job and the daemon, so refreshes never overlap.
+REFRESH_LOCK_PATH = os.path.join(LOGS_DIR, 'refresh_db_4h_candles.lock')
+
+# Optional JSON file (a list of job configs like the ones below) replacing the built-in registry.
+REFRESH_JOBS_ENV_VAR = 'REFRESH_JOBS_CONFIG'
+
+# Derivatives metrics stored next to the candles of the perp venues, one table per metric (see utils/db_util.py)
+PERP_METRICS = ['open_interest', 'funding_rate', 'predicted_funding_rate', 'liquidations', 'long_short_ratio']
 
 # --- Configuration ---
 BINANCE_PERP_CONFIG = {
+    'name': 'binance_perp',
     'table_name': 'binance_perp_ohlcv',
     'interval': '4hour',
-    'filter': lambda m: (
-        m.get('exchange') == 'A' and
-        m['is_perpetual'] is True and
-        m['margined'] == 'STABLE'
-    )
+    # 'future' or 'spot': which Coinalyze market list the filter applies to
+    'market_type': 'future',
+    # Column filters on the `markets` table (see utils/market_store.py)
+    'filter': {'exchange': 'A', 'is_perpetual': True, 'margined': 'STABLE'},
+    # Higher-timeframe tables maintained from the 4h candles (see utils/rollups.py)
+    'rollups': ['8h', '12h', '1d', '1w'],
+    # Optional metric -> table, fetched in the same request schedule as the candles
+    'metrics': {metric: f'binance_perp_{metric}' for metric in PERP_METRICS}
 }
 
 HYPERLIQUID_PERP_CONFIG = {
+    'name': 'hyperliquid_perp',
     'table_name': 'hyperliquid_perp_ohlcv',
     'interval': '4hour',
-    'filter': lambda m: (
-        m.get('exchange') == 'H' and # Using .get() for safety
-        m['is_perpetual'] is True and
-        m['margined'] == 'STABLE'
-    )
+    'market_type': 'future',
+    'filter': {'exchange': 'H', 'is_perpetual': True, 'margined': 'STABLE'},
+    # Higher-timeframe tables maintained from the 4h candles (see utils/rollups.py)
+    'rollups': ['8h', '12h', '1d', '1w'],
+    'metrics': {metric: f'hyperliquid_perp_{metric}' for metric in PERP_METRICS}
 }
 
+# Every job refreshed by a run. Adding a venue, market type or interval is one more entry.
+REFRESH_JOBS = [BINANCE_PERP_CONFIG, HYPERLIQUID_PERP_CONFIG]
+
+
+def load_refresh_jobs(path: str = None) -> List[Dict[str, Any]]:
+    """
+    Returns the job registry: the JSON list at `path` (or at `$REFRESH_JOBS_CONFIG`), else `REFRESH_JOBS`.
+
+    Args:
+        path: Optional path to a JSON file holding a list of job configs.
+
+    Returns:
+        The job configs, with `market_type`, `rollups` and `metrics` defaulted.
+    """
+    path = path or os.getenv(REFRESH_JOBS_ENV_VAR)
+    if not path:
+        return REFRESH_JOBS
+
+    with open(path) as f:
+        jobs = json.load(f)
+    for job in jobs:
+        missing = {'name', 'table_name', 'interval', 'filter'} - set(job)
+        if missing:
+            raise ValueError(f"Refresh job {job.get('name', '?')} in {path} is missing {sorted(missing)}")
+        job.setdefault('market_type', 'future')
+        job.setdefault('rollups', [])
+        job.setdefault('metrics', {})
+    return jobs
+
+
+def job_db_path(job: Dict[str, Any], db_path: str = None, shards: ShardManager = None) -> str:
+    """
+    Returns the database a job's tables live in: its shard with the sharded layout, else the catalog DB.
+
+    Args:
+        job: A job config.
+        db_path: Optional catalog database path; defaults to `get_db_path()`.
+        shards: Optional shard manager; defaults to `default_shard_manager(db_path)`.
+    """
+    db_path = db_path or get_db_path()
+    shards = shards if shards is not None else default_shard_manager(db_path)
+    return shards.route(job) if shards is not None else db_path
+
+
+def _select_job_symbols(
+    db_path: str,
+    jobs: List[Dict[str, Any]],
+    ca: Optional['CoinalyzeRestAdapter'],
+    job_paths: Dict[str, str] = None
+) -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, List[str]]]]:
+    """
+    Fetches each market list needed by `jobs` once, persists it into the
+    `markets` table and selects every job's tickers with an indexed query,
+    along with the tickers of each metric Coinalyze flags per market (see
+    `_select_metric_symbols`).
+
+    Args:
+        db_path: The catalog database holding the `markets` table.
+        jobs: Job configs.
+        ca: The adapter fetching the market lists; without one, the stored lists are used as they are.
+        job_paths: Optional database of each job's tables, keyed by job name; defaults to `db_path`.
+
+    Returns:
+        The tickers of each job and, for metrics not available on every
+        ticker, the tickers of each metric, both keyed by job name.
+    """
+    fetchers = {
+        'future': ca.get_supported_future_markets,
+        'spot': ca.get_supported_spot_markets,
+    } if ca is not None else {}
+    conn, c = connect_db(db_path)
+    if not conn:
+        return {}, {}
+    try:
+        for market_type in sorted({job['market_type'] for job in jobs} & set(fetchers)):
+            # Served from the adapter's reference cache when fresh
+            logger.info(f"Fetching all supported {market_type} markets...")
+            sync_markets(conn, fetchers[market_type](), market_type=market_type)
+
+        symbols, metric_symbols = {}, {}
+        for job in jobs:
+            symbols[job['name']] = select_market_symbols(conn, market_type=job['market_type'], **job['filter'])
+            metric_symbols[job['name']] = _select_metric_symbols(conn, job, symbols[job['name']])
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Created up front so the parallel phase never contends on schema changes
+    job_paths = job_paths or {}
+    for path in sorted({job_paths.get(job['name'], db_path) for job in jobs}):
+        conn, c = connect_db(path)
+        if not conn:
+            continue
+        try:
+            for job in jobs:
+                if job_paths.get(job['name'], db_path) == path:
+                    for metric, table_name in _job_tables(job).items():
+                        create_metric_table(c, table_name, metric)
+            conn.commit()
+        finally:
+            conn.close()
+    return symbols, metric_symbols
+
+
+def _select_metric_symbols(conn, job: Dict[str, Any], symbols: List[str]) -> Dict[str, List[str]]:
+    """
+    Drops, per metric, the tickers whose market says Coinalyze has no data for it (e.g. `has_long_short_ratio_data`).
+
+    Markets with an unknown flag are kept.
+
+    Returns:
+        The tickers of each flagged metric of the job, keyed by metric name.
+    """
+    metric_symbols = {}
+    for metric in _job_tables(job):
+        flag = METRICS[metric].market_flag
+        if flag is None:
+            continue
+        lacking = set(select_market_symbols(conn, market_type=job['market_type'], **job['filter'], **{flag: False}))
+        metric_symbols[metric] = [symbol for symbol in symbols if symbol not in lacking]
+        if lacking:
+            logger.info(f"Skipping {metric} for {len(lacking)} ticker(s) of '{job['table_name']}' without {metric} data.")
+    return metric_symbols
+
 
-def _refresh_market_data(
+def _job_tables(job: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Returns the table of every metric a job refreshes, keyed by metric name.
+    """
+    return {'ohlcv': job['table_name'], **job.get('metrics', {})}
+
+
+def _refresh_job(
     db_path: str,
-    table_name: str,
-    interval: str,
-    market_filter: Callable[[Dict[str, Any]], bool]
-):
+    job: Dict[str, Any],
+    symbols: List[str],
+    ca: 'CoinalyzeRestAdapter',
+    writer: SQLiteWriter,
+    run_id: int = None,
+    replay: 'ResponseStore' = None,
+    replay_since: float = None,
+    metric_symbols: Dict[str, List[str]] = None
+) -> Optional[RefreshResult]:
+    """
+    Fetches one job's candles and metrics into the shared writer, in one request schedule
+    (or replays them from `replay`, see `refresh_metrics`).
+
+    Returns:
+        The `RefreshResult` of the candle table, or None if the job was skipped or failed.
+    """
+    table_name = job['table_name']
+    if not symbols:
+        logger.warning(f"No tickers found for table '{table_name}'. The refresh will be skipped.")
+        return None
+
+    tables = _job_tables(job)
+    logger.info(
+        f"Refreshing {', '.join(tables)} (interval={job['interval']}) for {len(symbols)} tickers of '{table_name}'..."
+    )
+    results = refresh_metrics(
+        db_path=db_path,
+        tables=tables,
+        symbols=symbols,
+        interval=job['interval'],
+        ca=ca,
+        run_id=run_id,
+        writer=writer,
+        replay=replay,
+        replay_since=replay_since,
+        metric_symbols=metric_symbols
+    )
+    return results['ohlcv'] if results is not None else None
+
+
+def refresh_jobs(
+    jobs: List[Dict[str, Any]] = None,
+    ca: 'CoinalyzeRestAdapter' = None,
+    db_path: str = None,
+    run_id: int = None,
+    max_parallel: int = None,
+    shards: ShardManager = None,
+    replay: 'ResponseStore' = None,
+    replay_since: float = None
+) -> Dict[str, Optional[RefreshResult]]:
     """
-    Generic function to fetch and refresh market data based on a filter.
+    Refreshes every job of the registry in parallel.
+
+    The market lists are fetched once for all jobs. Jobs then run on a thread
+    pool and share one adapter, so every request draws from the same
+    rate-limit budget, and one serialized `SQLiteWriter` per database, so
+    SQLite only ever sees a single writer per file. With the sharded layout
+    every venue has its own file and writer, and venues commit concurrently.
+    Total wall time is bounded by the shared API quota rather than by the sum
+    of every venue's round trips. Rollups are updated once the writers have
+    committed.
 
     Args:
-        db_path: The absolute path to the SQLite database.
-        table_name: The name of the table to update.
-        interval: The data interval (e.g., '1min', '15min').
-        market_filter: A function that returns True for markets to include.
+        jobs: Job configs (see `BINANCE_PERP_CONFIG`); defaults to `load_refresh_jobs()`.
+        ca: An optional adapter to reuse; a new one is created if omitted.
+        db_path: Optional database path; defaults to `get_db_path()`.
+        run_id: Optional changelog run id under which inserted/updated ranges are recorded.
+        max_parallel: Maximum number of jobs running at once; defaults to all of them.
+        shards: Optional shard manager; defaults to `default_shard_manager(db_path)` (None unless sharding is enabled).
+        replay: Optional response store to rebuild the tables from instead of calling the API; the
+            stored market lists are used and no adapter is created.
+        replay_since: With `replay`, only the responses stored at or after this unix time.
+
+    Returns:
+        The `RefreshResult` of each job (None if skipped or failed), keyed by job name.
     """
+    jobs = jobs if jobs is not None else load_refresh_jobs()
+    db_path = db_path or get_db_path()
+    results: Dict[str, Optional[RefreshResult]] = {job['name']: None for job in jobs}
+    statuses = {job['name']: 'skipped' for job in jobs}
+    started = time.perf_counter()
+    # Seconds each job spent in its own worker (fetch and submit) and its rollup update
+    durations: Dict[str, float] = {}
+
+    def run_job(job: Dict[str, Any]) -> Optional[RefreshResult]:
+        job_started = time.perf_counter()
+        try:
+            return _refresh_job(
+                job_paths[job['name']], job, job_symbols.get(job['name'], []), ca, writers[job_paths[job['name']]],
+                run_id, replay, replay_since, job_metric_symbols.get(job['name'])
+            )
+        finally:
+            durations[job['name']] = time.perf_counter() - job_started
+
     try:
-        # Initialize CoinalyzeRestAdapter
-        ca = CoinalyzeRestAdapter()
-
-        # Get all supported future markets
-        logger.info("Fetching all supported future markets...")
-        all_future_markets = ca.get_supported_future_markets()
-
-        # Filter for the desired tickers
-        logger.info(f"Filtering markets for table '{table_name}'...")
-        filtered_tickers = [
-            market['symbol'] for market in all_future_markets if market_filter(market)
-        ]
-
-        if not filtered_tickers:
-            logger.warning(f"No tickers found for table '{table_name}'. The refresh will be skipped.")
-            return
-
-        logger.info(f"Found {len(filtered_tickers)} tickers for '{table_name}'.")
-
-        # Refresh data for the filtered tickers
-        logger.info(f"Refreshing data (interval={interval}) for table '{table_name}'...")
-        refresh_data(
-            db_path=db_path,
-            table_name=table_name,
-            symbols=filtered_tickers,
-            interval=interval
-        )
-        logger.info(f"Data refresh for '{table_name}' completed successfully.")
+        if ca is None and replay is None:
+            from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+            ca = CoinalyzeRestAdapter()
+        job_paths = {job['name']: job_db_path(job, db_path, shards) for job in jobs}
+        job_symbols, job_metric_symbols = _select_job_symbols(db_path, jobs, ca, job_paths)
+        for job in jobs:
+            logger.info(f"Found {len(job_symbols.get(job['name'], []))} tickers for '{job['table_name']}'.")
+
+        with ExitStack() as stack:
+            writers = {path: stack.enter_context(SQLiteWriter(path)) for path in sorted(set(job_paths.values()))}
+            executor = stack.enter_context(ThreadPoolExecutor(
+                max_workers=max_parallel or max(len(jobs), 1), thread_name_prefix='refresh-job'
+            ))
+            futures = {job['name']: executor.submit(run_job, job) for job in jobs}
+            for name, future in futures.items():
+                results[name] = future.result()
+                if results[name] is not None:
+                    statuses[name] = 'ok'
+                elif job_symbols.get(name):
+                    statuses[name] = 'error'
+
+        # Recompute only the rollup buckets touched by this refresh, now that the rows are committed
+        for job in jobs:
+            result = results[job['name']]
+            if job.get('rollups') and result is not None and result.touched:
+                rollups_started = time.perf_counter()
+                conn, _ = connect_db(job_paths[job['name']])
+                if conn:
+                    try:
+                        update_rollups(conn, job['table_name'], result.touched, job['rollups'])
+                    finally:
+                        conn.close()
+                durations[job['name']] += time.perf_counter() - rollups_started
+
+        for job in jobs:
+            if statuses[job['name']] == 'ok':
+                logger.info(f"Data refresh for '{job['table_name']}' completed successfully.")
 
     except Exception as e:
-        logger.error(f"An error occurred during the refresh for '{table_name}': {e}")
+        # A failed writer or market fetch fails every job of the run
+        statuses = {name: 'error' for name in statuses}
+        results = {name: None for name in results}
+        logger.error(f"An error occurred during the refresh: {e}")
         logger.error(traceback.format_exc())
 
+    finally:
+        run_metrics.set('refresh_run_duration_seconds', time.perf_counter() - started)
+        for job in jobs:
+            table_name, status = job['table_name'], statuses[job['name']]
+            run_metrics.inc('refresh_jobs_total', table=table_name, status=status)
+            if job['name'] in durations:
+                run_metrics.set('refresh_job_duration_seconds', durations[job['name']], table=table_name)
+            if status == 'ok':
+                run_metrics.set('refresh_job_last_success_timestamp_seconds', time.time(), table=table_name)
+
+    return results
+
+
+def describe_refresh(
+    jobs: List[Dict[str, Any]] = None,
+    db_path: str = None,
+    ca: 'CoinalyzeRestAdapter' = None
+) -> List[Dict[str, Any]]:
+    """
+    Describes what a refresh would do, from the stored markets and watermarks only.
+
+    Nothing is fetched from the API and nothing is written: tickers come from
+    the `markets` table as of the last run, and tables or shards that do not
+    exist yet are reported as empty. With an adapter, each job also gets the
+    request plan `refresh_metrics` would run (see `utils.db_util.plan_metrics`).
+
+    Args:
+        jobs: Job configs; defaults to `load_refresh_jobs()`.
+        db_path: Optional catalog database path; defaults to `get_db_path()`.
+        ca: Optional adapter whose request planner, limits and rate estimate the quota cost.
 
-def refresh_binance_perp():
+    Returns:
+        One dict per job with its database, tables, ticker count, candle
+        watermarks and, with `ca`, its `RequestPlan` under 'plan'.
+    """
+    jobs = jobs if jobs is not None else load_refresh_jobs()
+    db_path = db_path or get_db_path()
+    shards = default_shard_manager(db_path)
+    plans = []
+    # read-only and only if present: a dry run must not create the catalog or any shard
+    conn = connect_db_read_only(db_path)
+    try:
+        for job in jobs:
+            try:
+                if conn is None:
+                    raise sqlite3.OperationalError(f"no database at {db_path}")
+                symbols = select_market_symbols(conn, market_type=job['market_type'], **job['filter'])
+                metric_symbols = _select_metric_symbols(conn, job, symbols)
+            except sqlite3.OperationalError:
+                symbols, metric_symbols = [], {}   # markets never synced
+            path = shards.job_path(job) if shards is not None else db_path
+            tables = _job_tables(job)
+            watermarks = {metric: {} for metric in tables}
+            empty_fetches = {}
+            job_conn = connect_db_read_only(path) if symbols else None
+            if job_conn is not None:
+                try:
+                    c = job_conn.cursor()
+                    watermarks = get_metric_watermarks(c, tables, symbols)
+                    empty_fetches = get_empty_fetch_watermarks(c, tables, symbols)
+                finally:
+                    job_conn.close()
+            candles = watermarks['ohlcv']
+            plans.append({
+                'name': job['name'],
+                'db_path': path,
+                'interval': job['interval'],
+                'tables': list(tables.values()),
+                'rollups': job.get('rollups', []),
+                'tickers': len(symbols),
+                'tickers_without_history': len(symbols) - len(candles),
+                'oldest_watermark': min(candles.values(), default=None),
+                'newest_watermark': max(candles.values(), default=None),
+                'plan': plan_metrics(
+                    ca, tables, symbols, job['interval'], watermarks, metric_symbols, empty_fetches
+                ) if ca is not None else None,
+            })
+    finally:
+        if conn is not None:
+            conn.close()
+    return plans
+
+
+def refresh_binance_perp(ca: 'CoinalyzeRestAdapter' = None, db_path: str = None, run_id: int = None):
     """
     Refreshes Binance perpetual futures data.
+
+    Args:
+        ca: An optional adapter to reuse.
+        db_path: Optional database path; defaults to `get_db_path()`.
+        run_id: Optional changelog run id.
     """
     logger.info("--- Starting Binance Perp Refresh Task ---")
-    db_path = get_db_path()
-    _refresh_market_data(
-        db_path=db_path,
-        table_name=BINANCE_PERP_CONFIG['table_name'],
-        interval=BINANCE_PERP_CONFIG['interval'],
-        market_filter=BINANCE_PERP_CONFIG['filter']
-    )
+    result = refresh_jobs([BINANCE_PERP_CONFIG], ca=ca, db_path=db_path, run_id=run_id)
     logger.info("--- Finished Binance Perp Refresh Task ---")
+    return result[BINANCE_PERP_CONFIG['name']]
 
 
-def refresh_hyperliquid_perp():
+def refresh_hyperliquid_perp(ca: 'CoinalyzeRestAdapter' = None, db_path: str = None, run_id: int = None):
     """
     Refreshes Hyperliquid perpetual futures data.
+
+    Args:
+        ca: An optional adapter to reuse.
+        db_path: Optional database path; defaults to `get_db_path()`.
+        run_id: Optional changelog run id.
     """
     logger.info("--- Starting Hyperliquid Perp Refresh Task ---")
-    db_path = get_db_path()
-    _refresh_market_data(
-        db_path=db_path,
-        table_name=HYPERLIQUID_PERP_CONFIG['table_name'],
-        interval=HYPERLIQUID_PERP_CONFIG['interval'],
-        market_filter=HYPERLIQUID_PERP_CONFIG['filter']
-    )
+    result = refresh_jobs([HYPERLIQUID_PERP_CONFIG], ca=ca, db_path=db_path, run_id=run_id)
     logger.info("--- Finished Hyperliquid Perp Refresh Task ---")
+    return result[HYPERLIQUID_PERP_CONFIG['name']]
+
+
+def run_refresh(ca: 'CoinalyzeRestAdapter', conn, db_path: str = None, jobs: List[Dict[str, Any]] = None) -> None:
+    """
+    One complete refresh run: every registered job under one changelog run id, then the metrics summary.
+
+    Args:
+        ca: The adapter to share between jobs.
+        conn: An open connection used for the changelog run registry.
+        db_path: Optional database path; defaults to `get_db_path()`.
+        jobs: Job configs; defaults to `load_refresh_jobs()`.
+    """
+    db_path = db_path or get_db_path()
+    jobs = jobs if jobs is not None else load_refresh_jobs()
+    run_metrics.reset(job='refresh_db_4h_candles')
+
+    # Callers hold the refresh lock, so a run still open now belongs to a process that died
+    abandon_unfinished_runs(conn)
+    # Every run gets a changelog id so downstream consumers can read only its deltas
+    run_id = begin_run(conn, job='refresh_db_4h_candles')
+    try:
+        logger.info(f"--- Starting refresh of {len(jobs)} job(s): {', '.join(job['name'] for job in jobs)} ---")
+        refresh_jobs(jobs, ca=ca, db_path=db_path, run_id=run_id)
+        logger.info("--- Finished refresh ---")
+    finally:
+        finish_run(conn, run_id)
+
+    run_metrics.write_summary(METRICS_JSONL_PATH, METRICS_PROM_PATH)
+
+
+def refresh_once(jobs: List[Dict[str, Any]] = None) -> bool:
+    """
+    Runs `run_refresh` under the refresh lock, as the crontab entry does.
+
+    Args:
+        jobs: Job configs; defaults to `load_refresh_jobs()`.
+
+    Returns:
+        False if another refresh held the lock and this run was skipped.
+    """
+    from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+
+    with RunLock(REFRESH_LOCK_PATH) as acquired:
+        if not acquired:
+            logger.warning("Another refresh is already running; skipping this run.")
+            return False
+        db_path = get_db_path()
+        conn, _ = connect_db(db_path)
+        try:
+            # Every registered job runs in parallel, sharing one adapter
+            run_refresh(CoinalyzeRestAdapter(), conn, db_path, jobs)
+        finally:
+            conn.close()
+        return True
+
+
+def replay_once(since: float = None, jobs: List[Dict[str, Any]] = None, store: 'ResponseStore' = None) -> bool:
+    """
+    Rebuilds the job tables from the stored raw responses, under the refresh lock and without network access.
+
+    Upserts are idempotent, so replaying responses that were already written
+    only rewrites the same rows. The replay gets its own changelog run, so
+    downstream consumers see the recovered ranges like any other refresh.
+
+    Args:
+        since: Only the responses stored at or after this unix time; defaults to every stored response.
+        jobs: Job configs; defaults to `load_refresh_jobs()`.
+        store: The response store; defaults to the one configured by `COINALYZE_RESPONSE_STORE`,
+            or `db/responses`.
+
+    Returns:
+        False if another refresh held the lock and this replay was skipped.
+    """
+    from utils.response_store import ResponseStore, default_response_store
+
+    store = store if store is not None else default_response_store() or ResponseStore()
+    jobs = jobs if jobs is not None else load_refresh_jobs()
+    with RunLock(REFRESH_LOCK_PATH) as acquired:
+        if not acquired:
+            logger.warning("A refresh is running; skipping the replay.")
+            return False
+        db_path = get_db_path()
+        conn, _ = connect_db(db_path)
+        try:
+            run_metrics.reset(job='replay_responses')
+            abandon_unfinished_runs(conn)
+            run_id = begin_run(conn, job='replay_responses')
+            try:
+                logger.info(f"--- Replaying {store.root_dir} into {len(jobs)} job(s) ---")
+                refresh_jobs(jobs, db_path=db_path, run_id=run_id, replay=store, replay_since=since)
+            finally:
+                finish_run(conn, run_id)
+        finally:
+            conn.close()
+        return True
 
 
 if __name__ == "__main__":
-    # You can now run both refresh tasks sequentially
-    refresh_binance_perp()
-    print("\n" + "="*50 + "\n") # Separator for clarity in logs
-    refresh_hyperliquid_perp()
+    refresh_once()
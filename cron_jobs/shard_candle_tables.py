@@ -0,0 +1,81 @@
+import argparse
+import os
+from functools import partial
+from typing import Any, Dict
+
+from utils.db_util import get_db_path, create_metric_table, create_read_indexes
+from utils.scheduler import RunLock
+from utils.shards import ShardManager, TableSchemas, DB_LAYOUT_ENV_VAR
+from utils.rollups import rollup_table_name, create_rollup_table
+from utils.logging import logger
+from cron_jobs.refresh_db_4h_candles import REFRESH_LOCK_PATH, load_refresh_jobs, _job_tables
+
+
+def _create_candle_table(c, table_name: str) -> None:
+    create_metric_table(c, table_name, 'ohlcv')
+    create_read_indexes(c, table_name)
+
+
+def job_table_schemas(job: Dict[str, Any], rollups: bool = False) -> TableSchemas:
+    """
+    Returns the schema helper of every table of a job, as the refresh creates them.
+
+    Args:
+        job: A refresh job config.
+        rollups: Also include the job's rollup tables.
+    """
+    schemas: TableSchemas = {}
+    for metric, table_name in _job_tables(job).items():
+        if metric == 'ohlcv':
+            schemas[table_name] = partial(_create_candle_table, table_name=table_name)
+        else:
+            schemas[table_name] = partial(create_metric_table, table_name=table_name, metric=metric)
+    if rollups:
+        for interval in job.get('rollups', []):
+            schemas[rollup_table_name(job['table_name'], interval)] = partial(
+                create_rollup_table, table_name=job['table_name'], interval=interval
+            )
+    return schemas
+
+
+def shard_tables(import_single: bool = False, keep_years: int = None) -> None:
+    """
+    Maintains the sharded layout: imports the single-file tables into their shards and/or splits off closed years.
+
+    Args:
+        import_single: Copy every job's tables from `get_db_path()` into the job's live shard.
+            The source tables are kept; drop them once `CANDLE_DB_LAYOUT=sharded` is in use.
+        keep_years: If given, move years older than the last `keep_years` calendar years into per-year shards.
+            Rollup tables stay whole in the live shard.
+    """
+    db_path = get_db_path()
+    shards = ShardManager(os.path.join(os.path.dirname(db_path), 'shards'))
+    for job in load_refresh_jobs():
+        venue = job.get('shard', job['name'])
+        if import_single:
+            copied = shards.import_tables(db_path, venue, job['interval'], job_table_schemas(job, rollups=True))
+            logger.info(f"--- Imported {sum(copied.values())} rows of {len(copied)} table(s) into shard '{venue}_{job['interval']}' ---")
+        if keep_years is not None:
+            moved = shards.split_closed_years(venue, job['interval'], job_table_schemas(job), keep_years=keep_years)
+            for year, rows in moved.items():
+                logger.info(f"--- Moved {rows} rows of {year} out of shard '{venue}_{job['interval']}' ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=f"Maintain the per venue/interval SQLite shards used with {DB_LAYOUT_ENV_VAR}=sharded."
+    )
+    parser.add_argument('--import-single', action='store_true',
+                        help="Copy the tables of the single-file database into their shards.")
+    parser.add_argument('--split-years', type=int, metavar='KEEP_YEARS',
+                        help="Move closed years older than the last KEEP_YEARS (>= 2) into per-year shards.")
+    args = parser.parse_args()
+    if args.split_years is not None and args.split_years < 2:
+        parser.error("--split-years must keep at least 2 years")
+
+    # Moving rows must not interleave with a refresh
+    with RunLock(REFRESH_LOCK_PATH) as acquired:
+        if not acquired:
+            logger.warning("A refresh is running; skipping the shard maintenance run.")
+        else:
+            shard_tables(args.import_single, args.split_years)
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.coinalyze_stub import CoinalyzeStub, StubConfig
+
+STEP = 4 * 60 * 60
+
+
+@pytest.fixture
+def coinalyze(monkeypatch):
+    """A local Coinalyze stand-in with 3 perps per venue and 60 4h bars each."""
+    monkeypatch.setenv('COINALYZE_API_KEY', 'test')
+    with CoinalyzeStub(StubConfig(symbols_per_exchange=3, history_bars=60, latency_ms=0, latency_jitter_ms=0)) as stub:
+        yield stub
+
+
+@pytest.fixture
+def make_adapter(coinalyze):
+    """Builds adapters talking to `coinalyze`, with no disk cache and no response store unless given."""
+    from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+    from utils.reference_cache import ReferenceCache
+
+    adapters = []
+
+    def make(**kwargs):
+        kwargs.setdefault('reference_cache', ReferenceCache(cache_dir=None))
+        kwargs.setdefault('store_responses', 'response_store' in kwargs)
+        adapter = CoinalyzeRestAdapter(base_url=coinalyze.base_url, rate_limit_per_minute=6000, **kwargs)
+        adapters.append(adapter)
+        return adapter
+
+    yield make
+    for adapter in adapters:
+        adapter.close()
+
+
+@pytest.fixture
+def refresh_lock(tmp_path, monkeypatch):
+    """Points the refresh lock of every cron job at a temporary file."""
+    from cron_jobs import backfill_candles, refresh_db_4h_candles
+
+    path = str(tmp_path / 'refresh.lock')
+    for module in (refresh_db_4h_candles, backfill_candles):
+        monkeypatch.setattr(module, 'REFRESH_LOCK_PATH', path)
+    return path
@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from utils.archive import ArchiveReader, archive_closed_months, month_start, partition_path
+from utils.db_util import create_ohlcv_table
+
+from conftest import STEP
+
+TABLE = 'binance_perp_ohlcv'
+NOW = datetime(2024, 4, 15, tzinfo=timezone.utc).timestamp()
+
+
+def bars(symbol, start_t, end_t):
+    return [(symbol, t, 1.0, 2.0, 0.5, 1.5, 10.0, 5.0, None if t % 3 else 7, 3)
+            for t in range(start_t, end_t, STEP)]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    create_ohlcv_table(conn.cursor(), TABLE)
+    with conn:
+        conn.executemany(f"INSERT INTO {TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         bars('BTC', month_start(2024, 1), month_start(2024, 5))
+                         + bars('ETH', month_start(2024, 2), month_start(2024, 3)))
+    yield conn
+    conn.close()
+
+
+def test_closed_months_round_trip_through_the_archive(conn, tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    original = conn.execute(f"SELECT * FROM {TABLE} WHERE t < ? ORDER BY symbol, t", (month_start(2024, 3),)).fetchall()
+
+    archived = archive_closed_months(conn, TABLE, keep_months=2, archive_dir=archive_dir, now=NOW)
+
+    assert archived == len(original)
+    assert conn.execute(f"SELECT MIN(t) FROM {TABLE}").fetchone()[0] == month_start(2024, 3)
+    reader = ArchiveReader(archive_dir)
+    assert reader.partitions(TABLE) == [(2024, 1), (2024, 2)]
+    table = reader.read(TABLE).sort_by([('symbol', 'ascending'), ('t', 'ascending')])
+    assert [tuple(row.values()) for row in table.to_pylist()] == [
+        (symbol, t, o, h, l, c, v, bv, None if tx is None else float(tx), float(btx))
+        for symbol, t, o, h, l, c, v, bv, tx, btx in original
+    ]
+
+
+def test_reader_prunes_partitions_by_symbol_and_time(conn, tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    archive_closed_months(conn, TABLE, keep_months=2, archive_dir=archive_dir, now=NOW)
+    reader = ArchiveReader(archive_dir)
+
+    assert reader.partitions(TABLE, symbols=['ETH']) == [(2024, 2)]
+    assert reader.partitions(TABLE, end_t=month_start(2024, 2) - 1) == [(2024, 1)]
+    eth = reader.read(TABLE, symbols=['ETH'], columns=['c'])
+    assert eth.column_names == ['symbol', 't', 'c']
+    assert set(eth.column('symbol').to_pylist()) == {'ETH'}
+    assert reader.read(TABLE, symbols=['SOL']) is None
+
+
+def test_rearchiving_merges_into_the_existing_partition(conn, tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    archive_closed_months(conn, TABLE, keep_months=2, archive_dir=archive_dir, now=NOW)
+    # a late correction of an archived bar and one more symbol for the same month
+    with conn:
+        conn.executemany(f"INSERT INTO {TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         [('BTC', month_start(2024, 1), 9.0, 9.0, 9.0, 9.0, 9.0, 9.0, 9, 9)]
+                         + bars('SOL', month_start(2024, 1), month_start(2024, 1) + 2 * STEP))
+
+    archive_closed_months(conn, TABLE, keep_months=2, archive_dir=archive_dir, now=NOW)
+
+    january = ArchiveReader(archive_dir).read(TABLE, end_t=month_start(2024, 2) - 1)
+    assert january.num_rows == 31 * 6 + 2
+    corrected = [row['c'] for row in january.to_pylist() if row['symbol'] == 'BTC' and row['t'] == month_start(2024, 1)]
+    assert corrected == [9.0]
+    assert partition_path(archive_dir, TABLE, 2024, 1).endswith('year=2024/month=01/part.parquet')
@@ -0,0 +1,65 @@
+import sqlite3
+import time
+
+from cron_jobs.backfill_candles import backfill_jobs
+from cron_jobs.refresh_db_4h_candles import BINANCE_PERP_CONFIG
+from utils.backfill import find_gaps, split_gaps
+from utils.db_util import create_metric_table
+
+from conftest import STEP
+
+TABLE = 'binance_perp_ohlcv'
+
+
+def make_table(rows):
+    conn = sqlite3.connect(':memory:')
+    create_metric_table(conn.cursor(), TABLE)
+    conn.executemany(f"INSERT INTO {TABLE} (symbol, t, o, h, l, c) VALUES (?, ?, 1, 1, 1, 1)", rows)
+    return conn
+
+
+def test_find_gaps_inside_before_and_for_new_symbols():
+    conn = make_table([('BTC', t * STEP) for t in (10, 11, 14, 15)] + [('ETH', t * STEP) for t in (12, 13)])
+    c = conn.cursor()
+
+    assert find_gaps(c, TABLE, STEP) == [('BTC', 12 * STEP, 13 * STEP)]
+
+    gaps = find_gaps(c, TABLE, STEP, start_t=8 * STEP + 5, symbols=['BTC', 'ETH', 'NEW'])
+    now_t = int(time.time()) // STEP * STEP
+    assert sorted(gaps) == [
+        ('BTC', 8 * STEP, 9 * STEP),
+        ('BTC', 12 * STEP, 13 * STEP),
+        ('ETH', 8 * STEP, 11 * STEP),
+        ('NEW', 8 * STEP, now_t),
+    ]
+
+
+def test_split_gaps_into_api_sized_windows():
+    assert split_gaps([('BTC', 0, 9 * STEP)], STEP, max_points=4) == [
+        ('BTC', 0, 3 * STEP), ('BTC', 4 * STEP, 7 * STEP), ('BTC', 8 * STEP, 9 * STEP)
+    ]
+
+
+def test_backfill_fills_gaps_and_newly_listed_markets(tmp_path, coinalyze, make_adapter, refresh_lock):
+    db_path = str(tmp_path / 'candles.db')
+    job = {**BINANCE_PERP_CONFIG, 'metrics': {}, 'rollups': ['1d']}
+    last_t = int(time.time()) // STEP * STEP
+    start_t = last_t - 20 * STEP
+    known = 'C0000USDT_PERP.A'
+    with sqlite3.connect(db_path) as conn:
+        create_metric_table(conn.cursor(), TABLE)
+        conn.executemany(
+            f"INSERT INTO {TABLE} (symbol, t, o, h, l, c) VALUES (?, ?, 1, 1, 1, 1)",
+            [(known, t) for t in range(start_t, last_t + 1, STEP) if t != start_t + 5 * STEP]
+        )
+
+    assert backfill_jobs(start_t, jobs=[job], ca=make_adapter(), db_path=db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        counts = dict(conn.execute(f"SELECT symbol, COUNT(*) FROM {TABLE} WHERE t >= ? GROUP BY symbol", (start_t,)))
+        pending = conn.execute("SELECT COUNT(*) FROM backfill_windows WHERE status = 'pending'").fetchone()[0]
+        days = conn.execute(f"SELECT COUNT(DISTINCT symbol) FROM {TABLE}_1d").fetchone()[0]
+    # the known market's hole and both markets it had never stored, from start_t to the current bar
+    assert counts == {f'C000{i}USDT_PERP.A': 21 for i in range(3)}
+    assert pending == 0
+    assert days == 3
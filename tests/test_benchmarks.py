@@ -0,0 +1,62 @@
+import json
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from benchmarks.coinalyze_stub import CoinalyzeStub, StubConfig
+from benchmarks.run_benchmarks import compare
+
+from conftest import STEP
+
+
+def get(stub, path):
+    with urlopen(stub.base_url + path) as response:
+        return json.load(response)
+
+
+def test_stub_lists_perps_on_both_venues(coinalyze):
+    markets = get(coinalyze, 'future-markets')
+
+    assert [m['symbol'] for m in markets] == [f'C000{i}USDT_PERP.{ex}' for ex in 'AH' for i in range(3)]
+
+
+def test_stub_history_is_clipped_to_its_window_and_deterministic(coinalyze):
+    now = int(time.time())
+    path = f'ohlcv-history?symbols=C0000USDT_PERP.A,C0001USDT_PERP.A&interval=4hour&from=0&to={now}'
+
+    body = get(coinalyze, path)
+
+    assert [entry['symbol'] for entry in body] == ['C0000USDT_PERP.A', 'C0001USDT_PERP.A']
+    ts = [bar['t'] for bar in body[0]['history']]
+    assert len(ts) == 60
+    assert all(b - a == STEP for a, b in zip(ts, ts[1:]))
+    assert ts[-1] == now // STEP * STEP
+    assert get(coinalyze, path) == body
+
+
+def test_stub_injects_faults_and_counts_them():
+    config = StubConfig(symbols_per_exchange=1, latency_ms=0, latency_jitter_ms=0, error_429_rate=1.0, retry_after=7)
+    with CoinalyzeStub(config) as stub:
+        try:
+            urlopen(stub.base_url + 'future-markets')
+        except HTTPError as e:
+            assert e.code == 429
+            assert e.headers['Retry-After'] == '7'
+        else:
+            raise AssertionError('expected a 429')
+
+    assert stub.counters['requests'] == 1
+    assert stub.counters['429'] == 1
+    assert stub.counters['ok'] == 0
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {'cold_start': {'wall_s': 10.0, 'requests': 100, 'rows_per_s': 1000.0, 'peak_rss_mb': 50.0}}
+    results = {
+        'cold_start': {'wall_s': 10.5, 'requests': 130, 'rows_per_s': 700.0, 'peak_rss_mb': 50.0},
+        'new_scenario': {'wall_s': 99.0},
+    }
+
+    regressions = compare(results, baseline, tolerance=0.1)
+
+    assert [line.split(':')[0] for line in regressions] == ['cold_start.requests', 'cold_start.rows_per_s']
@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from utils.candle_store import CandleStore
+from utils.db_util import create_metric_table, create_read_indexes
+
+TABLE = 'binance_perp_ohlcv'
+
+
+def insert(db_path, rows):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(f"INSERT OR REPLACE INTO {TABLE} (symbol, t, o, h, l, c, v) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # URI metacharacters in the path must not break the read-only connection
+    path = tmp_path / 'odd ?#% dir' / 'candles.db'
+    path.parent.mkdir()
+    with sqlite3.connect(path) as conn:
+        create_metric_table(conn.cursor(), TABLE)
+        create_read_indexes(conn.cursor(), TABLE)
+    insert(str(path), [('BTC', t, 1.0, 2.0, 0.5, 1.5, 10.0) for t in (100, 200, 300)] + [('ETH', 200, 3.0, 4.0, 2.5, 3.5, 5.0)])
+    return str(path)
+
+
+@pytest.fixture
+def store(db_path):
+    store = CandleStore(db_path, TABLE)
+    yield store
+    store.close()
+
+
+def test_reads_ranges_and_cross_sections(store):
+    assert store.get_range('BTC', start_t=150)['t'].tolist() == [200, 300]
+    cross = store.get_cross_section(200, columns=['c'])
+    assert (cross['symbol'].tolist(), cross['c'].tolist()) == (['BTC', 'ETH'], [1.5, 3.5])
+    assert store.symbols() == ['BTC', 'ETH']
+    assert store.latest_t() == 300
+
+
+def test_cache_hit_runs_no_table_query(store):
+    store.get_range('BTC')
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+
+    store.get_range('BTC')
+
+    assert (store.hits, store.misses) == (1, 1)
+    assert statements == ['PRAGMA data_version']
+
+
+def test_commit_by_another_connection_invalidates_the_cache(db_path, store):
+    assert store.get_range('BTC')['c'].tolist() == [1.5, 1.5, 1.5]
+
+    insert(db_path, [('BTC', 300, 1.0, 2.0, 0.5, 9.0, 10.0)])
+
+    assert store.get_range('BTC')['c'].tolist() == [1.5, 1.5, 9.0]
+    assert store.misses == 2
+
+
+def test_store_is_read_only(store):
+    with pytest.raises(sqlite3.OperationalError):
+        store._conn.execute(f"DELETE FROM {TABLE}")
@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+
+from utils.changelog import (
+    RECORD_CHANGE_SQL, RUNS_TABLE, ChangeFeed, abandon_unfinished_runs, begin_run, changes_since, finish_run
+)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'candles.db')
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def record(conn, run_id, symbol, min_t, max_t, table_name='binance_perp_ohlcv'):
+    with conn:
+        conn.execute(RECORD_CHANGE_SQL, (run_id, table_name, symbol, min_t, max_t, 1, 0))
+
+
+def test_changes_of_finished_runs_and_cursor(conn):
+    run_1 = begin_run(conn, 'refresh')
+    record(conn, run_1, 'BTC', 100, 200)
+    record(conn, run_1, 'BTC', 50, 150)     # merged into one range per (run, table, symbol)
+    record(conn, run_1, 'ETH', 100, 100, table_name='hyperliquid_perp_ohlcv')
+    finish_run(conn, run_1)
+
+    changes, cursor = changes_since(conn, 0)
+    assert cursor == run_1
+    assert [(ch.symbol, ch.min_t, ch.max_t, ch.n_inserted) for ch in changes] == [('BTC', 50, 200, 2), ('ETH', 100, 100, 1)]
+
+    changes, _ = changes_since(conn, 0, table_name='hyperliquid_perp_ohlcv')
+    assert [ch.symbol for ch in changes] == ['ETH']
+    assert changes_since(conn, cursor) == ([], cursor)
+
+
+def test_unfinished_run_holds_back_later_runs(conn):
+    run_1 = begin_run(conn, 'refresh')
+    run_2 = begin_run(conn, 'backfill')
+    record(conn, run_1, 'BTC', 100, 200)
+    record(conn, run_2, 'ETH', 100, 200)
+    finish_run(conn, run_2)
+
+    assert changes_since(conn, 0) == ([], 0)
+
+    finish_run(conn, run_1)
+    changes, cursor = changes_since(conn, 0)
+    assert cursor == run_2
+    assert [ch.run_id for ch in changes] == [run_1, run_2]
+
+
+def test_abandoned_run_no_longer_blocks_the_feed(conn):
+    dead = begin_run(conn, 'refresh')
+    record(conn, dead, 'BTC', 100, 200)     # committed before the process died
+    for _ in range(2):
+        finish_run(conn, begin_run(conn, 'refresh'))
+    assert changes_since(conn, 0) == ([], 0)
+
+    assert abandon_unfinished_runs(conn) == [dead]
+    assert abandon_unfinished_runs(conn) == []
+    assert conn.execute(f"SELECT abandoned FROM {RUNS_TABLE} WHERE run_id = ?", (dead,)).fetchone() == (1,)
+
+    changes, cursor = changes_since(conn, 0)
+    assert cursor == dead + 2
+    assert [(ch.run_id, ch.symbol) for ch in changes] == [(dead, 'BTC')]
+
+
+def test_registry_without_abandoned_column_is_migrated(conn):
+    conn.execute(f"CREATE TABLE {RUNS_TABLE} (run_id INTEGER PRIMARY KEY AUTOINCREMENT, job TEXT, "
+                 f"started_at INTEGER, finished_at INTEGER)")
+    conn.execute(f"INSERT INTO {RUNS_TABLE} (job, started_at) VALUES ('refresh', 0)")
+    conn.commit()
+
+    assert abandon_unfinished_runs(conn) == [1]
+
+
+def test_change_feed_cursor_is_durable(db_path, conn):
+    run_id = begin_run(conn, 'refresh')
+    record(conn, run_id, 'BTC', 100, 200)
+    finish_run(conn, run_id)
+
+    feed = ChangeFeed(db_path, consumer='alerts')
+    changes, cursor = feed.poll()
+    assert len(changes) == 1
+    feed.commit(cursor)
+    feed.close()
+
+    feed = ChangeFeed(db_path, consumer='alerts')
+    assert feed.cursor() == run_id
+    assert feed.poll() == ([], run_id)
+    feed.close()
+
+    other = ChangeFeed(db_path, consumer='other')
+    assert other.cursor() == 0
+    other.close()
+
+
+def test_failed_refresh_still_finishes_its_run(db_path, conn, monkeypatch):
+    from cron_jobs import refresh_db_4h_candles
+
+    def failing_refresh_jobs(*args, **kwargs):
+        raise RuntimeError('network down')
+
+    monkeypatch.setattr(refresh_db_4h_candles, 'refresh_jobs', failing_refresh_jobs)
+    dead = begin_run(conn, 'refresh_db_4h_candles')
+    with pytest.raises(RuntimeError):
+        refresh_db_4h_candles.run_refresh(None, conn, db_path, jobs=[])
+
+    rows = conn.execute(f"SELECT run_id, abandoned, finished_at IS NOT NULL FROM {RUNS_TABLE} ORDER BY run_id").fetchall()
+    assert rows == [(dead, 1, 1), (dead + 1, 0, 1)]
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import sqlite3
+
+import pytest
+
+from benchmarks import import_budget
+from cron_jobs import __main__ as cli
+from cron_jobs import refresh_db_4h_candles
+from cron_jobs.refresh_db_4h_candles import BINANCE_PERP_CONFIG, describe_refresh
+from utils.db_util import connect_db, create_metric_table
+from utils.market_store import sync_markets
+
+MARKETS = [
+    {'symbol': f'C{i}USDT_PERP.A', 'exchange': 'A', 'symbol_on_exchange': f'C{i}USDT', 'base_asset': f'C{i}',
+     'quote_asset': 'USDT', 'is_perpetual': True, 'margined': 'STABLE', 'expire_at': None,
+     'has_long_short_ratio_data': True, 'has_ohlcv_data': True, 'has_buy_sell_data': True}
+    for i in range(3)
+]
+
+
+def digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def job():
+    return {**BINANCE_PERP_CONFIG, 'metrics': {}}
+
+
+def test_dry_run_on_a_missing_database_creates_nothing(tmp_path, job):
+    plans = describe_refresh([job], db_path=str(tmp_path / 'candles.db'))
+
+    assert plans[0]['tickers'] == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_dry_run_reads_an_existing_database_without_writing(tmp_path, job):
+    db_path = str(tmp_path / 'candles.db')
+    conn, c = connect_db(db_path)
+    sync_markets(conn, MARKETS)
+    create_metric_table(c, job['table_name'])
+    c.execute(f"INSERT INTO {job['table_name']} (symbol, t, o, h, l, c) VALUES ('C0USDT_PERP.A', 14400, 1, 1, 1, 1)")
+    conn.commit()
+    conn.close()
+    before = digest(db_path)
+
+    plan = describe_refresh([job], db_path=db_path)[0]
+
+    assert (plan['tickers'], plan['tickers_without_history'], plan['newest_watermark']) == (3, 2, 14400)
+    assert digest(db_path) == before
+
+
+def test_dry_run_command_skips_the_disk_cache_and_response_store(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(refresh_db_4h_candles, 'get_db_path', lambda: str(tmp_path / 'candles.db'))
+    monkeypatch.setenv('COINALYZE_API_KEY', 'test')
+    monkeypatch.setenv('LOG_NAME', 'dry_run')
+    monkeypatch.setenv('COINALYZE_RESPONSE_STORE', str(tmp_path / 'responses'))
+    created = []
+    monkeypatch.setattr('utils.reference_cache.os.makedirs', lambda path, **kwargs: created.append(path))
+
+    assert cli.main(['dry-run', '--json']) == 0
+
+    assert '"total"' in capsys.readouterr().out
+    assert created == []
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('entry_point', sorted(import_budget.BUDGETS))
+def test_import_budget(entry_point):
+    # IMPORT_BUDGET_SCALE loosens the budgets on slow or loaded machines
+    modules, budget_ms, forbidden = import_budget.BUDGETS[entry_point]
+    result = import_budget.measure(modules, forbidden, runs=3)
+
+    assert result['loaded'] == []
+    assert result['median_ms'] <= budget_ms * float(os.getenv('IMPORT_BUDGET_SCALE', 1))
@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from utils.db_util import (
+    SQLITE_PAGE_SIZE, build_upsert_sql, connect_db, create_ohlcv_table, is_without_rowid, migrate_db,
+    migrate_ohlcv_table, ohlcv_rows
+)
+
+TABLE = 'binance_perp_ohlcv'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'candles.db')
+
+
+def test_new_databases_are_tuned(db_path):
+    conn, c = connect_db(db_path)
+    create_ohlcv_table(c, TABLE)
+    conn.commit()
+
+    assert c.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert c.execute("PRAGMA synchronous").fetchone()[0] == 1   # NORMAL
+    assert c.execute("PRAGMA page_size").fetchone()[0] == SQLITE_PAGE_SIZE
+    assert is_without_rowid(c, TABLE) is True
+    assert is_without_rowid(c, 'missing') is None
+    conn.close()
+
+
+def test_upsert_overwrites_the_forming_bar(db_path):
+    conn, c = connect_db(db_path)
+    create_ohlcv_table(c, TABLE)
+    sql = build_upsert_sql(TABLE)
+    c.executemany(sql, ohlcv_rows('BTC', [{'t': 100, 'o': 1, 'h': 2, 'l': 0.5, 'c': 1.5, 'v': 10}]))
+    c.executemany(sql, ohlcv_rows('BTC', [{'t': 100, 'o': 1, 'h': 3, 'l': 0.5, 'c': 2.5, 'v': 20, 'tx': 7}]))
+
+    assert c.execute(f"SELECT h, c, v, tx FROM {TABLE}").fetchall() == [(3.0, 2.5, 20.0, 7)]
+    conn.close()
+
+
+def test_migrate_db_rebuilds_legacy_tables(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA page_size = 4096")
+        conn.execute(f"CREATE TABLE {TABLE} (symbol TEXT, t INTEGER, o REAL, h REAL, l REAL, c REAL, v REAL, "
+                     f"bv REAL, tx INTEGER, btx INTEGER, PRIMARY KEY (symbol, t))")
+        conn.executemany(f"INSERT INTO {TABLE} (symbol, t, c) VALUES (?, ?, ?)",
+                         [('ETH', 200, 2.0), ('BTC', 100, 1.0), ('BTC', 200, 1.5)])
+        assert is_without_rowid(conn.cursor(), TABLE) is False
+
+    migrate_db(db_path, [TABLE, 'never_created'])
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    assert is_without_rowid(c, TABLE) is True
+    assert c.execute(f"SELECT symbol, t, c FROM {TABLE}").fetchall() == [('BTC', 100, 1.0), ('BTC', 200, 1.5), ('ETH', 200, 2.0)]
+    assert c.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                     (TABLE,)).fetchall() == [(f'idx_{TABLE}_t',)]
+    assert c.execute("PRAGMA page_size").fetchone()[0] == SQLITE_PAGE_SIZE
+    assert c.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert migrate_ohlcv_table(conn, TABLE) is False
+    conn.close()
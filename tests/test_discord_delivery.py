@@ -0,0 +1,88 @@
+import time
+
+import pytest
+import requests
+
+from benchmarks.discord_stub import DiscordStub, DiscordStubConfig
+from utils.discord_delivery import PRIORITY_EMERGENCY, DiscordDeliveryError, DiscordDeliveryQueue
+from utils.discord_notifier import DiscordNotifier
+
+
+@pytest.fixture
+def stub():
+    with DiscordStub(DiscordStubConfig(bucket_limit=50, reset_after=1.0, latency_ms=1)) as stub:
+        yield stub
+
+
+def delivered(stub, name):
+    return [payload for path, payload, _, _ in stub.messages if f'/{name}/' in path]
+
+
+def test_emergency_messages_jump_the_queue(stub):
+    delivery = DiscordDeliveryQueue(coalesce_window=0.3)
+    normal = delivery.send(stub.webhook_url('alerts'), content='funding flipped')
+    emergency = delivery.send(stub.webhook_url('emergency'), content='script is down', priority=PRIORITY_EMERGENCY)
+    delivery.close()
+
+    assert (normal.result(), emergency.result()) == (204, 204)
+    assert ['/emergency/' in path for path, _, _, _ in stub.messages] == [True, False]
+
+
+def test_a_burst_is_coalesced_per_webhook_and_username(stub):
+    delivery = DiscordDeliveryQueue(coalesce_window=0.2)
+    futures = [delivery.send(stub.webhook_url('alerts'), content=f'alert {i}', username='screener') for i in range(5)]
+    other = delivery.send(stub.webhook_url('alerts'), content='daily check', username='daily')
+    delivery.close()
+
+    assert [f.result() for f in futures + [other]] == [204] * 6
+    payloads = delivered(stub, 'alerts')
+    assert [p['content'] for p in payloads if p['username'] == 'screener'] == ['\n'.join(f'alert {i}' for i in range(5))]
+    assert [p['content'] for p in payloads if p['username'] == 'daily'] == ['daily check']
+
+
+def test_coalesced_messages_respect_the_content_limit(stub):
+    delivery = DiscordDeliveryQueue(coalesce_window=0.2)
+    futures = [delivery.send(stub.webhook_url('alerts'), content=str(i) * 900) for i in range(3)]
+    delivery.close()
+
+    assert [f.result() for f in futures] == [204] * 3
+    assert [len(p['content']) for p in delivered(stub, 'alerts')] == [900 * 2 + 1, 900]
+
+
+def test_429_waits_for_retry_after_then_delivers():
+    with DiscordStub(DiscordStubConfig(bucket_limit=1, reset_after=0.5, latency_ms=1)) as stub:
+        url = stub.webhook_url('alerts')
+        requests.post(url, json={'content': 'another client used up the bucket'})
+        delivery = DiscordDeliveryQueue(coalesce_window=0)
+        started = time.monotonic()
+        future = delivery.send(url, content='after the limit')
+
+        assert future.result(10) == 204
+        assert time.monotonic() - started >= 0.3
+        assert stub.counters['429'] >= 1
+        assert delivered(stub, 'alerts')[-1]['content'] == 'after the limit'
+        delivery.close()
+
+
+def test_send_message_blocks_until_delivered(stub):
+    delivery = DiscordDeliveryQueue(coalesce_window=0.1)
+    notifier = DiscordNotifier(
+        {'discord': {'webhook_mappings': {'oi': stub.webhook_url('oi')}, 'mention_discord_ids': []}},
+        venue_name='binance', delivery=delivery
+    )
+
+    assert notifier.send_message({}, 'oi', {'title': 'OI spike'}, mention=False) == 204
+    # already at the stub when send_message returns
+    assert delivered(stub, 'oi')[0]['content'] == '\nOI spike'
+
+    future = notifier.queue_message({}, 'oi', {'title': 'queued'}, mention=False)
+    assert future.result(10) == 204
+    delivery.close()
+
+
+def test_send_after_close_fails_the_future(stub):
+    delivery = DiscordDeliveryQueue()
+    delivery.close()
+
+    with pytest.raises(DiscordDeliveryError):
+        delivery.send(stub.webhook_url('alerts'), content='too late').result(1)
@@ -0,0 +1,128 @@
+import json
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.http_transport import HttpTransport, RetryBudgetExceeded, parse_retry_after
+
+
+class ScriptedServer:
+    """Answers GETs with the queued (status, headers) pairs, then 200s; counts TCP connections."""
+
+    def __init__(self, script=()) -> None:
+        self.script = list(script)
+        self.connections = 0
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self) -> None:
+                super().setup()
+                server.connections += 1
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                server.requests += 1
+                status, headers = server.script.pop(0) if server.script else (200, {})
+                body = json.dumps({'status': status}).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}/v1/ohlcv-history'
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(script=()):
+        servers.append(ScriptedServer(script))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2.5') == 2.5
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert 0 <= parse_retry_after(formatdate(usegmt=True)) <= 1
+
+
+def test_connections_are_reused(make_server):
+    server = make_server()
+    transport = HttpTransport()
+    for _ in range(5):
+        assert transport.get(server.url).status_code == 200
+    transport.close()
+
+    assert (server.requests, server.connections) == (5, 1)
+
+
+def test_retryable_statuses_are_retried(make_server):
+    server = make_server([(503, {}), (429, {'Retry-After': '0'}), (502, {})])
+    transport = HttpTransport(backoff_base=0.001)
+
+    assert transport.get(server.url).status_code == 200
+    stats = transport.stats.as_dict()
+    assert (stats['requests'], stats['retries']) == (4, 3)
+    assert stats['retries_by_reason'] == {'503': 1, '429': 1, '502': 1}
+    transport.close()
+
+
+def test_other_errors_are_returned_without_retrying(make_server):
+    server = make_server([(401, {})])
+    transport = HttpTransport(backoff_base=0.001)
+
+    assert transport.get(server.url).status_code == 401
+    assert server.requests == 1
+    transport.close()
+
+
+def test_gives_up_after_max_retries(make_server):
+    server = make_server([(500, {})] * 10)
+    transport = HttpTransport(max_retries=2, backoff_base=0.001)
+
+    with pytest.raises(RetryBudgetExceeded):
+        transport.get(server.url)
+    assert server.requests == 3
+    transport.close()
+
+
+def test_gives_up_when_retry_after_exceeds_the_budget(make_server):
+    server = make_server([(429, {'Retry-After': '60'})])
+    transport = HttpTransport(retry_budget=5)
+
+    with pytest.raises(RetryBudgetExceeded):
+        transport.get(server.url)
+    assert server.requests == 1
+    transport.close()
+
+
+def test_connection_errors_are_retried():
+    transport = HttpTransport(max_retries=1, backoff_base=0.001, connect_timeout=0.5)
+
+    with pytest.raises(RetryBudgetExceeded, match='ConnectionError'):
+        transport.get('http://127.0.0.1:9/unreachable')
+    assert transport.stats.as_dict()['requests'] == 2
+    transport.close()
@@ -0,0 +1,73 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from utils.db_util import create_ohlcv_table
+from utils.indicators import IndicatorEngine, rolling_mean
+
+from conftest import STEP
+
+TABLE = 'binance_perp_ohlcv'
+T0 = 1704067200
+
+
+def bars(symbol, start, stop):
+    return [(symbol, T0 + i * STEP, 100.0 + i, 101.0 + i + i % 3, 99.0 + i - i % 2, 100.5 + i + (i % 5) * 0.3,
+             10.0, 5.0, 1, 1) for i in range(start, stop)]
+
+
+def write(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        create_ohlcv_table(conn.cursor(), TABLE)
+        conn.executemany(f"INSERT OR REPLACE INTO {TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # a space and a '?' in the path must not break the read-only URI
+    path = str(tmp_path / 'candles ?.db')
+    write(path, bars('BTC', 0, 40) + bars('ETH', 5, 40))
+    return path
+
+
+def test_missing_bars_are_nan_and_windows_need_every_bar(db_path):
+    engine = IndicatorEngine(db_path=db_path, table_name=TABLE)
+
+    assert engine.symbols == ['BTC', 'ETH']
+    assert engine.matrices['c'].shape == (2, 40)
+    sma = engine.compute('sma', window=3)
+    assert np.isnan(sma[1, :7]).all() and not np.isnan(sma[1, 7])
+    assert sma[0, 2] == pytest.approx(np.mean(engine.matrices['c'][0, :3]))
+    np.testing.assert_allclose(sma, rolling_mean(engine.matrices['c'], 3), equal_nan=True)
+
+
+@pytest.mark.parametrize('name, params', [
+    ('sma', {'window': 5}), ('returns', {'log': True}), ('atr', {'window': 4}),
+    ('realized_vol', {'window': 6}), ('zscore', {'window': 5}),
+])
+def test_refresh_extends_cached_indicators_like_a_full_load(db_path, name, params):
+    engine = IndicatorEngine(db_path=db_path, table_name=TABLE)
+    engine.compute(name, **params)
+
+    # the previously last bar is revised and ten new bars arrive
+    write(db_path, [('BTC', T0 + 39 * STEP, 1.0, 250.0, 1.0, 200.0, 1.0, 1.0, 1, 1)]
+          + bars('BTC', 40, 50) + bars('ETH', 40, 50))
+    assert engine.refresh() == 10
+
+    fresh = IndicatorEngine(db_path=db_path, table_name=TABLE)
+    np.testing.assert_array_equal(engine.times, fresh.times)
+    np.testing.assert_allclose(engine.compute(name, **params), fresh.compute(name, **params), equal_nan=True)
+
+
+def test_refresh_reloads_when_a_symbol_is_listed(db_path):
+    engine = IndicatorEngine(db_path=db_path, table_name=TABLE)
+    engine.compute('sma', window=3)
+
+    write(db_path, bars('SOL', 38, 42) + bars('BTC', 40, 42))
+    engine.refresh()
+
+    assert engine.symbols == ['BTC', 'ETH', 'SOL']
+    assert set(engine.latest('sma', window=3)) == {'BTC', 'SOL'}
@@ -0,0 +1,69 @@
+import json
+import logging
+import queue
+import sys
+
+from utils import logging as log_util
+from utils.logging import JsonFormatter, NonBlockingQueueHandler, RateLimitFilter, local_time_converter
+
+
+def record(msg='hello', level=logging.INFO, lineno=10, created=1_700_000_000.25, exc_info=None):
+    rec = logging.LogRecord('custom_logger', level, '/repo/utils/db_util.py', lineno, msg, None, exc_info)
+    rec.created = created
+    return rec
+
+
+def test_json_formatter_writes_one_object_per_record():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        rec = record('failed %s', level=logging.ERROR, exc_info=sys.exc_info())
+    rec.args = ('fetch',)
+
+    line = JsonFormatter().format(rec)
+
+    assert '\n' not in line
+    entry = json.loads(line)
+    assert entry['ts'] == '2023-11-15T06:13:20.250+08:00'
+    assert (entry['level'], entry['file'], entry['line'], entry['msg']) == ('ERROR', 'db_util.py', 10, 'failed fetch')
+    assert 'ValueError: boom' in entry['exc']
+
+
+def test_console_timestamps_use_the_record_time_in_singapore():
+    assert local_time_converter(1_700_000_000.25)[:6] == (2023, 11, 15, 6, 13, 20)
+
+
+def test_rate_limit_per_call_site_reports_suppressed_records():
+    limiter = RateLimitFilter(limit=2, window=10)
+
+    passed = [limiter.filter(record(created=100 + i)) for i in range(5)]
+    other_site = limiter.filter(record(lineno=11, created=104))
+    warning = limiter.filter(record(level=logging.WARNING, created=104))
+    after_window = record('next', created=111)
+
+    assert passed == [True, True, False, False, False]
+    assert other_site and warning
+    assert limiter.filter(after_window)
+    assert after_window.getMessage() == 'next (3 similar messages suppressed)'
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+
+    for _ in range(3):
+        handler.emit(record())
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 2
+
+
+def test_log_file_is_named_after_the_script(monkeypatch):
+    monkeypatch.setattr(log_util, 'LOG_NAME', None)
+    monkeypatch.setattr(sys, 'argv', ['/repo/cron_jobs/refresh_db_4h_candles.py'])
+    assert log_util._script_name() == 'refresh_db_4h_candles'
+
+    monkeypatch.setattr(sys, 'argv', ['/repo/cron_jobs/__main__.py'])
+    assert log_util._script_name() == 'cron_jobs'
+
+    monkeypatch.setattr(log_util, 'LOG_NAME', 'refresh')
+    assert log_util._script_name() == 'refresh'
@@ -0,0 +1,36 @@
+import json
+
+from utils.metrics import RunMetrics
+
+
+def test_prometheus_output_uses_refresh_job_label():
+    metrics = RunMetrics(job='refresh_db_4h_candles')
+    metrics.inc('refresh_jobs_total', table='binance_perp_ohlcv', status='ok')
+    metrics.set('refresh_run_duration_seconds', 12.5)
+    for value in (0.01, 0.2, 100):
+        metrics.observe('http_request_seconds', value)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'refresh_jobs_total{status="ok",table="binance_perp_ohlcv",refresh_job="refresh_db_4h_candles"} 1' in lines
+    assert 'refresh_run_duration_seconds{refresh_job="refresh_db_4h_candles"} 12.5' in lines
+    assert 'http_request_seconds_bucket{refresh_job="refresh_db_4h_candles",le="0.25"} 2' in lines
+    assert 'http_request_seconds_bucket{refresh_job="refresh_db_4h_candles",le="+Inf"} 3' in lines
+    assert not any('{job=' in line or ',job=' in line for line in lines)
+
+
+def test_write_summary_appends_json_and_replaces_the_textfile(tmp_path):
+    jsonl_path, prom_path = str(tmp_path / 'metrics.jsonl'), str(tmp_path / 'refresh.prom')
+    metrics = RunMetrics(job='refresh_db_4h_candles')
+    metrics.inc('sqlite_rows_written_total', 10)
+    metrics.write_summary(jsonl_path, prom_path)
+    metrics.reset(job='refresh_db_4h_candles')
+    metrics.inc('sqlite_rows_written_total', 3)
+    metrics.write_summary(jsonl_path, prom_path)
+
+    with open(jsonl_path) as f:
+        runs = [json.loads(line) for line in f]
+    assert [run['counters'][0]['value'] for run in runs] == [10, 3]
+    with open(prom_path) as f:
+        assert 'sqlite_rows_written_total{refresh_job="refresh_db_4h_candles"} 3' in f.read().splitlines()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['metrics.jsonl', 'refresh.prom']
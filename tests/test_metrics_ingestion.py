@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+from cron_jobs.refresh_db_4h_candles import BINANCE_PERP_CONFIG, refresh_jobs
+from utils.db_util import EMPTY_FETCHES_TABLE, refresh_metrics
+from utils.shards import DB_LAYOUT_ENV_VAR
+
+SYMBOLS = [f'C000{i}USDT_PERP.A' for i in range(3)]
+TABLES = {
+    'ohlcv': 'binance_perp_ohlcv',
+    'funding_rate': 'binance_perp_funding_rate',
+    'liquidations': 'binance_perp_liquidations',
+    'long_short_ratio': 'binance_perp_long_short_ratio',
+}
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.delenv(DB_LAYOUT_ENV_VAR, raising=False)
+    return str(tmp_path / 'candles.db')
+
+
+def count_by_symbol(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute(f"SELECT symbol, COUNT(*) FROM {table} GROUP BY symbol"))
+
+
+def test_every_metric_lands_in_its_own_table(db_path, coinalyze, make_adapter):
+    results = refresh_metrics(db_path, TABLES, SYMBOLS, '4hour', ca=make_adapter())
+
+    assert {metric: result.rows_inserted for metric, result in results.items()} == {metric: 180 for metric in TABLES}
+    with sqlite3.connect(db_path) as conn:
+        t, l, s = conn.execute(f"SELECT t, l, s FROM {TABLES['liquidations']} LIMIT 1").fetchone()
+        assert (l, s) == (100.0 + t % 31, 80.0 + t % 29)
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLES['long_short_ratio']})")]
+        assert columns == ['symbol', 't', 'r', 'l', 's']
+
+
+def test_metric_symbols_narrow_one_metric(db_path, coinalyze, make_adapter):
+    refresh_metrics(db_path, TABLES, SYMBOLS, '4hour', ca=make_adapter(),
+                    metric_symbols={'long_short_ratio': SYMBOLS[:1]})
+
+    assert count_by_symbol(db_path, TABLES['long_short_ratio']) == {SYMBOLS[0]: 60}
+    assert count_by_symbol(db_path, TABLES['funding_rate']) == {symbol: 60 for symbol in SYMBOLS}
+
+
+def test_markets_without_a_metric_are_never_requested(db_path, coinalyze, make_adapter):
+    coinalyze.markets[1]['has_long_short_ratio_data'] = False
+
+    refresh_jobs([BINANCE_PERP_CONFIG], ca=make_adapter(), db_path=db_path)
+
+    assert set(count_by_symbol(db_path, 'binance_perp_long_short_ratio')) == {SYMBOLS[0], SYMBOLS[2]}
+    assert set(count_by_symbol(db_path, 'binance_perp_ohlcv')) == set(SYMBOLS)
+
+
+def test_empty_windows_are_remembered_so_the_lookback_is_not_refetched(db_path, coinalyze, make_adapter, monkeypatch):
+    history = coinalyze.history
+
+    def unlisted(endpoint, symbols, interval, from_t, to_t):
+        return [dict(entry, history=[]) if entry['symbol'] == SYMBOLS[2] else entry
+                for entry in history(endpoint, symbols, interval, from_t, to_t)]
+
+    monkeypatch.setattr(coinalyze, 'history', unlisted)
+    tables = {'ohlcv': TABLES['ohlcv']}
+    ca = make_adapter()
+    refresh_metrics(db_path, tables, SYMBOLS, '4hour', ca=ca)
+
+    with sqlite3.connect(db_path) as conn:
+        (table_name, symbol, empty_t), = conn.execute(f"SELECT * FROM {EMPTY_FETCHES_TABLE}")
+    assert (table_name, symbol) == (TABLES['ohlcv'], SYMBOLS[2])
+    assert SYMBOLS[2] not in count_by_symbol(db_path, TABLES['ohlcv'])
+
+    # once listed, only the bars after the empty window are fetched
+    monkeypatch.setattr(coinalyze, 'history', history)
+    result = refresh_metrics(db_path, tables, SYMBOLS, '4hour', ca=ca)['ohlcv']
+
+    with sqlite3.connect(db_path) as conn:
+        first_t = conn.execute(f"SELECT MIN(t) FROM {TABLES['ohlcv']} WHERE symbol = ?", (SYMBOLS[2],)).fetchone()[0]
+    assert first_t >= empty_t
+    assert result.rows_inserted <= 2
@@ -0,0 +1,25 @@
+import json
+
+from utils.ohlcv_arrays import decode_ohlcv_batches
+
+
+def _payload(symbol, times):
+    history = [{'t': t, 'o': 1.0, 'h': 2.0, 'l': 0.5, 'c': 1.5, 'v': 10.0} for t in times]
+    return json.dumps([{'symbol': symbol, 'history': history}])
+
+
+def test_for_symbol_slices_each_symbol():
+    arrays = decode_ohlcv_batches([_payload('B', [3, 1]), _payload('A', [2])], ['A', 'B', 'C'])
+
+    assert arrays.for_symbol('A')['t'].tolist() == [2]
+    assert arrays.for_symbol('B')['t'].tolist() == [1, 3]
+    assert len(arrays.for_symbol('C')) == 0
+
+
+def test_for_symbol_unknown_symbol_is_empty():
+    arrays = decode_ohlcv_batches([_payload('A', [1, 2])], ['A'])
+
+    bars = arrays.for_symbol('MISSING')
+
+    assert len(bars) == 0
+    assert bars.dtype == arrays.bars.dtype
@@ -0,0 +1,64 @@
+import bisect
+
+import pytest
+
+from utils import rate_limiter
+from utils.rate_limiter import TokenBucket
+
+
+class FakeClock:
+    """Stands in for the `time` module: `sleep` advances `monotonic` instantly."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', fake)
+    return fake
+
+
+def max_in_window(times, window: float = 60.0) -> int:
+    # acquisitions within [t, t + window) for every acquisition time t
+    times = sorted(times)
+    return max(bisect.bisect_left(times, t + window - 1e-9) - i for i, t in enumerate(times))
+
+
+@pytest.mark.parametrize('burst', [1, 5, 10])
+def test_never_exceeds_quota_in_any_minute(clock, burst):
+    bucket = TokenBucket(rate_per_minute=40, burst=burst)
+    times = []
+    for _ in range(400):
+        bucket.acquire()
+        times.append(clock.now)
+
+    assert max_in_window(times) <= 40
+    # the cold start is not slowed down: the burst goes out at once
+    assert times[:burst] == [times[0]] * burst
+
+
+def test_quota_holds_after_idle_and_pause(clock):
+    bucket = TokenBucket(rate_per_minute=40, burst=5)
+    times = []
+    for i in range(300):
+        if i == 100:
+            clock.sleep(120)    # idle: the bucket refills to `burst`, no more
+        if i == 200:
+            bucket.pause(7)     # a 429 Retry-After drains it
+        bucket.acquire()
+        times.append(clock.now)
+
+    assert max_in_window(times) <= 40
+
+
+def test_rejects_burst_not_below_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate_per_minute=10, burst=10)
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from utils.db_util import create_metric_table, get_symbol_watermarks, refresh_data
+
+TABLE = 'binance_perp_ohlcv'
+SYMBOLS = [f'C000{i}USDT_PERP.A' for i in range(3)]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'candles.db')
+
+
+def test_watermarks_per_symbol():
+    conn = sqlite3.connect(':memory:')
+    c = conn.cursor()
+    create_metric_table(c, TABLE)
+    c.executemany(f"INSERT INTO {TABLE} (symbol, t) VALUES (?, ?)", [('BTC', 100), ('BTC', 300), ('ETH', 200)])
+
+    assert get_symbol_watermarks(c, TABLE) == {'BTC': 300, 'ETH': 200}
+    assert get_symbol_watermarks(c, TABLE, ['BTC', 'NEW']) == {'BTC': 300}
+
+
+def test_refresh_fetches_only_from_each_watermark(db_path, coinalyze, make_adapter):
+    ca = make_adapter()
+    cold = refresh_data(db_path, TABLE, SYMBOLS, '4hour', ca=ca)
+    assert (cold.rows_inserted, cold.rows_updated) == (180, 0)
+
+    with sqlite3.connect(db_path) as conn:
+        latest_t = conn.execute(f"SELECT MAX(t) FROM {TABLE}").fetchone()[0]
+        conn.execute(f"DELETE FROM {TABLE} WHERE symbol = ? AND t > ?", (SYMBOLS[0], latest_t - 3 * 4 * 3600))
+    requests_before = coinalyze.counters['requests']
+
+    warm = refresh_data(db_path, TABLE, SYMBOLS, '4hour', ca=ca)
+
+    # the missing bars of one symbol, plus every watermark bar re-read as it may have been forming
+    assert (warm.rows_fetched, warm.rows_inserted, warm.rows_updated) == (6, 3, 3)
+    assert coinalyze.counters['requests'] - requests_before == 1
+    with sqlite3.connect(db_path) as conn:
+        counts = dict(conn.execute(f"SELECT symbol, COUNT(*) FROM {TABLE} GROUP BY symbol"))
+    assert counts == {symbol: 60 for symbol in SYMBOLS}
+
+
+def test_full_refresh_ignores_watermarks(db_path, coinalyze, make_adapter):
+    ca = make_adapter()
+    refresh_data(db_path, TABLE, SYMBOLS, '4hour', ca=ca)
+
+    full = refresh_data(db_path, TABLE, SYMBOLS, '4hour', incremental=False, ca=ca)
+
+    assert full.rows_fetched == 180
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0] == 180
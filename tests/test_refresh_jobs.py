@@ -0,0 +1,66 @@
+import json
+import sqlite3
+
+import pytest
+
+from cron_jobs.refresh_db_4h_candles import BINANCE_PERP_CONFIG, HYPERLIQUID_PERP_CONFIG, load_refresh_jobs, refresh_jobs
+from utils.metrics import run_metrics
+from utils.shards import DB_LAYOUT_ENV_VAR
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.delenv(DB_LAYOUT_ENV_VAR, raising=False)
+    run_metrics.reset()
+    return str(tmp_path / 'candles.db')
+
+
+def gauge_tables(name):
+    return {m['labels']['table'] for m in run_metrics.snapshot()['gauges'] if m['name'] == name}
+
+
+def statuses():
+    return {m['labels']['table']: m['labels']['status']
+            for m in run_metrics.snapshot()['counters'] if m['name'] == 'refresh_jobs_total'}
+
+
+def test_jobs_refresh_in_parallel_into_one_database(db_path, coinalyze, make_adapter):
+    results = refresh_jobs([BINANCE_PERP_CONFIG, HYPERLIQUID_PERP_CONFIG], ca=make_adapter(), db_path=db_path)
+
+    assert {name: result.rows_inserted for name, result in results.items()} == {
+        'binance_perp': 180, 'hyperliquid_perp': 180,
+    }
+    with sqlite3.connect(db_path) as conn:
+        for job in (BINANCE_PERP_CONFIG, HYPERLIQUID_PERP_CONFIG):
+            table = job['table_name']
+            symbols = [row[0] for row in conn.execute(f"SELECT DISTINCT symbol FROM {table} ORDER BY symbol")]
+            assert symbols == [f"C000{i}USDT_PERP.{job['filter']['exchange']}" for i in range(3)]
+            assert conn.execute(f"SELECT COUNT(*) FROM {job['metrics']['funding_rate']}").fetchone()[0] == 180
+            assert conn.execute(f"SELECT SUM(n_bars) FROM {table}_1d").fetchone()[0] == 180
+    assert statuses() == {'binance_perp_ohlcv': 'ok', 'hyperliquid_perp_ohlcv': 'ok'}
+    assert gauge_tables('refresh_job_duration_seconds') == {'binance_perp_ohlcv', 'hyperliquid_perp_ohlcv'}
+
+
+def test_a_job_without_tickers_is_skipped_without_failing_the_others(db_path, coinalyze, make_adapter):
+    delisted = dict(HYPERLIQUID_PERP_CONFIG, name='delisted', table_name='delisted_ohlcv',
+                    filter={'exchange': 'X'}, metrics={}, rollups=[])
+
+    results = refresh_jobs([BINANCE_PERP_CONFIG, delisted], ca=make_adapter(), db_path=db_path, max_parallel=1)
+
+    assert results['delisted'] is None
+    assert results['binance_perp'].rows_inserted == 180
+    assert statuses() == {'binance_perp_ohlcv': 'ok', 'delisted_ohlcv': 'skipped'}
+
+
+def test_job_registry_from_json(tmp_path, monkeypatch):
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps([{'name': 'okx_perp', 'table_name': 'okx_perp_ohlcv', 'interval': '4hour',
+                                 'filter': {'exchange': '3'}}]))
+    monkeypatch.setenv('REFRESH_JOBS_CONFIG', str(path))
+
+    assert load_refresh_jobs() == [{'name': 'okx_perp', 'table_name': 'okx_perp_ohlcv', 'interval': '4hour',
+                                    'filter': {'exchange': '3'}, 'market_type': 'future', 'rollups': [], 'metrics': {}}]
+
+    path.write_text(json.dumps([{'name': 'broken', 'table_name': 'broken_ohlcv'}]))
+    with pytest.raises(ValueError, match='broken'):
+        load_refresh_jobs()
@@ -0,0 +1,89 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from cron_jobs.refresh_db_4h_candles import BINANCE_PERP_CONFIG, refresh_jobs
+from utils.response_store import ResponseStore, response_key
+from utils.shards import DB_LAYOUT_ENV_VAR
+
+TABLE = BINANCE_PERP_CONFIG['table_name']
+
+
+def params(symbols, from_t=0, to_t=100, interval='4hour'):
+    return {'symbols': symbols, 'interval': interval, 'from': from_t, 'to': to_t}
+
+
+def body(*symbols):
+    return json.dumps([{'symbol': symbol, 'history': [{'t': 0, 'c': 1.0}]} for symbol in symbols]).encode()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResponseStore(str(tmp_path / 'responses'))
+    yield store
+    store.close()
+
+
+def test_put_is_content_addressed_and_idempotent(store):
+    key = store.put('ohlcv-history', params('A,B'), body('A', 'B'))
+    size = store.total_bytes
+    again = store.put('ohlcv-history', dict(reversed(list(params('A,B').items()))), body('A', 'B'))
+
+    assert again == key == response_key('ohlcv-history', params('A,B'))
+    assert store.total_bytes == size
+    assert store.get('ohlcv-history', params('A,B')) == body('A', 'B')
+    assert store.get('ohlcv-history', params('C')) is None
+
+
+def test_iter_batches_filters_and_orders_oldest_first(store):
+    store.put('ohlcv-history', params('A,B'), body('A', 'B'))
+    store.put('funding-rate-history', params('A'), body('A'))
+    store.put('ohlcv-history', params('C', interval='daily'), body('C'))
+    time.sleep(0.01)
+    since = time.time()
+    store.put('ohlcv-history', params('A', from_t=100, to_t=200), body('A'))
+
+    batches = list(store.iter_batches(['ohlcv-history'], interval='4hour', symbols=['B', 'A']))
+    assert [(p['from'], [r['symbol'] for r in results]) for _, p, results in batches] == [(0, ['A', 'B']), (100, ['A'])]
+    assert [p['from'] for _, p, _ in store.iter_batches(['ohlcv-history'], interval='4hour', since=since)] == [100]
+    only_b = list(store.iter_batches(['ohlcv-history', 'funding-rate-history'], symbols=['B']))
+    assert [(endpoint, results) for endpoint, _, results in only_b] == [('ohlcv-history', [{'symbol': 'B', 'history': [{'t': 0, 'c': 1.0}]}])]
+
+
+def test_oldest_responses_are_evicted_past_the_size_cap(tmp_path):
+    probe = ResponseStore(str(tmp_path / 'probe'))
+    probe.put('ohlcv-history', params('S00'), body('S00'))
+    size = probe.total_bytes
+    probe.close()
+    store = ResponseStore(str(tmp_path / 'responses'), max_bytes=int(size * 3.5))
+    try:
+        for i in range(5):
+            store.put('ohlcv-history', params(f'S{i:02d}'), body(f'S{i:02d}'))
+
+        kept = [results[0]['symbol'] for _, _, results in store.iter_batches(['ohlcv-history'])]
+        assert kept[-1] == 'S04' and 'S00' not in kept
+        assert store.total_bytes <= size * 3.5
+        assert store.get('ohlcv-history', params('S00')) is None
+    finally:
+        store.close()
+
+
+def test_replay_rebuilds_a_table_without_the_network(tmp_path, monkeypatch, store, coinalyze, make_adapter):
+    monkeypatch.delenv(DB_LAYOUT_ENV_VAR, raising=False)
+    db_path = str(tmp_path / 'candles.db')
+    job = dict(BINANCE_PERP_CONFIG, metrics={}, rollups=['1d'])
+    refresh_jobs([job], ca=make_adapter(response_store=store), db_path=db_path)
+    with sqlite3.connect(db_path) as conn:
+        fetched = conn.execute(f"SELECT * FROM {TABLE} ORDER BY symbol, t").fetchall()
+        conn.execute(f"DELETE FROM {TABLE}")
+    requests_before = coinalyze.counters['requests']
+
+    results = refresh_jobs([job], db_path=db_path, replay=store)
+
+    assert results['binance_perp'].rows_fetched == 180
+    assert coinalyze.counters['requests'] == requests_before
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute(f"SELECT * FROM {TABLE} ORDER BY symbol, t").fetchall() == fetched
+        assert conn.execute(f"SELECT SUM(n_bars) FROM {TABLE}_1d").fetchone()[0] == 180
@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.db_util import create_ohlcv_table
+from utils.rollups import bucket_start, rebuild_rollups, rollup_table_name, update_rollups
+
+from conftest import STEP
+
+TABLE = 'binance_perp_ohlcv'
+DAY = 24 * 60 * 60
+MONDAY = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())   # 2024-01-01 was a Monday
+
+
+def bar(symbol, t, i):
+    # o, h, l, c, v, bv, tx, btx
+    return symbol, t, 100.0 + i, 110.0 + i, 90.0 - i, 101.0 + i, 10.0, 5.0, 2, 1
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    create_ohlcv_table(conn.cursor(), TABLE)
+    yield conn
+    conn.close()
+
+
+def insert(conn, rows):
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO {TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def rollup(conn, interval):
+    return conn.execute(f"SELECT * FROM {rollup_table_name(TABLE, interval)} ORDER BY symbol, t").fetchall()
+
+
+def test_bucket_boundaries():
+    assert bucket_start(MONDAY + 5 * STEP, '1d') == MONDAY
+    assert bucket_start(MONDAY + 2 * STEP, '8h') == MONDAY + 8 * 3600
+    assert bucket_start(MONDAY + 3 * STEP, '12h') == MONDAY + 12 * 3600
+    # weeks start on Monday 00:00 UTC, not on the epoch's Thursday
+    assert bucket_start(MONDAY + 6 * DAY + 5 * STEP, '1w') == MONDAY
+    assert bucket_start(MONDAY - STEP, '1w') == MONDAY - 7 * DAY
+    assert datetime.fromtimestamp(bucket_start(0, '1w'), tz=timezone.utc).weekday() == 0
+
+
+def test_daily_bucket_aggregates_its_bars(conn):
+    insert(conn, [bar('BTC', MONDAY + i * STEP, i) for i in range(8)])   # one full day, two bars of the next
+
+    update_rollups(conn, TABLE, {'BTC': (MONDAY, MONDAY + 7 * STEP)}, ['1d'])
+
+    assert rollup(conn, '1d') == [
+        ('BTC', MONDAY, 100.0, 115.0, 85.0, 106.0, 60.0, 30.0, 12, 6, 6),
+        ('BTC', MONDAY + DAY, 106.0, 117.0, 83.0, 108.0, 20.0, 10.0, 4, 2, 2),
+    ]
+
+
+def test_weekly_bucket_spans_monday_to_sunday(conn):
+    insert(conn, [bar('BTC', MONDAY - STEP, 0)] + [bar('BTC', MONDAY + i * DAY, i) for i in range(7)])
+
+    rebuild_rollups(conn, TABLE, ['1w'])
+
+    assert [(t, n_bars) for _, t, *_, n_bars in rollup(conn, '1w')] == [(MONDAY - 7 * DAY, 1), (MONDAY, 7)]
+
+
+def test_only_touched_buckets_are_recomputed(conn):
+    insert(conn, [bar(symbol, MONDAY + i * STEP, i) for symbol in ('BTC', 'ETH') for i in range(12)])
+    rebuild_rollups(conn, TABLE, ['1d'])
+
+    # a late correction of one bar, plus a change outside the touched range that must not be picked up
+    insert(conn, [('BTC', MONDAY + 7 * STEP, 1.0, 500.0, 1.0, 1.0, 1.0, 1.0, 1, 1),
+                  ('ETH', MONDAY, 1.0, 999.0, 1.0, 1.0, 1.0, 1.0, 1, 1)])
+    written = update_rollups(conn, TABLE, {'BTC': (MONDAY + 7 * STEP, MONDAY + 7 * STEP)}, ['1d'])
+
+    assert written == 1
+    highs = {(symbol, t): h for symbol, t, _, h, *_ in rollup(conn, '1d')}
+    assert highs == {('BTC', MONDAY): 115.0, ('BTC', MONDAY + DAY): 500.0,
+                     ('ETH', MONDAY): 115.0, ('ETH', MONDAY + DAY): 121.0}
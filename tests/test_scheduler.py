@@ -0,0 +1,49 @@
+import threading
+import time
+
+from utils.response_store import ResponseStore
+from utils.scheduler import CandleCloseScheduler, RunLock, next_boundary
+
+from conftest import STEP
+
+
+def test_next_boundary_is_strictly_after_now():
+    assert next_boundary(0, STEP) == STEP
+    assert next_boundary(STEP, STEP) == 2 * STEP
+    assert next_boundary(STEP - 1, STEP, offset=60) == STEP + 60
+
+
+def test_run_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / 'refresh.lock')
+    with RunLock(path) as first:
+        with RunLock(path) as second:
+            assert (first, second) == (True, False)
+    with RunLock(path) as again:
+        assert again
+
+
+def test_wait_until_visible_polls_until_the_new_bar():
+    served = iter([None, 100, 200])
+    scheduler = CandleCloseScheduler(STEP, lambda boundary: next(served), threading.Event(), poll_seconds=0)
+
+    assert scheduler.wait_until_visible(200)
+    assert next(served, 'exhausted') == 'exhausted'
+
+
+def test_wait_until_visible_gives_up_after_max_wait():
+    scheduler = CandleCloseScheduler(STEP, lambda boundary: None, threading.Event(), poll_seconds=0.01, max_wait=0.05)
+
+    assert scheduler.wait_until_visible(200)
+
+
+def test_probe_responses_are_not_stored(tmp_path, coinalyze, make_adapter):
+    store = ResponseStore(str(tmp_path / 'responses'))
+    ca = make_adapter(response_store=store)
+    last_t = int(time.time()) // STEP * STEP
+
+    assert ca.get_latest_bar_t('C0000USDT_PERP.A', '4hour', since=last_t - STEP) == last_t
+    assert list(store.iter_batches(['ohlcv-history'])) == []
+
+    ca.get_ohlcv_history(['C0000USDT_PERP.A'], '4hour')
+    assert len(list(store.iter_batches(['ohlcv-history']))) == 1
+    store.close()
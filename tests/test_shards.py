@@ -0,0 +1,88 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+from functools import partial
+
+import pytest
+
+from cron_jobs.refresh_db_4h_candles import BINANCE_PERP_CONFIG, HYPERLIQUID_PERP_CONFIG, refresh_jobs
+from utils.db_util import create_metric_table
+from utils.shards import DB_LAYOUT_ENV_VAR, Shard, ShardManager, ShardReader, default_shard_manager, year_bounds
+
+from conftest import STEP
+
+TABLE = 'binance_perp_ohlcv'
+SCHEMAS = {TABLE: partial(create_metric_table, table_name=TABLE, metric='ohlcv')}
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp()
+
+
+def jobs_without_metrics():
+    return [dict(job, metrics={}, rollups=[]) for job in (BINANCE_PERP_CONFIG, HYPERLIQUID_PERP_CONFIG)]
+
+
+def write_bars(path, years):
+    conn = sqlite3.connect(path)
+    with conn:
+        create_metric_table(conn.cursor(), TABLE)
+        conn.executemany(f"INSERT INTO {TABLE} (symbol, t, c) VALUES (?, ?, ?)",
+                         [('BTC', year_bounds(year)[0] + i * STEP, float(year)) for year in years for i in range(3)])
+    conn.close()
+
+
+def test_sharded_refresh_writes_one_file_per_venue(tmp_path, monkeypatch, coinalyze, make_adapter):
+    monkeypatch.setenv(DB_LAYOUT_ENV_VAR, 'sharded')
+    catalog = str(tmp_path / '4h_candle.db')
+
+    results = refresh_jobs(jobs_without_metrics(), ca=make_adapter(), db_path=catalog)
+
+    assert all(result.rows_inserted == 180 for result in results.values())
+    shards = default_shard_manager(catalog)
+    assert [shard.venue for shard in shards.shards()] == ['binance_perp', 'hyperliquid_perp']
+    with sqlite3.connect(catalog) as conn:
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name LIKE '%_ohlcv'").fetchall()
+    with ShardReader(catalog, shards.shards()) as reader:
+        assert {'binance_perp_ohlcv', 'hyperliquid_perp_ohlcv'} <= set(reader.views)
+        for table in ('binance_perp_ohlcv', 'hyperliquid_perp_ohlcv'):
+            assert reader.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 180
+
+
+def test_closed_years_split_off_and_read_back_through_views(tmp_path):
+    shards = ShardManager(str(tmp_path / 'shards'))
+    live = shards.route({'name': 'binance_perp', 'interval': '4hour'})
+    write_bars(live, [2021, 2022, 2023, 2024])
+
+    moved = shards.split_closed_years('binance_perp', '4hour', SCHEMAS, keep_years=2, now=NOW)
+
+    assert moved == {2021: 3, 2022: 3}
+    assert [(shard.year, os.path.basename(shard.path)) for shard in shards.shards()] == [
+        (None, 'binance_perp_4hour.db'), (2021, 'binance_perp_4hour_2021.db'), (2022, 'binance_perp_4hour_2022.db'),
+    ]
+    with sqlite3.connect(live) as conn:
+        assert {c for (c,) in conn.execute(f"SELECT DISTINCT c FROM {TABLE}")} == {2023.0, 2024.0}
+
+    catalog = str(tmp_path / '4h_candle.db')
+    sqlite3.connect(catalog).close()
+    with ShardReader(catalog, shards.shards(venues=['binance_perp'])) as reader:
+        rows = reader.conn.execute(f"SELECT c, COUNT(*) FROM {TABLE} WHERE symbol = 'BTC' GROUP BY c").fetchall()
+    assert rows == [(2021.0, 3), (2022.0, 3), (2023.0, 3), (2024.0, 3)]
+    assert shards.split_closed_years('binance_perp', '4hour', SCHEMAS, keep_years=2, now=NOW) == {}
+
+
+def test_import_tables_copies_the_single_file_layout(tmp_path):
+    legacy = str(tmp_path / '4h_candle.db')
+    write_bars(legacy, [2024])
+    shards = ShardManager(str(tmp_path / 'shards'))
+
+    assert shards.import_tables(legacy, 'binance_perp', '4hour', SCHEMAS) == {TABLE: 3}
+    with sqlite3.connect(shards.path('binance_perp', '4hour')) as conn:
+        assert conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0] == 3
+    with sqlite3.connect(legacy) as conn:
+        assert conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0] == 3
+
+
+def test_reader_refuses_more_shards_than_sqlite_can_attach(tmp_path):
+    catalog = str(tmp_path / '4h_candle.db')
+    shards = [Shard(f'venue{i}', '4hour', None, str(tmp_path / f'venue{i}_4hour.db')) for i in range(11)]
+
+    with pytest.raises(ValueError, match='narrow the selection'):
+        ShardReader(catalog, shards)
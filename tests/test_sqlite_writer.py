@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+
+import pytest
+
+from utils import db_util
+from utils.sqlite_writer import SQLiteWriter
+
+CREATE_SQL = "CREATE TABLE IF NOT EXISTS bars (symbol TEXT, t INTEGER, PRIMARY KEY (symbol, t)) WITHOUT ROWID"
+INSERT_SQL = "INSERT OR REPLACE INTO bars (symbol, t) VALUES (?, ?)"
+
+
+class FailingCommit:
+    """Wraps a connection so that every commit fails, as on a full disk."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self) -> None:
+        raise sqlite3.OperationalError('database or disk is full')
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'candles.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute(CREATE_SQL)
+    return path
+
+
+def close_in_thread(writer: SQLiteWriter, commit: bool = True, timeout: float = 5.0):
+    # close() must return; run it aside so a regression fails instead of hanging the suite
+    outcome = {}
+
+    def target():
+        try:
+            writer.close(commit=commit)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'SQLiteWriter.close() did not return'
+    return outcome.get('error')
+
+
+def test_writes_rows_in_bounded_transactions(db_path):
+    writer = SQLiteWriter(db_path, rows_per_txn=10)
+    for i in range(5):
+        writer.submit(INSERT_SQL, [('BTC', i * 10 + j) for j in range(7)])
+
+    assert close_in_thread(writer) is None
+    assert writer.rows_written == 35
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM bars").fetchone()[0] == 35
+
+
+def test_close_without_commit_rolls_back_the_open_transaction(db_path):
+    writer = SQLiteWriter(db_path, rows_per_txn=1000)
+    writer.submit(INSERT_SQL, [('BTC', 1), ('BTC', 2)])
+
+    assert close_in_thread(writer, commit=False) is None
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM bars").fetchone()[0] == 0
+
+
+def test_failed_job_is_raised_on_close(db_path):
+    writer = SQLiteWriter(db_path)
+    writer.submit("INSERT INTO missing_table (x) VALUES (?)", [(1,)])
+
+    error = close_in_thread(writer)
+    assert isinstance(error, RuntimeError)
+    assert isinstance(error.__cause__, sqlite3.OperationalError)
+
+
+def test_failed_final_commit_is_raised_on_close(db_path, monkeypatch):
+    connect_db = db_util.connect_db
+
+    def failing_connect_db(path, tuned=True):
+        conn, _ = connect_db(path, tuned)
+        conn = FailingCommit(conn)
+        return conn, conn.cursor()
+
+    monkeypatch.setattr(db_util, 'connect_db', failing_connect_db)
+    writer = SQLiteWriter(db_path)
+    writer.submit(INSERT_SQL, [('BTC', 1)])
+
+    error = close_in_thread(writer)
+    assert isinstance(error, RuntimeError)
+    assert 'disk is full' in str(error)
@@ -0,0 +1,253 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.logging import logger
+
+# Partitions are sorted by (symbol, t) and written in row groups of this
+# size, so symbol filters skip most row groups using the column statistics.
+ROW_GROUP_SIZE = 64 * 1024
+PARQUET_COMPRESSION = 'zstd'
+
+ARCHIVE_INDEX_FILE = 'index.db'
+ARCHIVE_INDEX_TABLE = 'archive_partitions'
+
+
+def get_default_archive_dir() -> str:
+    """
+    Returns `db/archive` under the repository root.
+    """
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+    return os.path.join(repo_root, 'db', 'archive')
+
+
+def month_start(year: int, month: int) -> int:
+    """
+    Returns the UTC timestamp of the first second of a month (months past 12 roll over).
+    """
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def partition_path(archive_dir: str, table_name: str, year: int, month: int) -> str:
+    """
+    Returns the Parquet file of one table's month, laid out as `<table>/year=YYYY/month=MM/part.parquet`.
+    """
+    return os.path.join(archive_dir, table_name, f'year={year:04d}', f'month={month:02d}', 'part.parquet')
+
+
+def _connect_index(archive_dir: str) -> sqlite3.Connection:
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(archive_dir, ARCHIVE_INDEX_FILE), timeout=10)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_INDEX_TABLE} (
+            table_name TEXT,
+            symbol TEXT,
+            year INTEGER,
+            month INTEGER,
+            min_t INTEGER,
+            max_t INTEGER,
+            n_rows INTEGER,
+            PRIMARY KEY (table_name, symbol, year, month)
+        ) WITHOUT ROWID
+    """)
+    return conn
+
+
+def _arrow_type(column: str) -> pa.DataType:
+    if column == 'symbol':
+        return pa.string()
+    if column == 't':
+        return pa.int64()
+    # Values (including trade counts, which may be NULL) are stored as doubles
+    return pa.float64()
+
+
+def _write_partition(path: str, table: pa.Table) -> pa.Table:
+    """
+    Merges `table` into the partition at `path` (new rows win) and rewrites it atomically.
+    """
+    if os.path.exists(path):
+        existing = pq.read_table(path)
+        new_keys = set(zip(table.column('symbol').to_pylist(), table.column('t').to_pylist()))
+        keep = [
+            key not in new_keys
+            for key in zip(existing.column('symbol').to_pylist(), existing.column('t').to_pylist())
+        ]
+        table = pa.concat_tables([existing.filter(pa.array(keep)).select(table.column_names).cast(table.schema), table])
+    table = table.sort_by([('symbol', 'ascending'), ('t', 'ascending')])
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(
+        table, tmp_path,
+        compression=PARQUET_COMPRESSION,
+        row_group_size=ROW_GROUP_SIZE,
+        use_dictionary=['symbol'],
+        write_statistics=True,
+    )
+    os.replace(tmp_path, path)
+    return table
+
+
+def archive_month(conn, table_name: str, year: int, month: int, archive_dir: str = None,
+                  delete: bool = True) -> int:
+    """
+    Compacts one month of `table_name` into its Parquet partition and indexes it.
+
+    The partition and the index are written before the rows are deleted from
+    SQLite, so an interrupted run leaves the rows in both places and simply
+    re-merges them next time.
+
+    :param conn: An open connection to the candle database.
+    :param delete: Delete the archived rows from SQLite afterwards.
+    :return: The number of rows archived.
+    """
+    archive_dir = archive_dir or get_default_archive_dir()
+    start_t, end_t = month_start(year, month), month_start(year, month + 1)
+    cursor = conn.execute(
+        f"SELECT * FROM {table_name} WHERE t >= ? AND t < ? ORDER BY symbol, t", (start_t, end_t)
+    )
+    columns = [col[0] for col in cursor.description]
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    schema = pa.schema([(col, _arrow_type(col)) for col in columns])
+    table = pa.Table.from_arrays(
+        [pa.array(values, type=schema.field(col).type) for col, values in zip(columns, zip(*rows))],
+        schema=schema,
+    )
+    table = _write_partition(partition_path(archive_dir, table_name, year, month), table)
+
+    stats = table.group_by('symbol').aggregate([('t', 'min'), ('t', 'max'), ('t', 'count')])
+    index = _connect_index(archive_dir)
+    try:
+        with index:
+            index.execute(
+                f"DELETE FROM {ARCHIVE_INDEX_TABLE} WHERE table_name = ? AND year = ? AND month = ?",
+                (table_name, year, month)
+            )
+            index.executemany(
+                f"INSERT INTO {ARCHIVE_INDEX_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (table_name, symbol, year, month, min_t, max_t, n_rows)
+                    for symbol, min_t, max_t, n_rows in zip(
+                        stats.column('symbol').to_pylist(), stats.column('t_min').to_pylist(),
+                        stats.column('t_max').to_pylist(), stats.column('t_count').to_pylist()
+                    )
+                ]
+            )
+    finally:
+        index.close()
+
+    if delete:
+        with conn:
+            conn.execute(f"DELETE FROM {table_name} WHERE t >= ? AND t < ?", (start_t, end_t))
+    logger.info(f"Archived {len(rows)} rows of '{table_name}' for {year:04d}-{month:02d}.")
+    return len(rows)
+
+
+def archive_closed_months(conn, table_name: str, keep_months: int = 12, archive_dir: str = None,
+                          now: float = None, delete: bool = True) -> int:
+    """
+    Moves every month of `table_name` older than the hot window into the Parquet archive.
+
+    The hot window is the current month plus the `keep_months - 1` before it.
+    Keep it at least as long as the API lookback used for symbols without a
+    watermark (2000 4h bars, about 11 months), so a refresh never re-inserts
+    archived history, and don't backfill into archived months.
+
+    :param conn: An open connection to the candle database.
+    :param keep_months: Number of calendar months (including the current one) kept in SQLite.
+    :param now: Optional reference time (defaults to now).
+    :return: The number of rows archived.
+    """
+    if keep_months < 1:
+        raise ValueError('keep_months must be >= 1')
+    today = datetime.fromtimestamp(now if now is not None else datetime.now(timezone.utc).timestamp(), tz=timezone.utc)
+    cutoff_t = month_start(today.year, today.month - (keep_months - 1))
+
+    first_t = conn.execute(f"SELECT MIN(t) FROM {table_name}").fetchone()[0]
+    if first_t is None or first_t >= cutoff_t:
+        return 0
+
+    first = datetime.fromtimestamp(first_t, tz=timezone.utc)
+    year, month = first.year, first.month
+    total = 0
+    while month_start(year, month) < cutoff_t:
+        total += archive_month(conn, table_name, year, month, archive_dir, delete)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return total
+
+
+class ArchiveReader:
+    """
+    Reads archived candles, opening only the partitions that can match.
+
+    The index prunes partitions by table, symbol and time range, Parquet
+    row-group statistics prune within a partition, and files are
+    memory-mapped so only the selected column chunks are paged in.
+
+    Usage:
+        reader = ArchiveReader()
+        btc = reader.read('binance_perp_ohlcv', symbols=['BTCUSDT_PERP.A'], columns=['t', 'c'])
+        for month in reader.iter_tables('binance_perp_ohlcv', start_t=1672531200):
+            ...   # one month at a time, never the whole history
+    """
+
+    def __init__(self, archive_dir: str = None) -> None:
+        self.archive_dir = archive_dir or get_default_archive_dir()
+
+    def partitions(self, table_name: str, symbols: Sequence[str] = None, start_t: int = None,
+                   end_t: int = None) -> List[Tuple[int, int]]:
+        """
+        Returns the `(year, month)` partitions holding any of `symbols` within `[start_t, end_t]`.
+        """
+        sql = (
+            f"SELECT DISTINCT year, month FROM {ARCHIVE_INDEX_TABLE} "
+            f"WHERE table_name = ? AND max_t >= ? AND min_t <= ?"
+        )
+        params: Tuple = (table_name, start_t if start_t is not None else -2 ** 62,
+                         end_t if end_t is not None else 2 ** 62)
+        if symbols:
+            sql += f" AND symbol IN ({', '.join('?' for _ in symbols)})"
+            params += tuple(symbols)
+        conn = _connect_index(self.archive_dir)
+        try:
+            return conn.execute(sql + " ORDER BY year, month", params).fetchall()
+        finally:
+            conn.close()
+
+    def iter_tables(self, table_name: str, symbols: Sequence[str] = None, start_t: int = None, end_t: int = None,
+                    columns: Sequence[str] = None) -> Iterator[pa.Table]:
+        """
+        Yields the matching rows one partition (month) at a time, in time order.
+
+        :param columns: The columns to read (`symbol` and `t` are always included).
+        """
+        if columns is not None:
+            columns = ['symbol', 't'] + [col for col in columns if col not in ('symbol', 't')]
+        filters = []
+        if symbols:
+            filters.append(('symbol', 'in', list(symbols)))
+        if start_t is not None:
+            filters.append(('t', '>=', start_t))
+        if end_t is not None:
+            filters.append(('t', '<=', end_t))
+
+        for year, month in self.partitions(table_name, symbols, start_t, end_t):
+            path = partition_path(self.archive_dir, table_name, year, month)
+            yield pq.read_table(path, columns=columns, filters=filters or None, memory_map=True)
+
+    def read(self, table_name: str, symbols: Sequence[str] = None, start_t: int = None, end_t: int = None,
+             columns: Sequence[str] = None) -> Optional[pa.Table]:
+        """
+        Returns the matching rows as one Arrow table (call `.to_pandas()` for a DataFrame), or None if none match.
+        """
+        tables = list(self.iter_tables(table_name, symbols, start_t, end_t, columns))
+        return pa.concat_tables(tables) if tables else None
@@ -0,0 +1,206 @@
+import time
+import traceback
+from typing import List, Optional, Tuple
+
+from utils.changelog import RECORD_CHANGE_SQL
+from utils.db_util import RefreshResult, connect_db, create_ohlcv_table, build_upsert_sql, ohlcv_rows
+from utils.logging import logger
+from utils.sqlite_writer import SQLiteWriter
+
+CHECKPOINT_TABLE = 'backfill_windows'
+
+# A gap is (symbol, first missing t, last missing t), both inclusive.
+Gap = Tuple[str, int, int]
+
+
+def create_checkpoint_table(c) -> None:
+    """
+    Creates the table recording every backfill window and whether it has been fetched.
+    """
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            table_name TEXT,
+            symbol TEXT,
+            from_t INTEGER,
+            to_t INTEGER,
+            status TEXT,
+            n_rows INTEGER,
+            updated_at INTEGER,
+            PRIMARY KEY (table_name, symbol, from_t, to_t)
+        ) WITHOUT ROWID
+    """)
+
+
+def find_gaps(c, table_name: str, step: int, start_t: Optional[int] = None, symbols: Optional[List[str]] = None) -> List[Gap]:
+    """
+    Finds missing bars per symbol with a single window query over the (symbol, t) primary key.
+
+    :param c: An open cursor.
+    :param table_name: The candle table to inspect.
+    :param step: The bar length in seconds.
+    :param start_t: If given, history is expected from this timestamp onwards, so
+                    the range before each symbol's first stored bar is also a gap.
+    :param symbols: If given, symbols without any stored bars are reported as one
+                    gap from `start_t` to now (requires `start_t`).
+    :return: A list of (symbol, from_t, to_t) gaps, inclusive on both ends.
+    """
+    c.execute(f"""
+        SELECT symbol, prev_t + :step, t - :step
+        FROM (
+            SELECT symbol, t, LAG(t) OVER (PARTITION BY symbol ORDER BY t) AS prev_t
+            FROM {table_name}
+        )
+        WHERE t - prev_t > :step
+    """, {'step': step})
+    gaps = [tuple(row) for row in c.fetchall()]
+
+    if start_t is not None:
+        start_t = start_t // step * step
+        c.execute(f"SELECT symbol, MIN(t) FROM {table_name} GROUP BY symbol")
+        first_bars = dict(c.fetchall())
+        gaps.extend(
+            (symbol, start_t, first_t - step) for symbol, first_t in first_bars.items() if first_t > start_t
+        )
+        if symbols:
+            now_t = int(time.time()) // step * step
+            gaps.extend((symbol, start_t, now_t) for symbol in symbols if symbol not in first_bars)
+
+    return gaps
+
+
+def split_gaps(gaps: List[Gap], step: int, max_points: int) -> List[Gap]:
+    """
+    Splits each gap into windows of at most `max_points` bars, the API's per-request cap.
+    """
+    windows = []
+    span = (max_points - 1) * step
+    for symbol, from_t, to_t in gaps:
+        while from_t <= to_t:
+            window_to = min(to_t, from_t + span)
+            windows.append((symbol, from_t, window_to))
+            from_t = window_to + step
+    return windows
+
+
+def plan_backfill(conn, table_name: str, step: int, max_points: int, start_t: Optional[int] = None,
+                  symbols: Optional[List[str]] = None) -> List[Gap]:
+    """
+    Detects gaps, records their API-sized windows as checkpoints and returns
+    every window that has not been fetched yet (including those left over
+    from an interrupted earlier run).
+    """
+    c = conn.cursor()
+    create_ohlcv_table(c, table_name)
+    create_checkpoint_table(c)
+    windows = split_gaps(find_gaps(c, table_name, step, start_t, symbols), step, max_points)
+
+    now = int(time.time())
+    with conn:
+        # Windows that were already fetched keep their 'done' status, so gaps the
+        # API cannot fill (e.g. exchange downtime) are not requested again.
+        c.executemany(
+            f"INSERT OR IGNORE INTO {CHECKPOINT_TABLE} "
+            f"(table_name, symbol, from_t, to_t, status, n_rows, updated_at) VALUES (?, ?, ?, ?, 'pending', NULL, ?)",
+            [(table_name, symbol, from_t, to_t, now) for symbol, from_t, to_t in windows]
+        )
+    c.execute(
+        f"SELECT symbol, from_t, to_t FROM {CHECKPOINT_TABLE} WHERE table_name = ? AND status = 'pending' "
+        f"ORDER BY from_t, symbol",
+        (table_name,)
+    )
+    return [tuple(row) for row in c.fetchall()]
+
+
+def run_backfill(db_path: str, table_name: str, interval: str, start_t: Optional[int] = None,
+                 symbols: Optional[List[str]] = None, ca=None, run_id: int = None) -> Optional[RefreshResult]:
+    """
+    Repairs history in `table_name` by fetching only the missing ranges.
+
+    Pending windows are packed into as few requests as the API limits allow
+    by the adapter's request planner (symbols with similar windows share a
+    request), all requests run through the adapter's concurrent, rate-limited
+    schedule, and rows are upserted by a background `SQLiteWriter`. Each
+    window is marked 'done' through the same writer right after its rows, so
+    an interrupted run resumes from the remaining 'pending' windows.
+
+    :param db_path: The absolute path to the SQLite database file.
+    :param table_name: The candle table to repair.
+    :param interval: The Coinalyze interval of the table (e.g. '4hour').
+    :param start_t: Optional earliest timestamp history should cover.
+    :param symbols: Optional symbols expected in the table (used with `start_t`).
+    :param ca: An optional `CoinalyzeRestAdapter` to reuse.
+    :param run_id: If given, backfilled ranges are recorded in the changelog under this run.
+    :return: A `RefreshResult` (gaps are new bars, so every row counts as inserted), or None if the backfill failed.
+    """
+    conn = None
+    try:
+        from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter, INTERVAL_SECONDS
+
+        ca = ca if ca is not None else CoinalyzeRestAdapter()
+        step = INTERVAL_SECONDS[interval]
+
+        conn, _ = connect_db(db_path)
+        if not conn:
+            return None
+        pending = plan_backfill(conn, table_name, step, ca.coinalyze_max_number_of_dp, start_t, symbols)
+        conn.close()
+        conn = None
+
+        result = RefreshResult(table_name=table_name)
+        if not pending:
+            logger.info(f"No gaps to backfill in '{table_name}'.")
+            return result
+
+        plan = ca.plan_history('ohlcv-history', pending, interval)
+        summary = plan.summary()
+        logger.info(
+            f"Backfilling {len(pending)} window(s) of '{table_name}' in {summary['requests']} request(s) "
+            f"(~{summary['estimated_seconds']}s at the rate limit, {summary['needed_points']} bars needed)."
+        )
+
+        upsert_sql = build_upsert_sql(table_name)
+        checkpoint_sql = (
+            f"UPDATE {CHECKPOINT_TABLE} SET status = 'done', n_rows = ?, updated_at = ? "
+            f"WHERE table_name = ? AND symbol = ? AND from_t = ? AND to_t = ?"
+        )
+        n_requests = 0
+        with SQLiteWriter(db_path) as writer:
+            for request, batch in ca.iter_plan(plan):
+                n_requests += 1
+                returned = {data['symbol']: data['history'] for data in batch}
+                now = int(time.time())
+                done = []
+                for symbol, from_t, to_t in request.windows:
+                    # the request may span more than this symbol's gap
+                    history = [bar for bar in returned.get(symbol) or [] if from_t <= bar['t'] <= to_t]
+                    writer.submit(upsert_sql, ohlcv_rows(symbol, history))
+                    done.append((len(history), now, table_name, symbol, from_t, to_t))
+                    if history:
+                        min_t = min(bar['t'] for bar in history)
+                        max_t = max(bar['t'] for bar in history)
+                        if run_id is not None:
+                            writer.submit(RECORD_CHANGE_SQL, [
+                                (run_id, table_name, symbol, min_t, max_t, len(history), 0)
+                            ])
+                        if symbol in result.touched:
+                            prev_min, prev_max = result.touched[symbol]
+                            min_t, max_t = min(min_t, prev_min), max(max_t, prev_max)
+                        result.touched[symbol] = (min_t, max_t)
+                        result.rows_fetched += len(history)
+                        result.rows_inserted += len(history)
+                        result.latest_t = max_t if result.latest_t is None else max(result.latest_t, max_t)
+                writer.submit(checkpoint_sql, done)
+
+        logger.info(
+            f"Backfill of '{table_name}' finished: {result.rows_fetched} rows from {n_requests} request(s)."
+        )
+        return result
+
+    except Exception as e:
+        logger.error(f"An error occurred during the backfill of '{table_name}': {e}")
+        logger.error(traceback.format_exc())
+        return None
+
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from utils.db_util import OHLCV_COLUMNS, get_db_path
+from utils.logging import logger
+
+# Array dtype per OHLCV column; volumes and trade counts are floats so
+# missing values can be represented as NaN.
+_FIELD_DTYPES = {
+    't': np.int64,
+    'o': np.float64,
+    'h': np.float64,
+    'l': np.float64,
+    'c': np.float64,
+    'v': np.float64,
+    'bv': np.float64,
+    'tx': np.float64,
+    'btx': np.float64,
+}
+
+
+class CandleStore:
+    """
+    Read API over a candle table with a bounded LRU result cache.
+
+    Results are returned as dicts of NumPy arrays (one array per column) or,
+    with `as_frame=True`, as pandas DataFrames. Cached results are keyed by
+    query and are dropped whenever the database changes, detected cheaply via
+    `PRAGMA data_version` (bumped by every commit of another connection, e.g.
+    the cron writer; the store itself never writes).
+
+    Usage:
+        store = CandleStore(table_name='binance_perp_ohlcv')
+        btc = store.get_range('BTCUSDT_PERP.A', start_t=1700000000)
+        cross = store.get_cross_section(store.latest_t())
+    """
+
+    def __init__(self, db_path: str = None, table_name: str = 'binance_perp_ohlcv', cache_size: int = 256) -> None:
+        self.db_path = db_path or get_db_path()
+        self.table_name = table_name
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, Dict[str, np.ndarray]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # Read-only: the store never does DDL (the refresh and `migrate_db`
+        # create the read index), and data_version tracks other writers.
+        self._conn = sqlite3.connect(
+            f"file:{quote(os.path.abspath(self.db_path))}?mode=ro", uri=True, timeout=10, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA mmap_size = 268435456")
+        index = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (f"idx_{table_name}_t",)
+        ).fetchone()
+        if index is None:
+            logger.warning(
+                f"'{table_name}' has no `t` index yet; cross-sections scan the table until the next refresh "
+                f"or `python -m cron_jobs.migrate_candle_tables` creates it."
+            )
+        logger.info(f"CandleStore opened '{table_name}' at {self.db_path}")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _current_version(self) -> int:
+        # a pragma read, no table access: cheap enough to run on every lookup
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _cached(self, key: Tuple, sql: str, params: Sequence, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            version = self._current_version()
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return result
+
+            self.misses += 1
+            rows = self._conn.execute(sql, params).fetchall()
+            result = _to_arrays(rows, columns)
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return result
+
+    def latest_t(self) -> Optional[int]:
+        """
+        Returns the latest bar timestamp in the table.
+        """
+        with self._lock:
+            return self._conn.execute(f"SELECT MAX(t) FROM {self.table_name}").fetchone()[0]
+
+    def symbols(self) -> List[str]:
+        """
+        Returns every symbol stored in the table.
+        """
+        result = self._cached(
+            ('symbols',), f"SELECT DISTINCT symbol FROM {self.table_name} ORDER BY symbol", (), ('symbol',)
+        )
+        return result['symbol'].tolist()
+
+    def get_range(self, symbol: str, start_t: int = None, end_t: int = None,
+                  columns: Sequence[str] = OHLCV_COLUMNS[1:], as_frame: bool = False):
+        """
+        Returns one symbol's bars with `start_t <= t <= end_t`, ordered by `t`.
+
+        :param columns: The columns to return (always includes `t`).
+        :param as_frame: Return a pandas DataFrame instead of a dict of arrays.
+        """
+        columns = _with_t(columns)
+        sql = (
+            f"SELECT {', '.join(columns)} FROM {self.table_name} "
+            f"WHERE symbol = ? AND t >= ? AND t <= ? ORDER BY t"
+        )
+        params = (symbol, start_t if start_t is not None else -2 ** 62, end_t if end_t is not None else 2 ** 62)
+        result = self._cached(('range', tuple(columns)) + params, sql, params, columns)
+        return _as_frame(result) if as_frame else result
+
+    def get_cross_section(self, t: int, symbols: Sequence[str] = None,
+                          columns: Sequence[str] = OHLCV_COLUMNS[2:], as_frame: bool = False):
+        """
+        Returns the bar of every symbol (or of `symbols`) at time `t`, ordered by symbol.
+
+        :param columns: The columns to return (always includes `symbol`).
+        :param as_frame: Return a pandas DataFrame indexed by symbol instead of a dict of arrays.
+        """
+        columns = ['symbol'] + [col for col in columns if col != 'symbol']
+        sql = f"SELECT {', '.join(columns)} FROM {self.table_name} WHERE t = ?"
+        params: Tuple = (t,)
+        if symbols:
+            sql += f" AND symbol IN ({', '.join('?' for _ in symbols)})"
+            params += tuple(symbols)
+        sql += " ORDER BY symbol"
+        result = self._cached(('cross', tuple(columns)) + params, sql, params, columns)
+        if as_frame:
+            return _as_frame(result).set_index('symbol')
+        return result
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._version = None
+
+
+def _with_t(columns: Sequence[str]) -> List[str]:
+    unknown = set(columns) - set(OHLCV_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown column(s): {sorted(unknown)}")
+    return ['t'] + [col for col in columns if col != 't']
+
+
+def _to_arrays(rows: List[Tuple], columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    if not rows:
+        return {col: np.empty(0, dtype=_FIELD_DTYPES.get(col, object)) for col in columns}
+    out = {}
+    for col, values in zip(columns, zip(*rows)):
+        dtype = _FIELD_DTYPES.get(col, object)
+        if dtype is np.float64:
+            # NULLs come back as None; map them to NaN
+            out[col] = np.array([np.nan if v is None else v for v in values], dtype=dtype)
+        else:
+            out[col] = np.array(values, dtype=dtype)
+        # Cached arrays are shared between callers, so make them read-only.
+        out[col].flags.writeable = False
+    return out
+
+
+def _as_frame(result: Dict[str, np.ndarray]):
+    # pandas is only needed for DataFrame output
+    import pandas as pd
+    return pd.DataFrame(result)
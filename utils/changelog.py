@@ -0,0 +1,218 @@
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from .logging import logger
+
+RUNS_TABLE = 'refresh_runs'
+CHANGES_TABLE = 'candle_changes'
+CURSORS_TABLE = 'changelog_cursors'
+
+# Upserted per (run, table, symbol) through the same SQLiteWriter as the
+# candle rows, so a change entry is committed together with its rows.
+RECORD_CHANGE_SQL = f"""
+    INSERT INTO {CHANGES_TABLE} (run_id, table_name, symbol, min_t, max_t, n_inserted, n_updated)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(run_id, table_name, symbol) DO UPDATE SET
+        min_t = MIN(min_t, excluded.min_t),
+        max_t = MAX(max_t, excluded.max_t),
+        n_inserted = n_inserted + excluded.n_inserted,
+        n_updated = n_updated + excluded.n_updated
+"""
+
+
+@dataclass
+class Change:
+    """
+    Rows of `table_name` for `symbol` with `min_t <= t <= max_t` were inserted or updated in run `run_id`.
+    """
+    run_id: int
+    table_name: str
+    symbol: str
+    min_t: int
+    max_t: int
+    n_inserted: int
+    n_updated: int
+
+
+def create_changelog_tables(c) -> None:
+    """
+    Creates the run registry, the per-run change ranges and the consumer cursors.
+    """
+    # AUTOINCREMENT guarantees run ids are never reused, even after deletes.
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job TEXT,
+            started_at INTEGER,
+            finished_at INTEGER,
+            abandoned INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # registries created before runs could be abandoned lack the column
+    if 'abandoned' not in {row[1] for row in c.execute(f"PRAGMA table_info({RUNS_TABLE})")}:
+        c.execute(f"ALTER TABLE {RUNS_TABLE} ADD COLUMN abandoned INTEGER NOT NULL DEFAULT 0")
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+            run_id INTEGER,
+            table_name TEXT,
+            symbol TEXT,
+            min_t INTEGER,
+            max_t INTEGER,
+            n_inserted INTEGER,
+            n_updated INTEGER,
+            PRIMARY KEY (run_id, table_name, symbol)
+        ) WITHOUT ROWID
+    """)
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CURSORS_TABLE} (
+            consumer TEXT PRIMARY KEY,
+            run_id INTEGER,
+            updated_at INTEGER
+        ) WITHOUT ROWID
+    """)
+
+
+def begin_run(conn, job: str) -> int:
+    """
+    Registers a new refresh run and returns its id.
+    """
+    c = conn.cursor()
+    create_changelog_tables(c)
+    with conn:
+        c.execute(f"INSERT INTO {RUNS_TABLE} (job, started_at) VALUES (?, ?)", (job, int(time.time())))
+    return c.lastrowid
+
+
+def finish_run(conn, run_id: int) -> None:
+    """
+    Marks a run as finished, which makes its changes visible to consumers.
+    """
+    with conn:
+        conn.execute(f"UPDATE {RUNS_TABLE} SET finished_at = ? WHERE run_id = ?", (int(time.time()), run_id))
+
+
+def abandon_unfinished_runs(conn) -> List[int]:
+    """
+    Closes every run that never finished, e.g. because its process was killed, and returns their ids.
+
+    Only call this while holding the refresh lock (`REFRESH_LOCK_PATH`), when
+    no other run can still be in progress. The runs are flagged `abandoned`
+    and stop holding back `changes_since`; the changes they committed before
+    they died are delivered like those of a finished run.
+    """
+    c = conn.cursor()
+    create_changelog_tables(c)
+    run_ids = [row[0] for row in c.execute(f"SELECT run_id FROM {RUNS_TABLE} WHERE finished_at IS NULL")]
+    if run_ids:
+        with conn:
+            c.execute(
+                f"UPDATE {RUNS_TABLE} SET finished_at = ?, abandoned = 1 WHERE finished_at IS NULL", (int(time.time()),)
+            )
+        logger.warning(f"Marked unfinished changelog run(s) {run_ids} as abandoned")
+    return run_ids
+
+
+def changes_since(conn, cursor: int = 0, table_name: str = None) -> Tuple[List[Change], int]:
+    """
+    Returns every change recorded by finished runs after `cursor`, and the new cursor.
+
+    Runs still in progress are not returned, and neither is anything after
+    them, so a consumer never skips a run that finishes later. A run whose
+    process died stops holding the feed back once the next run under the
+    refresh lock abandons it (see `abandon_unfinished_runs`).
+
+    :param cursor: The last run id already processed (0 to start from the beginning).
+    :param table_name: Optionally restrict to one candle table.
+    """
+    c = conn.cursor()
+    create_changelog_tables(c)
+    c.execute(f"SELECT MIN(run_id) FROM {RUNS_TABLE} WHERE run_id > ? AND finished_at IS NULL", (cursor,))
+    unfinished = c.fetchone()[0]
+    c.execute(
+        f"SELECT MAX(run_id) FROM {RUNS_TABLE} WHERE run_id > ? AND run_id < ? AND finished_at IS NOT NULL",
+        (cursor, unfinished if unfinished is not None else 2 ** 62)
+    )
+    new_cursor = c.fetchone()[0]
+    if new_cursor is None:
+        return [], cursor
+
+    sql = (
+        f"SELECT run_id, table_name, symbol, min_t, max_t, n_inserted, n_updated FROM {CHANGES_TABLE} "
+        f"WHERE run_id > ? AND run_id <= ?"
+    )
+    params: Tuple = (cursor, new_cursor)
+    if table_name is not None:
+        sql += " AND table_name = ?"
+        params += (table_name,)
+    c.execute(sql + " ORDER BY run_id, table_name, symbol", params)
+    return [Change(*row) for row in c.fetchall()], new_cursor
+
+
+def iter_changed_rows(conn, changes: List[Change]) -> Iterator[Tuple]:
+    """
+    Yields the current candle rows covered by `changes`, read through the (symbol, t) primary key.
+    """
+    for change in changes:
+        yield from conn.execute(
+            f"SELECT * FROM {change.table_name} WHERE symbol = ? AND t >= ? AND t <= ? ORDER BY t",
+            (change.symbol, change.min_t, change.max_t)
+        )
+
+
+class ChangeFeed:
+    """
+    Durable consumer of the changelog: each consumer's cursor is stored in SQLite.
+
+    Usage:
+        feed = ChangeFeed(db_path, consumer='alerts')
+        changes, cursor = feed.poll()
+        for row in feed.rows(changes):
+            ...
+        feed.commit(cursor)   # only after the changes have been processed
+
+    With the sharded layout, pass the shards to read (see `utils.shards`):
+    runs and cursors live in the catalog DB and change ranges in each shard.
+    """
+
+    def __init__(self, db_path: str, consumer: str, shards: list = None) -> None:
+        self.consumer = consumer
+        self._reader = None
+        if shards:
+            from utils.shards import ShardReader
+            # create the catalog tables before the shard views shadow `candle_changes`
+            conn = sqlite3.connect(db_path, timeout=10)
+            create_changelog_tables(conn.cursor())
+            conn.commit()
+            conn.close()
+            self._reader = ShardReader(db_path, shards)
+            self._conn = self._reader.conn
+        else:
+            self._conn = sqlite3.connect(db_path, timeout=10)
+        create_changelog_tables(self._conn.cursor())
+        self._conn.commit()
+
+    def cursor(self) -> int:
+        row = self._conn.execute(f"SELECT run_id FROM {CURSORS_TABLE} WHERE consumer = ?", (self.consumer,)).fetchone()
+        return row[0] if row else 0
+
+    def poll(self, table_name: Optional[str] = None) -> Tuple[List[Change], int]:
+        return changes_since(self._conn, self.cursor(), table_name)
+
+    def rows(self, changes: List[Change]) -> Iterator[Tuple]:
+        return iter_changed_rows(self._conn, changes)
+
+    def commit(self, cursor: int) -> None:
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO {CURSORS_TABLE} (consumer, run_id, updated_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT(consumer) DO UPDATE SET run_id = excluded.run_id, updated_at = excluded.updated_at",
+                (self.consumer, cursor, int(time.time()))
+            )
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+        else:
+            self._conn.close()
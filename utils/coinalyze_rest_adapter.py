@@ -1,24 +1,69 @@
 import requests
 import requests.packages
+import hashlib
 import time
 import math
-import pathlib
 import os
-from typing import List, Dict
+import sqlite3
+from typing import TYPE_CHECKING, List, Dict, Iterator, Optional, Tuple
 from .logging import logger
-from dotenv import load_dotenv
-from datetime import datetime
-import pandas as pd
-from tqdm import tqdm
+from .http_transport import HttpTransport
+from .rate_limiter import TokenBucket
+from .reference_cache import ReferenceCache
+from .response_store import ResponseStore, default_response_store
+from .request_planner import PlannedRequest, RequestPlan, pack_requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import itertools
+
+# numpy (ohlcv_arrays), tqdm and python-dotenv are imported where they are
+# used, so importing the adapter stays cheap for cron entry points.
+if TYPE_CHECKING:
+    from .ohlcv_arrays import OhlcvArrays
+
+
+# Length in seconds of every interval supported by the history endpoints.
+INTERVAL_SECONDS = {
+    '1min': 60,
+    '5min': 5 * 60,
+    '15min': 15 * 60,
+    '30min': 30 * 60,
+    '1hour': 60 * 60,
+    '2hour': 2 * 60 * 60,
+    '4hour': 4 * 60 * 60,
+    '6hour': 6 * 60 * 60,
+    '12hour': 12 * 60 * 60,
+    'daily': 24 * 60 * 60,
+}
+
+
+class CoinalyzeApiError(Exception):
+    """Raised when Coinalyze answers with a non-retryable error status."""
+
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(f'[{status_code}] {message}')
+        self.status_code = status_code
+        self.message = message
 
 
 class CoinalyzeRestAdapter:
-    def __init__(self, ssl_verify: bool = True) -> None:
-        self.url = 'https://api.coinalyze.net/v1/'
+    def __init__(
+        self,
+        ssl_verify: bool = True,
+        transport: HttpTransport = None,
+        max_workers: int = 4,
+        rate_limit_per_minute: float = 40,
+        reference_cache: ReferenceCache = None,
+        base_url: str = None,
+        response_store: ResponseStore = None,
+        store_responses: bool = True,
+    ) -> None:
+        # COINALYZE_BASE_URL lets benchmarks point the adapter at a local stand-in server
+        self.url = base_url or os.getenv('COINALYZE_BASE_URL') or 'https://api.coinalyze.net/v1/'
         self._ssl_verify = ssl_verify
         if not ssl_verify:
             requests.packages.urllib3.disable_warnings()
 
+        from dotenv import load_dotenv
         load_dotenv()
         self._api_key = os.getenv('COINALYZE_API_KEY')
         if self._api_key is None:
@@ -26,75 +71,94 @@ class CoinalyzeRestAdapter:
 
         # param
         self.coinalyze_max_number_of_dp = 2000
+        self.max_symbols_per_request = 20
+        # Optional cap on symbols x bars in one response, honoured by the request planner
+        self.max_points_per_request = None
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.max_workers = max_workers
         self.default_interval = '5min'
         self.convert_to_usd = 'true'
         
         # logger
-        pwd = pathlib.Path(__file__).parent.resolve()
-        curr_script_name = os.path.basename(__file__).split('.')[0]
-        self.logger =  logger
+        self.logger = logger
+
+        # transport: pooled keep-alive session with bounded retries, throttled
+        # by a token bucket sized to Coinalyze's per-minute quota
+        if transport is None:
+            transport = HttpTransport(
+                pool_size=max(max_workers, 1),
+                verify=ssl_verify,
+                rate_limiter=TokenBucket(rate_per_minute=rate_limit_per_minute),
+            )
+        self._transport = transport
+
+        # cache for slow-changing reference endpoints (exchanges / markets)
+        self._reference_cache = reference_cache if reference_cache is not None else ReferenceCache()
+
+        # optional raw copy of every history response, for replaying a failed run (see utils/response_store.py);
+        # store_responses=False never opens a store, e.g. for a planning-only adapter
+        self._response_store = None
+        if store_responses:
+            self._response_store = response_store if response_store is not None else default_response_store()
+
+    @property
+    def transport_stats(self) -> Dict:
+        """Request/retry counters of the underlying HTTP transport."""
+        return self._transport.stats.as_dict()
+
+    def close(self) -> None:
+        self._transport.close()
             
-    def _get(self, endpoint: str, params: Dict = None) -> List[Dict]:
+    def _get(self, endpoint: str, params: Dict = None, raw: bool = False, store: bool = True) -> List[Dict]:
+        # store=False keeps a response out of the response store, e.g. probes that are not refresh data
         full_url = self.url + endpoint
         headers = {'api_key': self._api_key}
 
         # check params
         if params:
             if 'interval' in params:
-                assert params['interval'] in ['1min', '5min', '15min', '30min', '1hour', '2hour', '4hour', '6hour', '12hour',
-                                    'daily'], "<interval> shld be in [1min, 5min, 15min, 30min, 1hour, 2hour, 4hour, 6hour, 12hour, daily]"
+                assert params['interval'] in INTERVAL_SECONDS, \
+                    f"<interval> shld be in [{', '.join(INTERVAL_SECONDS)}]"
 
             if 'to' not in params:
                 params['to'] = math.floor(time.time())
 
             if 'from' not in params:
                 # max out coinalyze's max number of lookback
-                if params['interval'] == "1min":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 1
-                elif params['interval'] == "5min":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 5
-                elif params['interval'] == "15min":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 15
-                elif params['interval'] == "30min":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 30
-                elif params['interval'] == "1hour":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 60 * 1
-                elif params['interval'] == "2hour":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 60 * 2
-                elif params['interval'] == "4hour":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 60 * 4
-                elif params['interval'] == "6hour":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 60 * 6
-                elif params['interval'] == "12hour":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 60 * 12
-                elif params['interval'] == "daily":
-                    params['from'] = params['to'] - self.coinalyze_max_number_of_dp * 60 * 60 * 24 * 1
-
-        response = requests.get(url=full_url, verify=self._ssl_verify, headers=headers, params=params)
-        data_out = response.json()
+                params['from'] = params['to'] - self.coinalyze_max_number_of_dp * INTERVAL_SECONDS[params['interval']]
+
+        response = self._transport.get(full_url, params=params, headers=headers)
 
         if 200 <= response.status_code <= 299:     # OK
-            return data_out
-        elif response.status_code == 429: # exceeded rate limit
-            retry_after = float(response.headers['Retry-After']) # in seconds
-            print(f'reached Coinalyze rate-limit, sleeping {retry_after} seconds before retrying...')
-            time.sleep(retry_after)
-            return self._get(endpoint, params)
-        elif response.status_code == 500:
-            retry_after = 5 # in seconds
-            print(f'server error, sleeping {retry_after} seconds before retrying...')
-            time.sleep(retry_after)
-            return self._get(endpoint, params)
-        raise Exception(data_out["message"])    # Todo: raise custom exception later
-
-    def get_supported_exchanges(self) -> List[Dict]:
-        return self._get('exchanges')
+            if store and self._response_store is not None and endpoint.endswith('-history'):
+                try:
+                    self._response_store.put(endpoint, params, response.content)
+                except (OSError, sqlite3.Error) as e:
+                    # the store is a recovery aid; never fail the fetch over it
+                    self.logger.warning(f"Could not store the {endpoint} response: {e}")
+            # raw=True hands the undecoded body to a caller-specific decoder
+            return response.content if raw else response.json()
+
+        try:
+            data_out = response.json()
+            message = data_out.get('message', response.text) if isinstance(data_out, dict) else response.text
+        except ValueError:
+            message = response.text
+        raise CoinalyzeApiError(response.status_code, message)
+
+    def _get_reference(self, endpoint: str, refresh: bool = False) -> List[Dict]:
+        # keyed by host and API key too, so adapters on different hosts never share an entry
+        account = hashlib.sha256(f"{self.url}\n{self._api_key}".encode()).hexdigest()[:16]
+        return self._reference_cache.get(f"{endpoint}.{account}", lambda: self._get(endpoint), refresh=refresh)
+
+    def get_supported_exchanges(self, refresh: bool = False) -> List[Dict]:
+        return self._get_reference('exchanges', refresh=refresh)
     
-    def get_supported_future_markets(self) -> List[Dict]:
-        return self._get('future-markets')
+    def get_supported_future_markets(self, refresh: bool = False) -> List[Dict]:
+        return self._get_reference('future-markets', refresh=refresh)
     
-    def get_supported_spot_markets(self) -> List[Dict]:
-        return self._get('spot-markets')
+    def get_supported_spot_markets(self, refresh: bool = False) -> List[Dict]:
+        return self._get_reference('spot-markets', refresh=refresh)
     
     def get_curr_open_interest(self, symbols: List[str]) -> List[Dict]:
         return self._get('open-interest', {"symbols": ','.join(symbols)})
@@ -102,138 +166,225 @@ class CoinalyzeRestAdapter:
     def get_curr_funding_rate(self, symbols: List[str]) -> List[Dict]:
         return self._get('funding-rate', {"symbols": ','.join(symbols)})
 
-    def get_open_interest_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
+    def _iter_requests(self, endpoint: str, param_list: List[Dict], raw: bool = False) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Sends one request per params dict and yields `(index, response)` pairs
+        as they complete, concurrently when `max_workers` > 1.
+
+        Throughput is bounded by the transport's token bucket, so adding
+        workers only overlaps network round trips and never exceeds the quota.
+        At most `2 * max_workers` requests are in flight at once, so a slow
+        consumer applies backpressure instead of buffering every response.
+        """
+        return self._iter_calls([(endpoint, params) for params in param_list], raw)
+
+    def _iter_calls(self, calls: List[Tuple[str, Dict]], raw: bool = False) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Like `_iter_requests`, but every call names its own endpoint, so
+        requests to several endpoints share one schedule.
+        """
+        from tqdm import tqdm
+
+        if self.max_workers <= 1 or len(calls) <= 1:
+            for idx, (endpoint, params) in enumerate(tqdm(calls, disable=None)):
+                yield idx, self._get(endpoint, params, raw)
+            return
+
+        max_in_flight = 2 * self.max_workers
+        pending = iter(enumerate(calls))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, tqdm(total=len(calls), disable=None) as progress:
+            in_flight = {}
+            for idx, (endpoint, params) in itertools.islice(pending, max_in_flight):
+                in_flight[executor.submit(self._get, endpoint, params, raw)] = idx
+            try:
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        idx = in_flight.pop(future)
+                        progress.update(1)
+                        yield idx, future.result()
+                    for idx, (endpoint, params) in itertools.islice(pending, len(done)):
+                        in_flight[executor.submit(self._get, endpoint, params, raw)] = idx
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+    def _run_requests(self, endpoint: str, param_list: List[Dict]) -> List[List[Dict]]:
+        """
+        Sends one request per params dict.
+
+        :return: The responses, in the same order as `param_list`.
+        """
+        results = [None] * len(param_list)
+        for idx, part_ret in self._iter_requests(endpoint, param_list):
+            results[idx] = part_ret
+        return results
+
+    def _batch_params(self, symbols: List[str], params: Dict) -> List[Dict]:
+        """
+        Splits `symbols` into API-sized batches, each carrying a copy of `params`.
+        """
+        param_list = []
+        for i in range(0, len(symbols), self.max_symbols_per_request):
+            batch_params = {"symbols": ','.join(symbols[i:i + self.max_symbols_per_request])}
+            batch_params.update(params)
+            param_list.append(batch_params)
+        return param_list
+
+    def iter_batches(self, endpoint: str, windows: List[Tuple[List[str], Dict]]) -> Iterator[Tuple[Dict, List[Dict]]]:
+        """
+        Like `iter_history`, but yields `(batch_params, batch_results)` pairs so
+        callers can tell which symbols and window each batch answered.
+        """
+        param_list = []
+        for symbols, params in windows:
+            param_list.extend(self._batch_params(symbols, params))
+
+        for idx, part_ret in self._iter_requests(endpoint, param_list):
+            yield param_list[idx], part_ret
+
+    def iter_endpoint_batches(
+        self, windows: List[Tuple[str, List[str], Dict]]
+    ) -> Iterator[Tuple[str, Dict, List[Dict]]]:
+        """
+        Streams several history endpoints through one shared request schedule.
+
+        :param windows: `(endpoint, symbols, params)` triples; each is split into API-sized batches.
+        :return: `(endpoint, batch_params, batch_results)` triples, in completion order.
+        """
+        calls = []
+        for endpoint, symbols, params in windows:
+            calls.extend((endpoint, batch_params) for batch_params in self._batch_params(symbols, params))
+
+        for idx, part_ret in self._iter_calls(calls):
+            endpoint, batch_params = calls[idx]
+            yield endpoint, batch_params, part_ret
+
+    def iter_history(self, endpoint: str, windows: List[Tuple[List[str], Dict]]) -> Iterator[List[Dict]]:
+        """
+        Streams a history endpoint batch by batch.
+
+        Every `(symbols, params)` window is split into API-sized batches and
+        all batches share one concurrent request schedule. Each batch's
+        per-symbol results are yielded as soon as the batch arrives, in
+        completion order, so callers can process them without holding the
+        whole download in memory.
+
+        :param endpoint: A history endpoint, e.g. 'ohlcv-history'.
+        :param windows: `(symbols, params)` pairs, e.g. `(['BTCUSDT_PERP.A'], {'interval': '4hour', 'from': 1700000000})`.
+        """
+        for _, part_ret in self.iter_batches(endpoint, windows):
+            yield part_ret
+
+    def plan_history(
+        self,
+        endpoint: str,
+        needs: List[Tuple[str, Optional[int], Optional[int]]],
+        interval: str,
+        params: Dict = None
+    ) -> RequestPlan:
+        """
+        Plans the fewest requests covering every symbol's window, without sending any.
+
+        Symbols with similar windows share a request (bounded by the symbol
+        limit, the per-symbol lookback and `max_points_per_request`), windows
+        longer than the lookback are split, and the plan reports its quota
+        cost. Run it with `iter_plan`, or log `plan.summary()` for a dry run.
+
+        :param endpoint: A history endpoint, e.g. 'ohlcv-history'.
+        :param needs: `(symbol, from_t, to_t)` triples; `from_t` None means the full lookback, `to_t` None means now.
+        :param interval: The bar interval, e.g. '4hour'.
+        :param params: Extra endpoint params shared by every request (e.g. `convert_to_usd`).
+        """
+        step = INTERVAL_SECONDS[interval]
+        now = math.floor(time.time())
+        resolved = []
+        for symbol, from_t, to_t in needs:
+            to_t = now if to_t is None else to_t
+            if from_t is None:
+                from_t = to_t - (self.coinalyze_max_number_of_dp - 1) * step
+            resolved.append((symbol, from_t, to_t))
+
+        planned = pack_requests(
+            endpoint, resolved, step, {'interval': interval, **(params or {})},
+            max_symbols=self.max_symbols_per_request,
+            max_bars=self.coinalyze_max_number_of_dp,
+            max_points=self.max_points_per_request,
+        )
+        return RequestPlan(planned, rate_limit_per_minute=self.rate_limit_per_minute)
+
+    def iter_plan(self, plan: RequestPlan) -> Iterator[Tuple[PlannedRequest, List[Dict]]]:
+        """
+        Runs a plan through the shared request schedule, yielding `(request, results)` in completion order.
+        """
+        calls = [(request.endpoint, dict(request.params)) for request in plan.requests]
+        for idx, part_ret in self._iter_calls(calls):
+            yield plan.requests[idx], part_ret
+
+    def _get_history(self, endpoint: str, symbols: List[str], params: Dict, **kwargs) -> List[Dict]:
+        """
+        Splits `symbols` into API-sized batches and fetches them all.
+
+        :param params: Endpoint-specific params shared by every batch (e.g. interval).
+        :return: The concatenated per-symbol results, in batch order.
+        """
         ret = []
-
-        for i in tqdm(range(0, len(symbols), 20)):
-            params = {
-                "symbols": ','.join(symbols),
-                "interval": interval,
-                "convert_to_usd": "true"
-            }
-            params.update(kwargs)
-
-            part_ret = self._get('open-interest-history', params)
+        for part_ret in self._run_requests(endpoint, self._batch_params(symbols, {**params, **kwargs})):
             ret.extend(part_ret)
-
         return ret
+
+    def get_open_interest_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
+        return self._get_history(
+            'open-interest-history', symbols, {"interval": interval, "convert_to_usd": "true"}, **kwargs
+        )
     
     def get_funding_rate_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
-        ret = []
-
-        for i in tqdm(range(0, len(symbols), 20)):
-            params = {
-                "symbols": ','.join(symbols[i:i + 20]),
-                "interval": interval,
-            }
-            params.update(kwargs)
-
-            part_ret = self._get('funding-rate-history', params)
-            ret.extend(part_ret)
-
-        return ret
+        return self._get_history('funding-rate-history', symbols, {"interval": interval}, **kwargs)
     
     def get_predicted_funding_rate_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
-        ret = []
-
-        for i in tqdm(range(0, len(symbols), 20)):
-            params = {
-                "symbols": ','.join(symbols[i:i + 20]),
-                "interval": interval,
-            }
-            params.update(kwargs)
-
-            part_ret = self._get('predicted-funding-rate-history', params)
-            ret.extend(part_ret)
-
-        return ret
+        return self._get_history('predicted-funding-rate-history', symbols, {"interval": interval}, **kwargs)
     
     def get_liquidation_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
-        ret = []
-
-        for i in tqdm(range(0, len(symbols), 20)):
-            params = {
-                "symbols": ','.join(symbols[i:i + 20]),
-                "interval": interval,
-                "convert_to_usd": "true"
-            }
-            params.update(kwargs)
-
-            part_ret = self._get('liquidation-history', params)
-            ret.extend(part_ret)
-
-        return ret
+        return self._get_history(
+            'liquidation-history', symbols, {"interval": interval, "convert_to_usd": "true"}, **kwargs
+        )
 
     def get_long_short_ratio_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
-        ret = []
+        return self._get_history('long-short-ratio-history', symbols, {"interval": interval}, **kwargs)
 
-        for i in tqdm(range(0, len(symbols), 20)):
-            params = {
-                "symbols": ','.join(symbols[i:i + 20]),
-                "interval": interval,
-            }
-            params.update(kwargs)
+    def get_ohlcv_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
+        return self._get_history('ohlcv-history', symbols, {"interval": interval}, **kwargs)
 
-            part_ret = self._get('long-short-ratio-history', params)
-            ret.extend(part_ret)
+    def get_latest_bar_t(self, symbol: str, interval: str, since: int) -> Optional[int]:
+        """
+        Cheap single-request probe: the open time of `symbol`'s latest bar at or after `since`, or None.
 
-        return ret
+        The response is not kept in the response store, so a replay never mistakes it for refresh data.
+        """
+        data = self._get('ohlcv-history', {"symbols": symbol, "interval": interval, "from": since}, store=False)
+        times = [bar['t'] for entry in data for bar in entry.get('history', [])]
+        return max(times) if times else None
 
-    def get_ohlcv_history(self, symbols: List[str], interval: str, **kwargs) -> List[Dict]:
-        ret = []
+    def iter_ohlcv_history(self, symbols: List[str], interval: str, **kwargs) -> Iterator[List[Dict]]:
+        return self.iter_history('ohlcv-history', [(symbols, {"interval": interval, **kwargs})])
 
-        for i in tqdm(range(0, len(symbols), 20)):
-            params = {
-                "symbols": ','.join(symbols[i:i + 20]),
-                "interval": interval,
-            }
-            params.update(kwargs)
+    def get_ohlcv_history_arrays(self, symbols: List[str], interval: str, **kwargs) -> 'OhlcvArrays':
+        """
+        Fast decode path for `get_ohlcv_history`.
 
-            part_ret = self._get('ohlcv-history', params)
-            ret.extend(part_ret)
+        Response bodies are parsed (with orjson when installed) batch by batch
+        straight into one contiguous structured NumPy array of
+        `(symbol_idx, t, o, h, l, c, v, bv, tx, btx)` records, instead of
+        returning a list of per-bar dicts.
+        """
+        from .ohlcv_arrays import decode_ohlcv_batches
 
-        return ret
+        param_list = self._batch_params(symbols, {"interval": interval, **kwargs})
+        payloads = (content for _, content in self._iter_requests('ohlcv-history', param_list, raw=True))
+        return decode_ohlcv_batches(payloads, symbols)
 
 if __name__ == '__main__':
     cyz = CoinalyzeRestAdapter()
     
-    ohlc = cyz.get_ohlcv_history(symbols=['ETHUSD.A'], interval='daily')
-    
-    import pandas as pd
-    df = pd.DataFrame(ohlc[0]['history'], columns=['t', 'o', 'h', 'l', 'c', 'v'])
-    print(df.shape)
-    
-    # def calc_ahr999_index(coinalyze: CoinalyzeRestAdapter) -> pd.DataFrame:
-    #     ret = {}
-        
-    #     birth_date = datetime(year=2009, month=1, day=3)
-    #     today = datetime.now()
-    #     age_days = (today - birth_date).days
-        
-    #     target_price = 10 ** (5.84 * log10(age_days) - 17.01)
-        
-    #     param_to = math.floor(time.time())
-    #     lookback_days = 201
-    #     param_start = param_to - lookback_days * 24 * 60 * 60 # 22 days ago
-    #     btc_prices = coinalyze.get_ohlcv_history(symbols=['BTCUSD.A'], **{'interval': 'daily', 'to': param_to, 'start': param_start})[0]['history']
-        
-    #     if len(btc_prices) < lookback_days:
-    #         ret['success'] = False
-    #         ret['data'] = f'coinalyze returned {len(btc_prices)} data points, but need 200 days'
-    #         return ret
-        
-    #     price_sum = 0
-    #     for price in btc_prices[:-1]:
-    #         price_sum += btc_prices['c']
-    #     average_200_days_price = price_sum / 200
-        
-    #     curr_price = btc_prices[-1]['c']
-        
-    #     p1 = curr_price / target_price
-    #     p2 = curr_price / average_200_days_price
-    #     p = p1 * p2
-        
-
-    
-    
-    # calc_ahr999_index(obj)
+    ohlc = cyz.get_ohlcv_history_arrays(symbols=['ETHUSD.A'], interval='daily')
+    print(ohlc.for_symbol('ETHUSD.A').shape)
@@ -1,10 +1,73 @@
 import os
 import sqlite3
-import pandas as pd
-import numpy as np
+import time
 import traceback
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
 # Use the custom logger instead of the standard logging module
+from utils.changelog import RECORD_CHANGE_SQL
 from utils.logging import logger
+from utils.metrics import run_metrics
+from utils.request_planner import RequestPlan
+from utils.sqlite_writer import SQLiteWriter
+
+OHLCV_COLUMNS = ('symbol', 't', 'o', 'h', 'l', 'c', 'v', 'bv', 'tx', 'btx')
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    """
+    How one Coinalyze history endpoint is stored: the endpoint, extra request
+    params, and the fields of its `history` bars kept as columns after (symbol, t).
+    `market_flag` is the `markets` column telling whether Coinalyze has the
+    metric for a market; markets where it is false are never requested.
+    """
+    endpoint: str
+    value_columns: Tuple[str, ...]
+    params: Tuple[Tuple[str, str], ...] = ()
+    market_flag: Optional[str] = None
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return ('symbol', 't') + self.value_columns
+
+
+# Every metric `refresh_metrics` can ingest, keyed by the name used in job configs.
+METRICS = {
+    'ohlcv': MetricSpec('ohlcv-history', OHLCV_COLUMNS[2:], market_flag='has_ohlcv_data'),
+    'open_interest': MetricSpec('open-interest-history', ('o', 'h', 'l', 'c'), (('convert_to_usd', 'true'),)),
+    'funding_rate': MetricSpec('funding-rate-history', ('o', 'h', 'l', 'c')),
+    'predicted_funding_rate': MetricSpec('predicted-funding-rate-history', ('o', 'h', 'l', 'c')),
+    # l / s: long and short liquidations
+    'liquidations': MetricSpec('liquidation-history', ('l', 's'), (('convert_to_usd', 'true'),)),
+    # r: long/short ratio, l / s: long and short share in percent
+    'long_short_ratio': MetricSpec('long-short-ratio-history', ('r', 'l', 's'), market_flag='has_long_short_ratio_data'),
+}
+
+# End of the last window that came back empty, per table and symbol without
+# stored bars, so such symbols are fetched incrementally from there next time
+# instead of re-downloading the full lookback on every run.
+EMPTY_FETCHES_TABLE = 'empty_fetches'
+RECORD_EMPTY_FETCH_SQL = f"""
+    INSERT INTO {EMPTY_FETCHES_TABLE} (table_name, symbol, t) VALUES (?, ?, ?)
+    ON CONFLICT(table_name, symbol) DO UPDATE SET t = MAX(t, excluded.t)
+"""
+
+# Storage-engine tuning applied by `connect_db(..., tuned=True)`. WAL lets
+# readers (e.g. research notebooks) run concurrently with the cron writer,
+# and synchronous=NORMAL is durable across application crashes in WAL mode.
+SQLITE_PAGE_SIZE = 8192
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,   # negative means KiB, i.e. 64 MiB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 10_000,
+}
 
 
 def get_db_path() -> str:
@@ -19,17 +82,32 @@ def get_db_path() -> str:
     return os.path.join(db_dir, "4h_candle.db")
 
 
+def apply_pragmas(conn) -> None:
+    """
+    Applies the tuned storage-engine pragmas to an open connection.
+
+    `page_size` only takes effect on a new database (or the next VACUUM
+    outside WAL mode), so it is set before switching the journal mode.
+    """
+    conn.execute(f"PRAGMA page_size = {SQLITE_PAGE_SIZE}")
+    for pragma, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
 # CHANGE: The function now accepts a specific path to the database.
-def connect_db(path):
+def connect_db(path, tuned: bool = True):
     """
     Establishes a connection to the SQLite database.
 
     :param path: The file path to the database.
+    :param tuned: Apply `SQLITE_PRAGMAS` (WAL journaling, mmap, cache size, ...).
     :return: A tuple containing the connection and cursor objects.
     """
     try:
         # Connect to the database. It will be created if it doesn't exist.
         conn = sqlite3.connect(path, timeout=10) # Added a timeout
+        if tuned:
+            apply_pragmas(conn)
         c = conn.cursor()
         logger.info(f"Successfully connected to database at {path}")
         return conn, c
@@ -39,32 +117,176 @@ def connect_db(path):
         return None, None
 
 
-# CHANGE: The function now accepts a specific path for the database.
-def refresh_data(db_path: str, table_name: str, symbols: list, interval: str):
+def connect_db_read_only(path, **kwargs) -> Optional[sqlite3.Connection]:
     """
-    Fetches only the newest OHLCV data from the Coinalyze API and inserts
-    the new rows into a single table in a local SQLite database.
+    Opens an existing database read-only, without creating it or changing its journal mode.
 
-    It is designed to be efficient by only fetching data since the last
-    known timestamp and uses transactions to ensure data integrity.
+    :param path: The file path to the database.
+    :param kwargs: Extra `sqlite3.connect` arguments, e.g. `check_same_thread`.
+    :return: The connection, or None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True, timeout=10, **kwargs)
 
-    :param db_path: The absolute path to the SQLite database file.
-    :param symbols: A list of symbols to fetch data for (e.g., ['BTCUSDT', 'ETHUSDT']).
-    :param interval: The time interval for the OHLCV data (e.g., '1h', '4h', '1d').
+
+def get_symbol_watermarks(c, table_name: str, symbols: list = None) -> dict:
     """
-    conn = None # Initialize conn to None
+    Returns the latest stored bar timestamp per symbol.
+
+    Without `symbols` this is a single GROUP BY query over the whole table.
+    With `symbols`, each watermark is one descent of the (symbol, t) primary
+    key, which stays fast however much history the table holds.
+
+    :param c: An open cursor on the database.
+    :param table_name: The name of the candle table.
+    :param symbols: Optionally, only the symbols whose watermark is needed.
+    :return: A dict mapping symbol -> MAX(t), for symbols with stored bars.
+    """
+    if symbols is None:
+        c.execute(f"SELECT symbol, MAX(t) FROM {table_name} GROUP BY symbol")
+        return {symbol: max_t for symbol, max_t in c.fetchall()}
+
+    watermarks = {}
+    sql = f"SELECT MAX(t) FROM {table_name} WHERE symbol = ?"
+    for symbol in symbols:
+        max_t = c.execute(sql, (symbol,)).fetchone()[0]
+        if max_t is not None:
+            watermarks[symbol] = max_t
+    return watermarks
+
+
+def get_metric_watermarks(c, tables: Dict[str, str], symbols: list) -> Dict[str, dict]:
+    """
+    Returns the watermarks of every metric table (see `get_symbol_watermarks`).
+
+    :param tables: Table name per metric.
+    :param symbols: The symbols whose watermark is needed.
+    :return: A dict mapping metric -> {symbol: MAX(t)}; tables not created yet have no watermarks.
+    """
+    watermarks = {}
+    for metric, table_name in tables.items():
+        try:
+            watermarks[metric] = get_symbol_watermarks(c, table_name, symbols)
+        except sqlite3.OperationalError:
+            watermarks[metric] = {}
+    return watermarks
+
+
+def create_empty_fetches_table(c) -> None:
+    """
+    Creates the table of empty-fetch watermarks (see `EMPTY_FETCHES_TABLE`).
+    """
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {EMPTY_FETCHES_TABLE} (
+            table_name TEXT,
+            symbol TEXT,
+            t INTEGER,
+            PRIMARY KEY (table_name, symbol)
+        ) WITHOUT ROWID
+    """)
+
+
+def get_empty_fetch_watermarks(c, tables: Dict[str, str], symbols: list) -> Dict[str, dict]:
+    """
+    Returns, per metric, the end of the last empty window of each symbol (see `EMPTY_FETCHES_TABLE`).
+
+    :param tables: Table name per metric.
+    :param symbols: The symbols whose empty-fetch watermark is needed.
+    :return: A dict mapping metric -> {symbol: t}; nothing is returned before the table exists.
+    """
+    wanted = set(symbols)
+    empty = {metric: {} for metric in tables}
     try:
-        # Import here so callers can import `utils.db_util` without requiring
-        # optional runtime deps (e.g. `requests`) unless they actually refresh.
-        from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+        for metric, table_name in tables.items():
+            c.execute(f"SELECT symbol, t FROM {EMPTY_FETCHES_TABLE} WHERE table_name = ?", (table_name,))
+            empty[metric] = {symbol: t for symbol, t in c.fetchall() if symbol in wanted}
+    except sqlite3.OperationalError:
+        pass
+    return empty
 
-        # --- Step 1: Connect to DB and set up the master table ---
-        conn, c = connect_db(db_path) # CHANGE: Use the provided path
-        if not conn:
-            return # Exit if the database connection failed.
-                
-        # Create the table if it doesn't exist. The composite PRIMARY KEY is crucial.
-        create_table_sql = f"""
+
+def plan_metrics(ca, tables: Dict[str, str], symbols: list, interval: str, watermarks: Dict[str, dict],
+                 metric_symbols: Dict[str, list] = None, empty_fetches: Dict[str, dict] = None) -> RequestPlan:
+    """
+    Plans the requests of a `refresh_metrics` run without sending any.
+
+    Every symbol needs the bars from its watermark (included, as it may have
+    still been forming) to now. A symbol without stored bars starts from the
+    end of its last empty window if a previous run recorded one, and fetches
+    the full lookback otherwise. The adapter's planner packs symbols with
+    similar windows into shared requests.
+
+    :param ca: The `CoinalyzeRestAdapter` whose limits and rate the plan uses.
+    :param tables: Table name per metric.
+    :param symbols: The symbols to refresh.
+    :param interval: The time interval of the bars (e.g. '4hour').
+    :param watermarks: Per metric, the latest stored `t` per symbol (see `get_metric_watermarks`).
+    :param metric_symbols: Optionally, the symbols of some metrics (see `METRICS[...].market_flag`);
+                           other metrics use `symbols`.
+    :param empty_fetches: Optionally, per metric, the empty-fetch watermarks (see `get_empty_fetch_watermarks`).
+    :return: The combined plan of every metric.
+    """
+    metric_symbols = metric_symbols or {}
+    empty_fetches = empty_fetches or {}
+    plan = RequestPlan(rate_limit_per_minute=ca.rate_limit_per_minute)
+    for metric in tables:
+        spec = METRICS[metric]
+        starts = {**empty_fetches.get(metric, {}), **watermarks[metric]}
+        needs = [(symbol, starts.get(symbol), None) for symbol in metric_symbols.get(metric, symbols)]
+        plan.extend(ca.plan_history(spec.endpoint, needs, interval, dict(spec.params)))
+    return plan
+
+
+@dataclass
+class RefreshResult:
+    """
+    Summary of one `refresh_data` run.
+
+    `touched` maps each symbol that received rows to the (min_t, max_t) range
+    that was inserted or overwritten.
+    """
+    table_name: str
+    rows_fetched: int = 0
+    rows_inserted: int = 0
+    rows_updated: int = 0
+    latest_t: Optional[int] = None
+    touched: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+
+def build_upsert_sql(table_name: str, columns=OHLCV_COLUMNS, key=('symbol', 't')) -> str:
+    """
+    Builds a prepared `INSERT ... ON CONFLICT DO UPDATE` statement for `executemany`.
+    """
+    columns_str = ', '.join(f'"{col}"' for col in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    update_str = ', '.join(f'"{col}" = excluded."{col}"' for col in columns if col not in key)
+    return (
+        f'INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders}) '
+        f'ON CONFLICT({", ".join(key)}) DO UPDATE SET {update_str}'
+    )
+
+
+def ohlcv_rows(symbol: str, history: list) -> list:
+    """
+    Converts one symbol's `history` list from the API into rows ordered as `OHLCV_COLUMNS`.
+    """
+    return [
+        (symbol, bar['t'], bar['o'], bar['h'], bar['l'], bar['c'],
+         bar.get('v'), bar.get('bv'), bar.get('tx'), bar.get('btx'))
+        for bar in history
+    ]
+
+
+def create_ohlcv_table(c, table_name: str) -> None:
+    """
+    Creates the OHLCV table if it doesn't exist. The composite PRIMARY KEY is crucial.
+
+    The table is `WITHOUT ROWID`, so rows are clustered by (symbol, t) in the
+    primary-key b-tree: there is no separate PK index, the file is smaller and
+    range scans by symbol read contiguous pages.
+    """
+    c.execute(f"""
         CREATE TABLE IF NOT EXISTS {table_name} (
             symbol TEXT,
             t INTEGER,
@@ -77,63 +299,302 @@ def refresh_data(db_path: str, table_name: str, symbols: list, interval: str):
             tx INTEGER,
             btx INTEGER,
             PRIMARY KEY (symbol, t)
+        ) WITHOUT ROWID
+    """)
+
+
+def create_read_indexes(c, table_name: str) -> None:
+    """
+    Creates the index used by cross-sectional ("all symbols at time t") reads, e.g. `CandleStore`.
+
+    Per-symbol range queries are served by the (symbol, t) primary key. The
+    `t` index also carries the primary-key columns, so `t`/`symbol` lookups
+    never touch the table, and cross-sections read one clustered row per symbol.
+    Built on the write side (refresh and migration), never by readers.
+    """
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_t ON {table_name} (t)")
+
+
+def create_metric_table(c, table_name: str, metric: str = 'ohlcv') -> None:
+    """
+    Creates the `WITHOUT ROWID` table of one metric (see `METRICS`) if it doesn't exist.
+    """
+    if metric == 'ohlcv':
+        create_ohlcv_table(c, table_name)
+        return
+    value_columns = ''.join(f'            "{col}" REAL,\n' for col in METRICS[metric].value_columns)
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            symbol TEXT,
+            t INTEGER,
+{value_columns}            PRIMARY KEY (symbol, t)
+        ) WITHOUT ROWID
+    """)
+
+
+def metric_rows(metric: str, symbol: str, history: list) -> list:
+    """
+    Converts one symbol's `history` list from the API into rows ordered as `METRICS[metric].columns`.
+    """
+    if metric == 'ohlcv':
+        return ohlcv_rows(symbol, history)
+    value_columns = METRICS[metric].value_columns
+    return [(symbol, bar['t']) + tuple(bar.get(col) for col in value_columns) for bar in history]
+
+
+def is_without_rowid(c, table_name: str) -> Optional[bool]:
+    """
+    Returns whether `table_name` is a WITHOUT ROWID table, or None if it doesn't exist.
+    """
+    c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    row = c.fetchone()
+    if row is None:
+        return None
+    return 'WITHOUT ROWID' in row[0].upper()
+
+
+def migrate_ohlcv_table(conn, table_name: str) -> bool:
+    """
+    Rebuilds a legacy rowid OHLCV table as a WITHOUT ROWID table in one transaction.
+
+    :param conn: An open connection.
+    :param table_name: The table to migrate.
+    :return: True if the table was migrated, False if it was missing or already migrated.
+    """
+    c = conn.cursor()
+    if is_without_rowid(c, table_name) is not False:
+        return False
+
+    tmp_name = f"{table_name}__migrating"
+    columns_str = ', '.join(OHLCV_COLUMNS)
+    conn.execute('BEGIN')
+    try:
+        c.execute(f"DROP TABLE IF EXISTS {tmp_name}")
+        create_ohlcv_table(c, tmp_name)
+        # ORDER BY the primary key so the new b-tree is filled sequentially.
+        c.execute(
+            f"INSERT INTO {tmp_name} ({columns_str}) SELECT {columns_str} FROM {table_name} ORDER BY symbol, t"
         )
-        """
-        c.execute(create_table_sql)
-
-        # --- Step 2: Fetch data efficiently ---
-        ca = CoinalyzeRestAdapter()
-        logger.info(f"Fetching data for symbols: {symbols} with interval: {interval}")
-        raw_data = ca.get_ohlcv_history(symbols=symbols, interval=interval)
-
-        # --- Step 3: Combine all data into a single DataFrame ---
-        all_data_frames = []
-        for data in raw_data:
-            df = pd.DataFrame(data['history'])
-            if not df.empty:
-                df['symbol'] = data['symbol']
-                # The 'interval' column is no longer needed.
-                # df['interval'] = interval 
-                all_data_frames.append(df)
-
-        if not all_data_frames:
-            logger.info("No data returned from API for any symbols. Nothing to insert.")
-            return
-
-        master_df = pd.concat(all_data_frames, ignore_index=True)
-        
-        # Get the latest timestamp from the data for verification.
-        latest_timestamp = master_df['t'].max()
-        latest_datetime_str = pd.to_datetime(latest_timestamp, unit='s').strftime('%Y-%m-%d %H:%M:%S UTC')
-
-
-        # --- Step 4: Use a transaction for the entire database operation ---
-        conn.execute('BEGIN TRANSACTION')
-        
-        logger.info(f"Attempting to insert {len(master_df)} rows into table: {table_name}.")
-        # Use index=False as we are not using the DataFrame index as a column.
-        master_df.to_sql('temporary_table', conn, if_exists='replace', index=False)
-
-        columns = master_df.columns.tolist()
-        columns_str = ', '.join([f'"{col}"' for col in columns])
-
-        insert_sql = f'INSERT OR IGNORE INTO {table_name} ({columns_str}) SELECT {columns_str} FROM temporary_table'
-        c.execute(insert_sql)
-        
-        rows_inserted = c.rowcount
-        logger.info(f"Successfully inserted {rows_inserted} new rows. Latest timestamp from API call: {latest_datetime_str}")
-
-        # Commit the transaction
+        rows = c.rowcount
+        c.execute(f"DROP TABLE {table_name}")
+        c.execute(f"ALTER TABLE {tmp_name} RENAME TO {table_name}")
         conn.commit()
-        logger.info("Database transaction committed successfully.")
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Migrated {rows} rows of '{table_name}' to a WITHOUT ROWID table.")
+    return True
+
+
+def migrate_db(db_path: str, table_names: list) -> None:
+    """
+    One-shot migration of an existing candle database to the tuned layout.
+
+    Rebuilds every legacy table as WITHOUT ROWID and creates its read
+    indexes, then VACUUMs in rollback journal mode so the new page size is
+    applied, and finally enables WAL.
+    """
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        conn.execute("PRAGMA journal_mode = DELETE")
+        for table_name in table_names:
+            migrate_ohlcv_table(conn, table_name)
+            if is_without_rowid(conn.cursor(), table_name) is not None:
+                create_read_indexes(conn, table_name)
+                conn.commit()
+        conn.execute(f"PRAGMA page_size = {SQLITE_PAGE_SIZE}")
+        conn.execute("VACUUM")
+        apply_pragmas(conn)
+        logger.info(f"Database at {db_path} migrated to the tuned storage layout.")
+    finally:
+        conn.close()
+
+
+# CHANGE: The function now accepts a specific path for the database.
+def refresh_data(db_path: str, table_name: str, symbols: list, interval: str, incremental: bool = True,
+                 ca=None, run_id: int = None, writer: SQLiteWriter = None) -> Optional[RefreshResult]:
+    """
+    Fetches only the newest OHLCV data from the Coinalyze API and upserts
+    the new rows into a single table in a local SQLite database.
+
+    Shorthand for `refresh_metrics` with only the 'ohlcv' metric.
+
+    :param db_path: The absolute path to the SQLite database file.
+    :param table_name: The name of the table to insert data into.
+    :param symbols: A list of symbols to fetch data for.
+    :param interval: The time interval for the OHLCV data (e.g., '1h', '4h', '1d').
+    :param incremental: If False, ignore watermarks and fetch the full lookback for every symbol.
+    :param ca: An optional `CoinalyzeRestAdapter` to reuse; a new one is created if omitted.
+    :param run_id: If given (see `utils.changelog.begin_run`), the inserted/updated
+                   range of every symbol is recorded in the changelog under this run.
+    :param writer: An optional shared `SQLiteWriter` (e.g. one serialized writer for
+                   parallel jobs). Its rows are only committed once the caller closes it.
+    :return: A `RefreshResult`, or None if the refresh failed.
+    """
+    results = refresh_metrics(db_path, {'ohlcv': table_name}, symbols, interval, incremental, ca, run_id, writer)
+    return results['ohlcv'] if results is not None else None
+
+
+def refresh_metrics(db_path: str, tables: Dict[str, str], symbols: list, interval: str, incremental: bool = True,
+                    ca=None, run_id: int = None, writer: SQLiteWriter = None, replay=None,
+                    replay_since: float = None,
+                    metric_symbols: Dict[str, list] = None) -> Optional[Dict[str, RefreshResult]]:
+    """
+    Fetches only the newest bars of several metrics (OHLCV, open interest,
+    funding, liquidations, ...) and upserts them into one table per metric.
+
+    For each table, the latest stored bar timestamp per symbol is read through
+    the primary key and every symbol needs the bars from its watermark on
+    (symbols with no stored bars fetch the full API lookback). The adapter's
+    request planner packs symbols with similar windows into as few requests as
+    the API limits allow (see `plan_metrics`), and the requests of every metric
+    go through one shared schedule, so all endpoints draw from the same
+    concurrency and rate-limit budget. Each batch is handed to a background `SQLiteWriter`
+    thread as soon as it arrives, so network fetches and database writes
+    overlap. Re-fetching from the watermark overwrites the latest stored bar,
+    which may have still been forming on the previous run. A symbol without
+    stored bars whose window comes back empty gets an empty-fetch watermark
+    (see `EMPTY_FETCHES_TABLE`), so the next run does not fetch its full
+    lookback again.
+
+    With `replay`, the batches come from the raw responses kept by a
+    `ResponseStore` instead of the API: every stored response of these
+    metrics, interval and symbols is upserted again, oldest first, so a run
+    that failed after downloading can be rebuilt without touching the network.
+
+    :param db_path: The absolute path to the SQLite database file.
+    :param tables: Table name per metric (see `METRICS`), e.g.
+                   `{'ohlcv': 'binance_perp_ohlcv', 'funding_rate': 'binance_perp_funding_rate'}`.
+    :param symbols: A list of symbols to fetch data for.
+    :param interval: The time interval of the bars (e.g. '4hour').
+    :param incremental: If False, ignore watermarks and fetch the full lookback for every symbol.
+    :param ca: An optional `CoinalyzeRestAdapter` to reuse; a new one is created if omitted.
+    :param run_id: If given, the inserted/updated range of every symbol is recorded in the changelog.
+    :param writer: An optional shared `SQLiteWriter`; its rows are only committed once the caller closes it.
+    :param replay: An optional `utils.response_store.ResponseStore` to rebuild the tables from; `ca` is then unused.
+    :param replay_since: With `replay`, only the responses stored at or after this unix time.
+    :param metric_symbols: Optionally, the symbols of some metrics, e.g. without the markets
+                           Coinalyze has no long/short ratio for; other metrics use `symbols`.
+    :return: A `RefreshResult` per metric, or None if the refresh failed.
+    """
+    unknown = set(tables) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metric(s): {sorted(unknown)}. Available: {sorted(METRICS)}")
+
+    conn = None # Initialize conn to None
+    started = time.perf_counter()
+    try:
+        # --- Step 1: Connect to DB, set up the tables and read watermarks ---
+        conn, c = connect_db(db_path) # CHANGE: Use the provided path
+        if not conn:
+            return None # Exit if the database connection failed.
+
+        for metric, table_name in tables.items():
+            create_metric_table(c, table_name, metric)
+        if 'ohlcv' in tables:
+            create_read_indexes(c, tables['ohlcv'])
+        create_empty_fetches_table(c)
+        conn.commit()
+        if incremental:
+            watermarks = get_metric_watermarks(c, tables, symbols)
+            empty_fetches = get_empty_fetch_watermarks(c, tables, symbols)
+        else:
+            watermarks = {metric: {} for metric in tables}
+            empty_fetches = {}
+        if 'ohlcv' in tables and not is_without_rowid(c, tables['ohlcv']):
+            logger.warning(
+                f"Table '{tables['ohlcv']}' uses the legacy rowid layout; run "
+                f"`python -m cron_jobs.migrate_candle_tables` to migrate it."
+            )
+        conn.close()
+        conn = None
+
+        # --- Step 2: Plan the requests, then stream every batch from the API into the writer thread ---
+        endpoint_metrics = {METRICS[metric].endpoint: metric for metric in tables}
+        if replay is None:
+            # Import here so callers can import `utils.db_util` without requiring
+            # optional runtime deps (e.g. `requests`) unless they actually refresh.
+            from utils.coinalyze_rest_adapter import CoinalyzeRestAdapter
+
+            ca = ca if ca is not None else CoinalyzeRestAdapter()
+            plan = plan_metrics(ca, tables, symbols, interval, watermarks, metric_symbols, empty_fetches)
+            summary = plan.summary()
+            logger.info(
+                f"Fetching {', '.join(tables)} for {len(symbols)} symbols (interval: {interval}) in {summary['requests']} "
+                f"request(s) (~{summary['estimated_seconds']}s at the rate limit): {summary['needed_points']} bars needed, "
+                f"{summary['fetched_points']} at most fetched"
+            )
+            run_metrics.inc('refresh_planned_requests_total', plan.n_requests, table=','.join(tables.values()))
+            batches = ((request.endpoint, request.windows, batch) for request, batch in ca.iter_plan(plan))
+        else:
+            logger.info(f"Replaying stored {', '.join(tables)} responses for {len(symbols)} symbols (interval: {interval})")
+            batches = (
+                (endpoint, None, batch)
+                for endpoint, _, batch in replay.iter_batches(endpoint_metrics, interval, symbols, since=replay_since)
+            )
+        results = {metric: RefreshResult(table_name=table_name) for metric, table_name in tables.items()}
+        upsert_sqls = {
+            metric: build_upsert_sql(table_name, METRICS[metric].columns) for metric, table_name in tables.items()
+        }
+
+        with SQLiteWriter(db_path) if writer is None else nullcontext(writer) as writer:
+            for endpoint, windows, batch in batches:
+                metric = endpoint_metrics[endpoint]
+                result = results[metric]
+                returned = {data['symbol'] for data in batch if data['history']}
+                empty_rows = [
+                    (result.table_name, symbol, to_t) for symbol, _, to_t in windows or ()
+                    if symbol not in returned and watermarks[metric].get(symbol) is None
+                ]
+                if empty_rows:
+                    writer.submit(RECORD_EMPTY_FETCH_SQL, empty_rows)
+                for data in batch:
+                    history = data['history']
+                    if not history:
+                        continue
+                    symbol = data['symbol']
+                    watermark = watermarks[metric].get(symbol)
+                    if watermark is not None and replay is None:
+                        # a shared request may start before this symbol's watermark; older bars are already stored
+                        history = [bar for bar in history if bar['t'] >= watermark]
+                        if not history:
+                            continue
+                    n_updated = 0 if watermark is None else sum(1 for bar in history if bar['t'] <= watermark)
+                    min_t = min(bar['t'] for bar in history)
+                    max_t = max(bar['t'] for bar in history)
+
+                    writer.submit(upsert_sqls[metric], metric_rows(metric, symbol, history))
+                    if run_id is not None:
+                        writer.submit(RECORD_CHANGE_SQL, [
+                            (run_id, result.table_name, symbol, min_t, max_t, len(history) - n_updated, n_updated)
+                        ])
+
+                    result.rows_fetched += len(history)
+                    result.rows_updated += n_updated
+                    result.rows_inserted += len(history) - n_updated
+                    result.touched[symbol] = (min_t, max_t)
+                    result.latest_t = max_t if result.latest_t is None else max(result.latest_t, max_t)
+
+        for result in results.values():
+            table_name = result.table_name
+            run_metrics.inc('refresh_rows_fetched_total', result.rows_fetched, table=table_name)
+            run_metrics.inc('refresh_rows_inserted_total', result.rows_inserted, table=table_name)
+            run_metrics.inc('refresh_rows_updated_total', result.rows_updated, table=table_name)
+            if result.rows_fetched == 0:
+                logger.info(f"No data returned from API for any symbols of '{table_name}'. Nothing to insert.")
+                continue
+            latest_datetime_str = datetime.fromtimestamp(result.latest_t, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+            logger.info(
+                f"Successfully inserted {result.rows_inserted} new rows and updated {result.rows_updated} rows "
+                f"in {table_name}. Latest timestamp from API call: {latest_datetime_str}"
+            )
+        run_metrics.observe('refresh_data_seconds', time.perf_counter() - started, table=','.join(tables.values()))
+        return results
 
     except Exception as e:
         logger.error(f"An error occurred during the data refresh process: {e}")
         logger.error(traceback.format_exc())
-        if conn:
-            # If an error occurs, roll back any changes from the current transaction
-            logger.warning("Rolling back database transaction.")
-            conn.rollback()
+        return None
 
     finally:
         # Ensure the database connection is always closed
@@ -0,0 +1,368 @@
+import atexit
+import itertools
+import json
+import mimetypes
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .logging import logger
+from .metrics import run_metrics
+
+# Lower values are delivered first.
+PRIORITY_EMERGENCY = 0
+PRIORITY_NORMAL = 10
+
+# Discord's per-message limits; coalesced batches never exceed them.
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+MAX_FILES = 10
+
+_STOP = object()
+
+
+class DiscordDeliveryError(Exception):
+    """Raised (through the message's future) when a message could not be delivered."""
+
+
+@dataclass
+class DiscordMessage:
+    """
+    One queued webhook message. `files` maps attachment file name -> path on
+    disk; files are only opened, and streamed, when the message is sent.
+    """
+    url: str
+    content: str = ''
+    username: Optional[str] = None
+    allowed_mentions: Optional[Dict] = None
+    embeds: List[Dict] = field(default_factory=list)
+    files: Dict[str, str] = field(default_factory=dict)
+    priority: int = PRIORITY_NORMAL
+    future: Future = field(default_factory=Future)
+
+    def coalesce_key(self) -> Tuple:
+        return self.url, self.username, json.dumps(self.allowed_mentions, sort_keys=True)
+
+
+class _MultipartStream:
+    """
+    File-like `multipart/form-data` body that reads attachments from disk in
+    chunks while it is being sent. It has a length, so requests sends a
+    Content-Length instead of buffering the files in memory.
+    """
+
+    def __init__(self, payload: Dict, files: Dict[str, str]) -> None:
+        self.boundary = uuid.uuid4().hex
+        # parts are bytes, or paths of files streamed from disk
+        self._parts: List = [
+            self._header('payload_json', content_type='application/json', first=True),
+            json.dumps(payload).encode(),
+        ]
+        for i, (file_name, path) in enumerate(files.items()):
+            content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+            self._parts += [self._header(f'files[{i}]', file_name, content_type), path]
+        self._parts.append(f'\r\n--{self.boundary}--\r\n'.encode())
+        self._length = sum(os.path.getsize(p) if isinstance(p, str) else len(p) for p in self._parts)
+        self._current = None
+        self._index = 0
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def _header(self, name: str, file_name: str = None, content_type: str = None, first: bool = False) -> bytes:
+        prefix = '' if first else '\r\n'
+        disposition = f'form-data; name="{name}"' + (f'; filename="{file_name}"' if file_name else '')
+        return f'{prefix}--{self.boundary}\r\nContent-Disposition: {disposition}\r\nContent-Type: {content_type}\r\n\r\n'.encode()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        chunks, remaining = [], size if size is not None and size >= 0 else self._length
+        while remaining > 0 and self._index < len(self._parts):
+            if self._current is None:
+                part = self._parts[self._index]
+                self._current = open(part, 'rb') if isinstance(part, str) else _BytesReader(part)
+            chunk = self._current.read(remaining)
+            if not chunk:
+                self._current.close()
+                self._current = None
+                self._index += 1
+                continue
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self) -> None:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+class _BytesReader:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+        self._pos = 0
+
+    def read(self, size: int) -> bytes:
+        chunk = self._data[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        pass
+
+
+class _RateLimits:
+    """
+    Tracks Discord's rate-limit buckets from the `X-RateLimit-*` response
+    headers, plus the global limit signalled by a global 429.
+    """
+
+    def __init__(self) -> None:
+        self._bucket_of_url: Dict[str, str] = {}
+        self._buckets: Dict[str, Tuple[int, float]] = {}   # bucket -> (remaining, monotonic reset time)
+        self._global_until = 0.0
+
+    def wait_time(self, url: str) -> float:
+        now = time.monotonic()
+        wait = max(0.0, self._global_until - now)
+        bucket = self._buckets.get(self._bucket_of_url.get(url, url))
+        if bucket is not None and bucket[0] <= 0:
+            wait = max(wait, bucket[1] - now)
+        return wait
+
+    def update(self, url: str, headers) -> None:
+        bucket = headers.get('X-RateLimit-Bucket', url)
+        self._bucket_of_url[url] = bucket
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_after = float(headers['X-RateLimit-Reset-After'])
+        except (KeyError, ValueError):
+            return
+        self._buckets[bucket] = (remaining, time.monotonic() + reset_after)
+
+    def limited(self, url: str, retry_after: float, is_global: bool) -> None:
+        until = time.monotonic() + retry_after
+        if is_global:
+            self._global_until = max(self._global_until, until)
+        else:
+            self._buckets[self._bucket_of_url.get(url, url)] = (0, until)
+
+
+class DiscordDeliveryQueue:
+    """
+    Background delivery queue for Discord webhooks.
+
+    Callers `send()` and get a `Future` back immediately; one worker thread
+    delivers over a pooled keep-alive session. Messages are taken by priority
+    (emergency first), and a burst of messages for the same webhook (same
+    username and mentions) is coalesced into as few Discord messages as the
+    content/embed/file limits allow. Rate-limit buckets are honoured before
+    each request, 429s wait for `retry_after` (globally when Discord says
+    so), and 5xx/connection errors are retried with backoff.
+
+    Usage:
+        delivery = DiscordDeliveryQueue()
+        future = delivery.send(url, content='BTC funding flipped', files={'chart.png': path})
+        delivery.close()   # flushes pending messages
+    """
+
+    def __init__(self, coalesce_window: float = 0.5, max_attempts: int = 5, timeout: float = 30,
+                 session: requests.Session = None) -> None:
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._session = session or requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        self._session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        self._limits = _RateLimits()
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._closed = False
+        # held while checking `_closed` and enqueueing, so nothing is queued behind `_STOP`
+        self._state_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='discord-delivery', daemon=True)
+        self._thread.start()
+
+    def send(self, url: str, content: str = '', username: str = None, allowed_mentions: Dict = None,
+             embeds: List[Dict] = None, files: Dict[str, str] = None, priority: int = PRIORITY_NORMAL) -> Future:
+        """
+        Queues a message and returns a `Future` resolving to the HTTP status code of its delivery.
+
+        :param files: Attachment file name -> path; read from disk only while sending.
+        :param priority: `PRIORITY_EMERGENCY` messages are delivered before any other queued message.
+        """
+        message = DiscordMessage(url, content, username, allowed_mentions, list(embeds or []), dict(files or {}), priority)
+        with self._state_lock:
+            if not self._closed:
+                self._queue.put((priority, next(self._seq), message))
+                return message.future
+        message.future.set_exception(DiscordDeliveryError('delivery queue is closed'))
+        return message.future
+
+    def close(self, timeout: float = None) -> None:
+        """
+        Delivers every queued message, then stops the worker.
+
+        If the worker stops with messages still queued, their futures fail
+        with `DiscordDeliveryError` rather than never resolving.
+        """
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put((float('inf'), next(self._seq), _STOP))
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Discord delivery still running after {timeout}s; pending messages keep their futures")
+            return
+        self._fail_pending()
+        self._session.close()
+
+    def _fail_pending(self) -> None:
+        while True:
+            try:
+                message = self._queue.get_nowait()[2]
+            except queue.Empty:
+                return
+            if message is not _STOP and not message.future.done():
+                message.future.set_exception(DiscordDeliveryError('delivery queue closed before the message was sent'))
+
+    def _run(self) -> None:
+        while True:
+            priority, seq, first = self._queue.get()
+            if first is _STOP:
+                return
+            if first.priority > PRIORITY_EMERGENCY and self.coalesce_window:
+                # let a burst accumulate so it can be sent as fewer messages
+                time.sleep(self.coalesce_window)
+
+            drained = []
+            while True:
+                try:
+                    drained.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if drained and min(drained)[0] < priority:
+                # something more urgent arrived meanwhile: it goes first
+                for item in drained + [(priority, seq, first)]:
+                    self._queue.put(item)
+                continue
+
+            batch = [first]
+            for item in sorted(drained):
+                message = item[2]
+                if message is not _STOP and _fits(batch, message):
+                    batch.append(message)
+                else:
+                    self._queue.put(item)
+            self._deliver(batch)
+
+    def _deliver(self, batch: List[DiscordMessage]) -> None:
+        first = batch[0]
+        payload = {
+            'content': '\n'.join(m.content for m in batch if m.content),
+            'username': first.username,
+            'allowed_mentions': first.allowed_mentions,
+            'embeds': [embed for m in batch for embed in m.embeds],
+        }
+        payload = {key: value for key, value in payload.items() if value}
+        files = {name: path for m in batch for name, path in m.files.items()}
+
+        try:
+            status = self._post(first.url, payload, files)
+        except Exception as e:
+            logger.error(f"Discord delivery of {len(batch)} message(s) failed: {e}")
+            run_metrics.inc('discord_messages_total', len(batch), status='failed')
+            for message in batch:
+                message.future.set_exception(e if isinstance(e, DiscordDeliveryError) else DiscordDeliveryError(str(e)))
+            return
+
+        run_metrics.inc('discord_messages_total', len(batch), status=str(status))
+        run_metrics.inc('discord_requests_total')
+        for message in batch:
+            message.future.set_result(status)
+
+    def _post(self, url: str, payload: Dict, files: Dict[str, str]) -> int:
+        for attempt in range(1, self.max_attempts + 1):
+            wait = self._limits.wait_time(url)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                if files:
+                    body = _MultipartStream(payload, files)
+                    try:
+                        response = self._session.post(
+                            url, data=body, headers={'Content-Type': body.content_type}, timeout=self.timeout
+                        )
+                    finally:
+                        body.close()
+                else:
+                    response = self._session.post(url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                logger.warning(f"Discord request failed (attempt {attempt}/{self.max_attempts}): {e}")
+                time.sleep(min(30.0, random.uniform(0, 2 ** attempt)))
+                continue
+
+            self._limits.update(url, response.headers)
+            if response.status_code == 429:
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {}
+                retry_after = float(body.get('retry_after') or response.headers.get('Retry-After') or 1)
+                is_global = bool(body.get('global')) or response.headers.get('X-RateLimit-Global') == 'true'
+                self._limits.limited(url, retry_after, is_global)
+                logger.warning(f"Discord rate limited ({'global' if is_global else 'bucket'}); retrying in {retry_after:.2f}s")
+                continue
+            if response.status_code >= 500:
+                time.sleep(min(30.0, random.uniform(0, 2 ** attempt)))
+                continue
+            if response.status_code >= 400:
+                logger.error(f"Discord rejected a message: [{response.status_code}] {response.text[:200]}")
+            return response.status_code
+        raise DiscordDeliveryError(f'gave up after {self.max_attempts} attempts')
+
+
+def _fits(batch: List[DiscordMessage], message: DiscordMessage) -> bool:
+    """
+    Whether `message` can be merged into `batch` without exceeding Discord's limits.
+    """
+    first = batch[0]
+    if message.coalesce_key() != first.coalesce_key() or message.priority != first.priority:
+        return False
+    contents = [m.content for m in batch + [message] if m.content]
+    file_names = [name for m in batch + [message] for name in m.files]
+    return (
+        len('\n'.join(contents)) <= MAX_CONTENT_LENGTH
+        and sum(len(m.embeds) for m in batch) + len(message.embeds) <= MAX_EMBEDS
+        and len(file_names) <= MAX_FILES
+        and len(set(file_names)) == len(file_names)
+    )
+
+
+_default_queue: Optional[DiscordDeliveryQueue] = None
+_default_lock = threading.Lock()
+
+
+def get_delivery_queue() -> DiscordDeliveryQueue:
+    """
+    Returns the process-wide delivery queue, flushed automatically at exit.
+    """
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = DiscordDeliveryQueue()
+            atexit.register(_default_queue.close, 30)
+        return _default_queue
@@ -1,98 +1,120 @@
-from discord_webhook import DiscordWebhook
+from concurrent.futures import Future
 from datetime import datetime
 from pytz import timezone
 import os
 
+from .discord_delivery import DiscordDeliveryQueue, PRIORITY_EMERGENCY, get_delivery_queue
+from .logging import logger
+
+
 class DiscordNotifier:
-    def __init__(self, config_file, venue_name) -> None:
+    def __init__(self, config_file, venue_name, delivery: DiscordDeliveryQueue = None) -> None:
         self.venue_name = venue_name
-        
+        # messages are handed to a background queue, so sending never blocks the caller
+        self.delivery = delivery if delivery is not None else get_delivery_queue()
+
         # load config
         try:
             self.config = config_file['discord']
         except Exception as e:
-            self.logger.error('config not loaded properly for Discord Notifier', e)
-        
+            logger.error(f'config not loaded properly for Discord Notifier: {e}')
+            raise
+
         # load webhook_mappings
         self.webhook_mappings = {}
         webhook_mappings = self.config['webhook_mappings']
         for metric, url in webhook_mappings.items():
             self.webhook_mappings[metric] = url
-            
+
         # load mention discord ids
         self.mention_discord_ids = self.config['mention_discord_ids']
-        
-    def send_message(self, files: dict, metric: str, param_to_display: dict, mention: bool):
+
+    def _mentions(self, mention: bool):
         if mention:
             allow_mentions = {'users': self.mention_discord_ids}
             mention_str = ",".join( f'<@{x}>' for x in self.mention_discord_ids)
         else:
             allow_mentions = {'users': []}
             mention_str = ''
-        
+        return allow_mentions, mention_str
+
+    def send_message(self, files: dict, metric: str, param_to_display: dict, mention: bool, timeout: float = 30) -> int:
+        """
+        Sends a message to the webhook of `metric` and waits for it.
+
+        Returns the HTTP status code of the delivery. Use `queue_message` to not block.
+        """
+        return self.queue_message(files, metric, param_to_display, mention).result(timeout)
+
+    def queue_message(self, files: dict, metric: str, param_to_display: dict, mention: bool) -> Future:
+        """
+        Queues a message to the webhook of `metric`.
+
+        Returns a Future resolving to the HTTP status code once delivered;
+        call `.result()` on it to wait.
+        """
+        allow_mentions, mention_str = self._mentions(mention)
+
         # update content
         content = f'{mention_str}\n{param_to_display["title"]}'
-        
-        # construct webhook
-        webhook = DiscordWebhook(
+
+        # attachments are streamed from disk when the message is sent
+        return self.delivery.send(
             url=self.webhook_mappings[metric],
             content=content,
             username=self.venue_name,
-            allowed_mentions=allow_mentions
+            allowed_mentions=allow_mentions,
+            files=files
         )
-        
-        # add images
-        for file_name, file_path in files.items():
-            with open(file_path, "rb") as f:
-                webhook.add_file(file=f.read(), filename=file_name)
-            
-        resp = webhook.execute()
-        
-        return resp.status_code
-
-    def send_daily_checks(self, indicator_name: str, body: str, files: dict, mention: bool):
-        if mention:
-            allow_mentions = {'users': self.mention_discord_ids}
-            mention_str = ",".join( f'<@{x}>' for x in self.mention_discord_ids)
-        else:
-            allow_mentions = {'users': []}
-            mention_str = ''
-        
+
+    def send_daily_checks(self, indicator_name: str, body: str, files: dict, mention: bool, timeout: float = 30) -> int:
+        """
+        Sends a daily check to the webhook of `indicator_name` and waits for it.
+
+        Returns the HTTP status code of the delivery. Use `queue_daily_checks` to not block.
+        """
+        return self.queue_daily_checks(indicator_name, body, files, mention).result(timeout)
+
+    def queue_daily_checks(self, indicator_name: str, body: str, files: dict, mention: bool) -> Future:
+        """
+        Queues a daily check to the webhook of `indicator_name`.
+
+        Returns a Future resolving to the HTTP status code once delivered.
+        """
+        allow_mentions, mention_str = self._mentions(mention)
+
         # update content
         content = f'{mention_str}\n{body}'
-        
-        # construct webhook
-        webhook = DiscordWebhook(
+
+        return self.delivery.send(
             url=self.webhook_mappings[indicator_name],
             content=content,
             username=indicator_name,
-            allowed_mentions=allow_mentions
+            allowed_mentions=allow_mentions,
+            files=files
         )
-        
-        # add images
-        for file_name, file_path in files.items():
-            with open(file_path, "rb") as f:
-                webhook.add_file(file=f.read(), filename=file_name)
-                
-        resp = webhook.execute()
-        
-        return resp.status_code
-    
+
 class EmergencyExitDiscordNotifier:
-    def __init__(self) -> None:
+    def __init__(self, delivery: DiscordDeliveryQueue = None) -> None:
         self.webhook_url = os.getenv("DISCORD_EMERGENCY_WEBHOOK_URL")
         if not self.webhook_url:
             raise ValueError("Missing env var DISCORD_EMERGENCY_WEBHOOK_URL")
-    
-    def notify(self):
+        self.delivery = delivery if delivery is not None else get_delivery_queue()
+
+    def notify(self, timeout: float = 30):
+        """
+        Sends the shutdown alert ahead of every other queued message and waits for it.
+
+        Returns the HTTP status code of the delivery.
+        """
         curr_ts = datetime.now(tz=timezone('Asia/Singapore'))
-        
-        webhook = DiscordWebhook(
+
+        future = self.delivery.send(
             url=self.webhook_url,
-            content=f"{datetime.now(tz=timezone('Asia/Singapore')).strftime('%Y/%m/%d %H:%M:%S')} - script is down",
+            content=f"{curr_ts.strftime('%Y/%m/%d %H:%M:%S')} - script is down",
             username="shutdown_notifier",
+            priority=PRIORITY_EMERGENCY
         )
-        
-        resp = webhook.execute()
-        
-        return resp.status_code
+
+        # the process is usually about to exit, so block until it is out
+        return future.result(timeout)
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .logging import logger
+from .metrics import run_metrics
+from .rate_limiter import TokenBucket
+
+# Status codes that are worth retrying; everything else is returned to the caller.
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RetryBudgetExceeded(Exception):
+    """Raised when a request keeps failing past the transport's retry limits."""
+
+
+class TransportStats:
+    """
+    Thread-safe counters describing what the transport has done so far.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.retries_by_reason: Dict[str, int] = {}
+        self.sleep_seconds = 0.0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_retry(self, reason: str, sleep_seconds: float) -> None:
+        with self._lock:
+            self.retries += 1
+            self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+            self.sleep_seconds += sleep_seconds
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'retries_by_reason': dict(self.retries_by_reason),
+                'sleep_seconds': round(self.sleep_seconds, 3),
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a `Retry-After` header given either in seconds or as an HTTP date.
+
+    :param value: The raw header value (may be None).
+    :return: The number of seconds to wait, or None if the header is absent/invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpTransport:
+    """
+    Pooled, keep-alive HTTP transport with bounded, jittered retries.
+
+    A single `requests.Session` is shared by every call so TCP/TLS connections
+    are reused across batches. Retryable failures (429, 5xx, connection errors
+    and timeouts) are retried iteratively with full-jitter exponential backoff;
+    a `Retry-After` header, when present, is used as the lower bound of the
+    wait. A request gives up once `max_retries` or the total `retry_budget`
+    (in seconds, measured from the first attempt) would be exceeded.
+
+    If a `rate_limiter` is given, every attempt takes a token from it first,
+    and a 429 pauses the limiter so that concurrent callers back off together.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 8,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0,
+        retry_budget: float = 300.0,
+        verify: bool = True,
+        rate_limiter: Optional[TokenBucket] = None,
+    ) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_budget = retry_budget
+        self.verify = verify
+        self.rate_limiter = rate_limiter
+        self.stats = TransportStats()
+
+        self.session = requests.Session()
+        # Retries are handled here rather than by urllib3 so they can be
+        # logged, counted and bounded by a total time budget.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get(self, url: str, params: Dict = None, headers: Dict = None) -> requests.Response:
+        """
+        Sends a GET request, retrying retryable failures.
+
+        :return: The final response. Non-retryable error statuses are returned
+                 as-is so the caller can decide how to surface them.
+        :raises RetryBudgetExceeded: If the request is still failing when the
+                 retry count or time budget runs out.
+        """
+        endpoint = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire()
+                run_metrics.inc('coinalyze_rate_limit_wait_seconds_total', waited, endpoint=endpoint)
+            self.stats.record_request()
+            request_started = time.perf_counter()
+            try:
+                response = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout, verify=self.verify
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason = type(e).__name__
+                delay = self._backoff(attempt)
+                run_metrics.inc('coinalyze_requests_total', endpoint=endpoint, status=reason)
+            else:
+                run_metrics.observe('coinalyze_request_seconds', time.perf_counter() - request_started, endpoint=endpoint)
+                run_metrics.inc('coinalyze_requests_total', endpoint=endpoint, status=response.status_code)
+                run_metrics.inc('coinalyze_response_bytes_total', len(response.content), endpoint=endpoint)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                reason = str(response.status_code)
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None:
+                    # Honour the server's hint and add a little jitter so
+                    # concurrent callers do not all wake up at once.
+                    delay = retry_after + random.uniform(0, min(1.0, self.backoff_base))
+                    if response.status_code == 429 and self.rate_limiter is not None:
+                        self.rate_limiter.pause(retry_after)
+                else:
+                    delay = self._backoff(attempt)
+
+            elapsed = time.monotonic() - started
+            if attempt >= self.max_retries or elapsed + delay > self.retry_budget:
+                raise RetryBudgetExceeded(
+                    f'GET {url} failed after {attempt + 1} attempt(s) in {elapsed:.1f}s (last error: {reason})'
+                )
+
+            logger.warning(f'GET {url} failed ({reason}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s')
+            self.stats.record_retry(reason, delay)
+            run_metrics.inc('coinalyze_retries_total', endpoint=endpoint, reason=reason)
+            run_metrics.inc('coinalyze_retry_sleep_seconds_total', delay, endpoint=endpoint)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self.session.close()
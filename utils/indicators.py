@@ -0,0 +1,249 @@
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from utils.db_util import get_db_path
+from utils.logging import logger
+
+# Bitcoin genesis block date, used by the ahr999 growth-valuation model.
+BTC_GENESIS = datetime(2009, 1, 3, tzinfo=timezone.utc)
+
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+
+# --- Vectorized primitives over (symbols x time) matrices ---
+# Every function works along axis 1 (time). Missing bars are NaN, and a
+# windowed value is NaN unless every bar in its window is present.
+
+def _rolling_sum(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    valid = ~np.isnan(x)
+    pad = np.zeros((x.shape[0], 1))
+    sums = np.concatenate([pad, np.cumsum(np.where(valid, x, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([pad, np.cumsum(valid, axis=1)], axis=1)
+    out = np.full(x.shape, np.nan)
+    full = np.zeros(x.shape, dtype=bool)
+    if x.shape[1] >= window:
+        out[:, window - 1:] = sums[:, window:] - sums[:, :-window]
+        full[:, window - 1:] = (counts[:, window:] - counts[:, :-window]) == window
+    return out, full
+
+
+def shift(x: np.ndarray, periods: int = 1) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if periods < x.shape[1]:
+        out[:, periods:] = x[:, :-periods]
+    return out
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    sums, full = _rolling_sum(x, window)
+    return np.where(full, sums / window, np.nan)
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    sums, full = _rolling_sum(x, window)
+    sq_sums, _ = _rolling_sum(x * x, window)
+    mean = sums / window
+    var = np.maximum(sq_sums / window - mean * mean, 0.0) * window / max(window - 1, 1)
+    return np.where(full, np.sqrt(var), np.nan)
+
+
+def returns(close: np.ndarray, periods: int = 1, log: bool = False) -> np.ndarray:
+    prev = shift(close, periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(close / prev) if log else close / prev - 1
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    prev_close = shift(close, 1)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return rolling_mean(true_range, window)
+
+
+def realized_volatility(close: np.ndarray, window: int, step: int) -> np.ndarray:
+    """
+    Annualized rolling standard deviation of log returns.
+    """
+    return rolling_std(returns(close, 1, log=True), window) * math.sqrt(SECONDS_PER_YEAR / step)
+
+
+def zscore(x: np.ndarray, window: int) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x - rolling_mean(x, window)) / rolling_std(x, window)
+
+
+def ahr999(close: np.ndarray, times: np.ndarray, window: int) -> np.ndarray:
+    """
+    ahr999-style index: (price / rolling average price) * (price / growth valuation),
+    where the growth valuation is 10 ** (5.84 * log10(coin age in days) - 17.01).
+
+    The growth model was fitted to BTC; for other symbols only the relative
+    ranking across the universe is meaningful.
+    """
+    age_days = (times - BTC_GENESIS.timestamp()) / 86400
+    target = 10 ** (5.84 * np.log10(age_days) - 17.01)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (close / rolling_mean(close, window)) * (close / target[np.newaxis, :])
+
+
+# name -> (function(engine matrices, **params) -> matrix, bars of history each output column depends on)
+INDICATORS: Dict[str, Tuple[Callable[..., np.ndarray], Callable[..., int]]] = {
+    'sma': (lambda m, field='c', window=20: rolling_mean(m[field], window), lambda window=20, **_: window),
+    'returns': (lambda m, periods=1, log=False: returns(m['c'], periods, log), lambda periods=1, **_: periods + 1),
+    'atr': (lambda m, window=14: atr(m['h'], m['l'], m['c'], window), lambda window=14, **_: window + 1),
+    'realized_vol': (
+        lambda m, window=42: realized_volatility(m['c'], window, m['step']), lambda window=42, **_: window + 1
+    ),
+    'zscore': (lambda m, field='c', window=20: zscore(m[field], window), lambda window=20, **_: window),
+    'ahr999': (lambda m, window=1200: ahr999(m['c'], m['t'], window), lambda window=1200, **_: window),
+}
+
+
+class IndicatorEngine:
+    """
+    Loads a candle table once into symbols x time NumPy matrices and computes
+    indicators for the whole universe in vectorized passes.
+
+    The time axis is a regular grid of `step` seconds, so a missing bar is a
+    NaN cell. Computed indicators are cached; `refresh()` appends only the
+    bars added since the last load, and cached indicators are then extended
+    by recomputing just the new columns (plus the warm-up each one needs and
+    the last previously loaded bar, which may have still been forming).
+
+    Usage:
+        engine = IndicatorEngine(table_name='binance_perp_ohlcv')
+        vol = engine.latest('realized_vol', window=42)   # {symbol: value}
+        engine.refresh()                                  # after the next 4h run
+    """
+
+    FIELDS = ('o', 'h', 'l', 'c', 'v')
+
+    def __init__(self, db_path: str = None, table_name: str = 'binance_perp_ohlcv', step: int = 4 * 60 * 60,
+                 since_t: int = None) -> None:
+        self.db_path = db_path or get_db_path()
+        self.table_name = table_name
+        self.step = step
+        self.since_t = since_t
+        self.symbols: List[str] = []
+        self.times = np.empty(0, dtype=np.int64)
+        self.matrices: Dict[str, np.ndarray] = {}
+        self._cache: Dict[Tuple, np.ndarray] = {}
+        self._lock = threading.RLock()
+        self.load()
+
+    def _query(self, since_t: Optional[int]) -> List[Tuple]:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.db_path))}?mode=ro", uri=True, timeout=10)
+        try:
+            sql = f"SELECT symbol, t, {', '.join(self.FIELDS)} FROM {self.table_name}"
+            params: Tuple = ()
+            if since_t is not None:
+                sql += " WHERE t >= ?"
+                params = (since_t,)
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _build(self, rows: List[Tuple], symbols: List[str], times: np.ndarray) -> Dict[str, np.ndarray]:
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+        matrices = {field: np.full((len(symbols), len(times)), np.nan) for field in self.FIELDS}
+        if rows:
+            columns = list(zip(*rows))
+            sym_idx = np.fromiter((index[s] for s in columns[0]), dtype=np.int64, count=len(rows))
+            t_idx = (np.asarray(columns[1], dtype=np.int64) - times[0]) // self.step
+            for field, values in zip(self.FIELDS, columns[2:]):
+                matrices[field][sym_idx, t_idx] = np.array(values, dtype=np.float64)
+        return matrices
+
+    def _grid(self, first_t: int, last_t: int) -> np.ndarray:
+        return np.arange(first_t // self.step * self.step, last_t + 1, self.step, dtype=np.int64)
+
+    def load(self) -> None:
+        """
+        (Re)loads the whole table and clears every cached indicator.
+        """
+        with self._lock:
+            rows = self._query(self.since_t)
+            self.symbols = sorted({row[0] for row in rows})
+            self.times = self._grid(min(r[1] for r in rows), max(r[1] for r in rows)) if rows else np.empty(0, np.int64)
+            self.matrices = self._build(rows, self.symbols, self.times)
+            self._cache.clear()
+            logger.info(f"IndicatorEngine loaded {len(self.symbols)} symbols x {len(self.times)} bars from '{self.table_name}'.")
+
+    def refresh(self) -> int:
+        """
+        Appends bars stored since the last load and extends cached indicators.
+
+        :return: The number of new time columns.
+        """
+        with self._lock:
+            if not len(self.times):
+                self.load()
+                return len(self.times)
+
+            last_t = int(self.times[-1])
+            rows = self._query(last_t)
+            new_symbols = sorted({row[0] for row in rows} - set(self.symbols))
+            if new_symbols:
+                # A new listing changes the row layout; a full reload keeps it simple.
+                self.load()
+                return len(self.times)
+
+            new_last_t = max((r[1] for r in rows), default=last_t)
+            tail_times = self._grid(last_t, new_last_t)
+            tail = self._build(rows, self.symbols, tail_times)
+            n_new = len(tail_times) - 1
+            for field in self.FIELDS:
+                self.matrices[field] = np.concatenate([self.matrices[field][:, :-1], tail[field]], axis=1)
+            self.times = np.concatenate([self.times[:-1], tail_times])
+
+            # Recompute the previously last column too, since that bar may have been updated.
+            for key, cached in list(self._cache.items()):
+                name, params = key[0], dict(key[1])
+                fn, warmup = INDICATORS[name]
+                start = cached.shape[1] - 1
+                lo = max(0, start - warmup(**params))
+                fresh = fn(self._view(lo), **params)
+                self._cache[key] = np.concatenate([cached[:, :start], fresh[:, start - lo:]], axis=1)
+            return n_new
+
+    def _view(self, lo: int = 0) -> Dict:
+        view = {field: matrix[:, lo:] for field, matrix in self.matrices.items()}
+        view['t'] = self.times[lo:]
+        view['step'] = self.step
+        return view
+
+    def compute(self, name: str, **params) -> np.ndarray:
+        """
+        Returns indicator `name` for every symbol and bar as a symbols x time matrix.
+
+        See `INDICATORS` for the available names and their parameters.
+        """
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{name}'. Available: {sorted(INDICATORS)}")
+        key = (name, tuple(sorted(params.items())))
+        with self._lock:
+            result = self._cache.get(key)
+            if result is None:
+                result = self._cache[key] = INDICATORS[name][0](self._view(), **params)
+            return result
+
+    def latest(self, name: str, **params) -> Dict[str, float]:
+        """
+        Cross-sectional screen: the indicator value at the latest bar per symbol, skipping missing ones.
+        """
+        values = self.compute(name, **params)
+        if not values.shape[1]:
+            return {}
+        return {symbol: float(v) for symbol, v in zip(self.symbols, values[:, -1]) if not np.isnan(v)}
+
+    def series(self, name: str, symbol: str, **params) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns `(times, values)` of one indicator for one symbol.
+        """
+        return self.times, self.compute(name, **params)[self.symbols.index(symbol)]
@@ -1,22 +1,175 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache
 from pytz import timezone
 
+# Log timestamps are rendered in Singapore time.
+LOG_TIMEZONE = timezone('Asia/Singapore')
+
+LOGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'logs'))
+
+# Environment knobs
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_JSON = os.getenv('LOG_JSON', '1') != '0'           # also write JSON lines to logs/<script>.jsonl
+LOG_NAME = os.getenv('LOG_NAME')                        # overrides <script>; `python -m cron_jobs` sets it per command
+LOG_ROTATION = os.getenv('LOG_ROTATION', 'size')        # 'size' or 'time' (daily at midnight)
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 7))
+# At most this many INFO/DEBUG records per call site per `LOG_RATE_WINDOW` seconds
+LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', 50))
+LOG_RATE_WINDOW = float(os.getenv('LOG_RATE_WINDOW', 10))
+LOG_QUEUE_SIZE = 10_000
+
+
+@lru_cache(maxsize=4096)
+def _local_timetuple(second: int) -> time.struct_time:
+    return datetime.fromtimestamp(second, tz=LOG_TIMEZONE).timetuple()
+
+
+def local_time_converter(seconds: float = None) -> time.struct_time:
+    """
+    `logging.Formatter.converter` rendering the record's own creation time in
+    `LOG_TIMEZONE`, cached per second so bursts of records skip the tz lookup.
+    """
+    return _local_timetuple(int(seconds if seconds is not None else time.time()))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=LOG_TIMEZONE).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': record.filename,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `limit` records per call site (file and line) every
+    `window` seconds, so per-batch messages in hot loops cannot flood the
+    logs. WARNING and above always pass. The number of suppressed records is
+    appended to the next record let through from the same call site.
+    """
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW) -> None:
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites = {}   # (pathname, lineno) -> [window_start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or record.created - site[0] >= self.window:
+                suppressed = site[2] if site is not None else 0
+                self._sites[key] = [record.created, 1, 0]
+            elif site[1] < self.limit:
+                site[1] += 1
+                suppressed = 0
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    `QueueHandler` that drops records instead of blocking when the queue is
+    full, so a slow disk or terminal can never stall the caller.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _script_name() -> str:
+    if LOG_NAME:
+        return LOG_NAME
+    path = sys.argv[0] if sys.argv and sys.argv[0] else ''
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name == '__main__':
+        # `python -m package`: name the log after the package
+        name = os.path.basename(os.path.dirname(path))
+    return name if name and name not in ('-c', '-m', '-') else 'python'
+
+
+def _file_handler(path: str) -> logging.Handler:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # delay: the file is only created once a record is written
+    if LOG_ROTATION == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when='midnight', backupCount=LOG_BACKUP_COUNT, delay=True
+        )
+    return logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True)
+
+
 logger = None
+listener = None
 
 if not logger:
     logger = logging.getLogger('custom_logger')
-    
+
     # create a streaming handler
     ch = logging.StreamHandler()
     # create a formatter and add add it to the handler
     ch_formatter = logging.Formatter("[%(asctime)s][%(filename)s][%(levelname)s]:%(message)s", "%Y-%m-%d %I:%M:%S %p SGT")
-    ch_formatter.converter = lambda *args: datetime.now(tz=timezone('Asia/Singapore')).timetuple()
+    ch_formatter.converter = local_time_converter
     ch.setFormatter(ch_formatter)
+    handlers = [ch]
+
+    # structured copy of every record, rotated by size or by day
+    if LOG_JSON:
+        try:
+            fh = _file_handler(os.path.join(LOGS_DIR, f'{_script_name()}.jsonl'))
+            fh.setFormatter(JsonFormatter())
+            handlers.append(fh)
+        except OSError as e:
+            sys.stderr.write(f'JSON log file disabled: {e}\n')
+
+    # Callers only enqueue; a background listener thread formats and writes
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    qh = NonBlockingQueueHandler(log_queue)
+    qh.addFilter(RateLimitFilter())
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # flush everything still queued when the process exits
+    atexit.register(listener.stop)
+
     # set logging levels
-    logger.setLevel(logging.INFO)
-    ch.setLevel(logging.INFO)
+    logger.setLevel(LOG_LEVEL)
     # add handler to the logger
-    logger.addHandler(ch)
+    logger.addHandler(qh)
     # prevent double printing
-    logger.propagate = False
\ No newline at end of file
+    logger.propagate = False
@@ -0,0 +1,112 @@
+import time
+from typing import Any, Dict, List
+
+from utils.logging import logger
+
+MARKETS_TABLE = 'markets'
+
+# Columns persisted from Coinalyze's `future-markets` / `spot-markets` payloads.
+MARKET_COLUMNS = (
+    'symbol',
+    'market_type',
+    'exchange',
+    'symbol_on_exchange',
+    'base_asset',
+    'quote_asset',
+    'is_perpetual',
+    'margined',
+    'expire_at',
+    'has_long_short_ratio_data',
+    'has_ohlcv_data',
+    'has_buy_sell_data',
+    'updated_at',
+)
+
+
+def create_markets_table(c) -> None:
+    """
+    Creates the `markets` table and the index used by venue filters.
+    """
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MARKETS_TABLE} (
+            symbol TEXT PRIMARY KEY,
+            market_type TEXT,
+            exchange TEXT,
+            symbol_on_exchange TEXT,
+            base_asset TEXT,
+            quote_asset TEXT,
+            is_perpetual INTEGER,
+            margined TEXT,
+            expire_at INTEGER,
+            has_long_short_ratio_data INTEGER,
+            has_ohlcv_data INTEGER,
+            has_buy_sell_data INTEGER,
+            updated_at INTEGER
+        ) WITHOUT ROWID
+    """)
+    c.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{MARKETS_TABLE}_venue
+        ON {MARKETS_TABLE} (exchange, is_perpetual, margined)
+    """)
+
+
+def sync_markets(conn, markets: List[Dict[str, Any]], market_type: str = 'future') -> int:
+    """
+    Replaces the stored markets of `market_type` with `markets` in one transaction.
+
+    :param conn: An open connection.
+    :param markets: The payload of `get_supported_future_markets()` / `get_supported_spot_markets()`.
+    :param market_type: 'future' or 'spot'.
+    :return: The number of markets stored.
+    """
+    c = conn.cursor()
+    create_markets_table(c)
+    updated_at = int(time.time())
+    rows = [
+        tuple(
+            market_type if col == 'market_type' else updated_at if col == 'updated_at' else market.get(col)
+            for col in MARKET_COLUMNS
+        )
+        for market in markets
+    ]
+    columns_str = ', '.join(MARKET_COLUMNS)
+    placeholders = ', '.join('?' for _ in MARKET_COLUMNS)
+    with conn:
+        c.execute(f"DELETE FROM {MARKETS_TABLE} WHERE market_type = ?", (market_type,))
+        c.executemany(f"INSERT OR REPLACE INTO {MARKETS_TABLE} ({columns_str}) VALUES ({placeholders})", rows)
+    logger.info(f"Stored {len(rows)} {market_type} markets in '{MARKETS_TABLE}'.")
+    return len(rows)
+
+
+def list_markets(conn, **filters) -> List[Dict[str, Any]]:
+    """
+    Returns the stored markets matching every `column=value` filter, as dicts of `MARKET_COLUMNS`.
+    """
+    unknown = set(filters) - set(MARKET_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown market filter column(s): {sorted(unknown)}")
+
+    where = ' AND '.join(f"{col} = ?" for col in filters) or '1'
+    c = conn.cursor()
+    c.execute(
+        f"SELECT {', '.join(MARKET_COLUMNS)} FROM {MARKETS_TABLE} WHERE {where} ORDER BY symbol",
+        tuple(filters.values())
+    )
+    return [dict(zip(MARKET_COLUMNS, row)) for row in c.fetchall()]
+
+
+def select_market_symbols(conn, **filters) -> List[str]:
+    """
+    Returns the symbols of stored markets matching every `column=value` filter.
+
+    Example:
+        select_market_symbols(conn, exchange='H', is_perpetual=True, margined='STABLE')
+    """
+    unknown = set(filters) - set(MARKET_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown market filter column(s): {sorted(unknown)}")
+
+    where = ' AND '.join(f"{col} = ?" for col in filters) or '1'
+    c = conn.cursor()
+    c.execute(f"SELECT symbol FROM {MARKETS_TABLE} WHERE {where} ORDER BY symbol", tuple(filters.values()))
+    return [row[0] for row in c.fetchall()]
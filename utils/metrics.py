@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Prometheus label carrying the job name; `job` itself is the scrape target's
+# label and would be renamed to `exported_job` or overwritten on scrape.
+JOB_LABEL = 'refresh_job'
+
+
+def _key(name: str, labels: Dict) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra: Dict = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def as_dict(self) -> Dict:
+        cumulative, buckets = 0, {}
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        buckets['+Inf'] = self.count
+        return {'count': self.count, 'sum': round(self.sum, 6), 'buckets': buckets}
+
+
+class RunMetrics:
+    """
+    Thread-safe counters, gauges and histograms for one run of a job.
+
+    Hot paths record into the module-level `run_metrics` instance; the job
+    calls `reset(job)` when it starts and `write_summary()` when it ends to
+    append a JSON line and rewrite a Prometheus textfile-collector file,
+    where the job name is the `refresh_job` label (see `JOB_LABEL`).
+    Metric names follow Prometheus conventions (`_total` for counters,
+    `_seconds` / `_bytes` units).
+    """
+
+    def __init__(self, job: str = None) -> None:
+        self._lock = threading.Lock()
+        self.reset(job)
+
+    def reset(self, job: str = None) -> None:
+        with self._lock:
+            self.job = job
+            self.started_at = time.time()
+            self._counters: Dict[_Key, float] = {}
+            self._gauges: Dict[_Key, float] = {}
+            self._histograms: Dict[_Key, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """
+        Observes the duration of the `with` block into histogram `name`.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        """
+        Returns every metric as plain JSON-serializable data.
+        """
+        def series(items, value_fn):
+            return [{'name': name, 'labels': dict(labels), 'value': value_fn(v)} for (name, labels), v in items]
+
+        with self._lock:
+            return {
+                'job': self.job,
+                'started_at': self.started_at,
+                'finished_at': time.time(),
+                'counters': series(sorted(self._counters.items()), lambda v: v),
+                'gauges': series(sorted(self._gauges.items()), lambda v: v),
+                'histograms': series(sorted(self._histograms.items()), lambda h: h.as_dict()),
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        job_label = {JOB_LABEL: self.job} if self.job else {}
+        lines, typed = [], set()
+
+        def type_line(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                type_line(name, 'counter')
+                lines.append(f'{name}{_format_labels(labels, job_label)} {value}')
+            for (name, labels), value in sorted(self._gauges.items()):
+                type_line(name, 'gauge')
+                lines.append(f'{name}{_format_labels(labels, job_label)} {value}')
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                type_line(name, 'histogram')
+                for bound, n in histogram.as_dict()['buckets'].items():
+                    lines.append(f'{name}_bucket{_format_labels(labels, {**job_label, "le": bound})} {n}')
+                lines.append(f'{name}_sum{_format_labels(labels, job_label)} {histogram.sum}')
+                lines.append(f'{name}_count{_format_labels(labels, job_label)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_summary(self, jsonl_path: str, prom_path: str = None) -> None:
+        """
+        Appends the run snapshot to `jsonl_path` and atomically rewrites `prom_path`.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+        with open(jsonl_path, 'a') as f:
+            f.write(json.dumps(self.snapshot()) + '\n')
+
+        if prom_path:
+            # node_exporter's textfile collector may read at any time, so write-then-rename.
+            tmp_path = f'{prom_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, prom_path)
+
+
+# Shared instance recorded into by the adapter, transport, writer and jobs.
+run_metrics = RunMetrics()
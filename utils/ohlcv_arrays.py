@@ -0,0 +1,100 @@
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+try:  # optional: orjson decodes the API payloads several times faster
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - depends on the environment
+    _loads = json.loads
+
+# One record per bar. Volumes and trade counts are floats so that fields an
+# exchange does not report can be stored as NaN (bound as NULL by sqlite3).
+OHLCV_DTYPE = np.dtype([
+    ('symbol_idx', np.int32),
+    ('t', np.int64),
+    ('o', np.float64),
+    ('h', np.float64),
+    ('l', np.float64),
+    ('c', np.float64),
+    ('v', np.float64),
+    ('bv', np.float64),
+    ('tx', np.float64),
+    ('btx', np.float64),
+])
+
+_BAR_FIELDS = OHLCV_DTYPE.names[1:]
+
+
+@dataclass
+class OhlcvArrays:
+    """
+    Columnar OHLCV data for many symbols in one contiguous structured array.
+
+    `bars` is sorted by (symbol_idx, t) and `symbols[symbol_idx]` gives each
+    bar's symbol, so per-symbol slices are contiguous views.
+    """
+    symbols: List[str]
+    bars: np.ndarray
+
+    def for_symbol(self, symbol: str) -> np.ndarray:
+        """
+        Returns a view of the bars of `symbol` (empty if it has none or is unknown).
+        """
+        try:
+            idx = self.symbols.index(symbol)
+        except ValueError:
+            return self.bars[:0]
+        lo, hi = np.searchsorted(self.bars['symbol_idx'], [idx, idx + 1])
+        return self.bars[lo:hi]
+
+    def rows(self) -> Iterator[Tuple]:
+        """
+        Yields rows ordered as `utils.db_util.OHLCV_COLUMNS`, ready for `executemany`.
+        """
+        symbols = self.symbols
+        for rec in self.bars.tolist():
+            yield (symbols[rec[0]],) + rec[1:]
+
+
+def history_to_array(symbol_idx: int, history: List[Dict]) -> np.ndarray:
+    """
+    Converts one symbol's `history` list into a structured array, one column at a time.
+    """
+    arr = np.empty(len(history), dtype=OHLCV_DTYPE)
+    arr['symbol_idx'] = symbol_idx
+    nan = float('nan')
+    for name in _BAR_FIELDS:
+        arr[name] = [bar.get(name, nan) for bar in history]
+    return arr
+
+
+def decode_ohlcv_batches(payloads: Iterator[Union[bytes, str]], symbols: List[str]) -> OhlcvArrays:
+    """
+    Decodes raw `ohlcv-history` response bodies into one `OhlcvArrays`.
+
+    Each payload is parsed and converted batch by batch, so only one batch of
+    decoded JSON objects is alive at any time.
+
+    :param payloads: Raw response bodies.
+    :param symbols: The requested symbols; their order defines `symbol_idx`.
+                    Symbols returned by the API but not requested are appended.
+    """
+    symbols = list(symbols)
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    chunks = []
+    for payload in payloads:
+        for data in _loads(payload):
+            symbol = data['symbol']
+            if symbol not in index:
+                index[symbol] = len(symbols)
+                symbols.append(symbol)
+            if data['history']:
+                chunks.append(history_to_array(index[symbol], data['history']))
+
+    bars = np.concatenate(chunks) if chunks else np.empty(0, dtype=OHLCV_DTYPE)
+    bars.sort(order=['symbol_idx', 't'], kind='stable')
+    return OhlcvArrays(symbols=symbols, bars=bars)
@@ -0,0 +1,66 @@
+import threading
+import time
+
+_TOKEN_EPSILON = 1e-9
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to stay under an API's per-minute quota.
+
+    `rate_per_minute` is a hard cap: no 60-second window ever sees more
+    acquisitions. The bucket starts with `burst` tokens and refills
+    continuously at `(rate_per_minute - burst) / 60` per second up to
+    `burst`, so a full bucket plus a minute of refill is exactly the quota.
+    `acquire` blocks until a token is available. `pause` empties the bucket
+    and blocks every caller for the given number of seconds, which is how a
+    429 `Retry-After` from the server is propagated to all workers.
+    """
+
+    def __init__(self, rate_per_minute: float = 40, burst: int = 5) -> None:
+        if burst < 1 or rate_per_minute <= burst:
+            raise ValueError('burst must be >= 1 and rate_per_minute must be > burst')
+        self.rate_per_minute = rate_per_minute
+        self.rate = (rate_per_minute - burst) / 60.0
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self._last:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Blocks until `tokens` are available and takes them.
+
+        :return: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._refill(now)
+                    # tolerate float rounding, or a refill short by 1e-13 would spin on sub-ulp sleeps
+                    if self._tokens >= tokens - _TOKEN_EPSILON:
+                        self._tokens = max(0.0, self._tokens - tokens)
+                        return waited
+                    delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """
+        Drains the bucket and blocks all callers for `seconds`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._last = max(self._last, self._paused_until)
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .logging import logger
+
+
+def get_default_cache_dir() -> str:
+    """
+    Returns the directory used for on-disk reference data, `db/cache` under the repository root.
+    """
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+    return os.path.join(repo_root, "db", "cache")
+
+
+class ReferenceCache:
+    """
+    Two-level TTL cache for slow-changing reference endpoints
+    (`exchanges`, `future-markets`, `spot-markets`).
+
+    Lookups hit an in-process memo first, then a JSON file under `cache_dir`
+    whose mtime is younger than `ttl` seconds, and only then call `fetch`.
+    Fresh results are written back to both levels. Pass `cache_dir=None`
+    to keep the cache in memory only.
+
+    The memo belongs to the instance, and callers that talk to different
+    hosts must pass distinct keys (see `CoinalyzeRestAdapter._get_reference`),
+    since the disk level is shared by everything using the same `cache_dir`.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = get_default_cache_dir(), ttl: float = 6 * 60 * 60) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        # key -> (fetched_at, value)
+        self._memo: Dict[str, Tuple[float, Any]] = {}
+        self._memo_lock = threading.Lock()
+
+    def _fresh(self, entry: Optional[Tuple[float, Any]], now: float) -> bool:
+        return entry is not None and now - entry[0] <= self.ttl
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Any]]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            fetched_at = os.path.getmtime(path)
+            with open(path, 'r') as f:
+                return fetched_at, json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, value: Any) -> None:
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write reference cache file {path}: {e}")
+
+    def get(self, key: str, fetch: Callable[[], Any], refresh: bool = False) -> Any:
+        """
+        Returns the cached value for `key`, calling `fetch()` if it is missing or expired.
+
+        :param refresh: Bypass both cache levels and fetch a fresh value.
+        """
+        now = time.time()
+        if not refresh:
+            with self._memo_lock:
+                entry = self._memo.get(key)
+            if self._fresh(entry, now):
+                return entry[1]
+
+            # a file older than `ttl` is neither returned nor memoised
+            entry = self._read_disk(key)
+            if self._fresh(entry, now):
+                with self._memo_lock:
+                    self._memo[key] = entry
+                return entry[1]
+
+        value = fetch()
+        with self._memo_lock:
+            self._memo[key] = (now, value)
+        self._write_disk(key, value)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        with self._memo_lock:
+            self._memo.pop(key, None)
+        if self.cache_dir:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
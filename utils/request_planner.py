@@ -0,0 +1,159 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# (symbol, from_t, to_t): bars of `symbol` with from_t <= t <= to_t are needed.
+Need = Tuple[str, int, int]
+
+# Windows of at most this many bars are always packed together, whatever the
+# over-fetch: re-reading a handful of bars costs far less than another request.
+MIN_WINDOW_BARS = 12
+
+
+@dataclass
+class PlannedRequest:
+    """
+    One history request: every symbol of `windows` fetched over the shared
+    `from`/`to` of `params`. `windows` are the per-symbol needs it covers.
+    """
+    endpoint: str
+    params: Dict
+    windows: List[Need]
+    points: int          # bars returned at most: symbols x window length
+    needed_points: int   # bars actually asked for by `windows`
+
+    @property
+    def symbols(self) -> List[str]:
+        return [symbol for symbol, _, _ in self.windows]
+
+
+@dataclass
+class RequestPlan:
+    """
+    The requests of one or more history fetches, with their quota cost.
+
+    `estimated_seconds` assumes the adapter's token bucket: the first `burst`
+    requests go out at once, the rest at `rate_limit_per_minute - burst` per
+    minute, so no minute exceeds `rate_limit_per_minute`.
+    """
+    requests: List[PlannedRequest] = field(default_factory=list)
+    rate_limit_per_minute: float = 40
+    burst: int = 5
+
+    @property
+    def n_requests(self) -> int:
+        return len(self.requests)
+
+    @property
+    def points(self) -> int:
+        return sum(request.points for request in self.requests)
+
+    @property
+    def needed_points(self) -> int:
+        return sum(request.needed_points for request in self.requests)
+
+    def estimated_seconds(self) -> float:
+        return max(0, self.n_requests - self.burst) * 60.0 / (self.rate_limit_per_minute - self.burst)
+
+    def extend(self, other: 'RequestPlan') -> 'RequestPlan':
+        self.requests.extend(other.requests)
+        return self
+
+    def summary(self) -> Dict:
+        """
+        Requests per endpoint, total requests, bars needed vs. fetched and the estimated wall time.
+        """
+        per_endpoint: Dict[str, int] = {}
+        for request in self.requests:
+            per_endpoint[request.endpoint] = per_endpoint.get(request.endpoint, 0) + 1
+        return {
+            'requests': self.n_requests,
+            'requests_per_endpoint': per_endpoint,
+            'needed_points': self.needed_points,
+            'fetched_points': self.points,
+            'estimated_seconds': round(self.estimated_seconds(), 1),
+            'quota_minutes': round(self.n_requests / self.rate_limit_per_minute, 2),
+        }
+
+
+def split_need(need: Need, step: int, max_bars: int) -> List[Need]:
+    """
+    Splits a need into consecutive windows of at most `max_bars` bars.
+    """
+    symbol, from_t, to_t = need
+    windows = []
+    span = (max_bars - 1) * step
+    while from_t <= to_t:
+        window_to = min(to_t, from_t + span)
+        windows.append((symbol, from_t, window_to))
+        from_t = window_to + step
+    return windows
+
+
+def pack_requests(endpoint: str, needs: Sequence[Need], step: int, params: Dict, max_symbols: int,
+                  max_bars: int, max_points: Optional[int] = None) -> List[PlannedRequest]:
+    """
+    Packs per-symbol windows into as few requests as the API limits allow.
+
+    Needs longer than `max_bars` are split first. Windows are then taken in
+    order of `from` and added to the open request while it has fewer than
+    `max_symbols` symbols, the merged window stays within `max_bars` bars,
+    symbols x bars stays within `max_points`, and the merged request fetches
+    at most twice the bars its windows need (windows of up to
+    `MIN_WINDOW_BARS` bars are always merged). A symbol appears at most once
+    per request.
+
+    :param step: The bar length in seconds; `from`/`to` are aligned to it.
+    :param params: Endpoint params shared by every request (interval, ...).
+    :param max_points: Optional cap on symbols x bars in one response.
+    """
+    windows = []
+    for symbol, from_t, to_t in needs:
+        from_t, to_t = from_t // step * step, to_t // step * step
+        windows.extend(split_need((symbol, from_t, to_t), step, max_bars))
+    windows.sort(key=lambda window: (window[1], window[2], window[0]))
+
+    requests: List[PlannedRequest] = []
+    open_requests: List[List] = []   # [from_t, to_t, windows, needed bars, symbols]
+
+    def bars(from_t: int, to_t: int) -> int:
+        return (to_t - from_t) // step + 1
+
+    def close(state) -> None:
+        from_t, to_t, request_windows, needed, _ = state
+        requests.append(PlannedRequest(
+            endpoint=endpoint,
+            params={'symbols': ','.join(symbol for symbol, _, _ in request_windows), **params,
+                    'from': from_t, 'to': to_t},
+            windows=request_windows,
+            points=len(request_windows) * bars(from_t, to_t),
+            needed_points=needed,
+        ))
+
+    for window in windows:
+        symbol, from_t, to_t = window
+        need = bars(from_t, to_t)
+        placed = False
+        for state in open_requests:
+            merged_from, merged_to = min(state[0], from_t), max(state[1], to_t)
+            span = bars(merged_from, merged_to)
+            n = len(state[2]) + 1
+            if (symbol in state[4] or n > max_symbols or span > max_bars
+                    or (max_points is not None and n * span > max_points)
+                    or (span > MIN_WINDOW_BARS and n * span > 2 * (state[3] + need))):
+                continue
+            state[0], state[1] = merged_from, merged_to
+            state[2].append(window)
+            state[3] += need
+            state[4].add(symbol)
+            placed = True
+            if n == max_symbols:
+                close(state)
+                open_requests.remove(state)
+            break
+        if not placed:
+            open_requests.append([from_t, to_t, [window], need, {symbol}])
+
+    for state in open_requests:
+        close(state)
+    return requests
+
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .logging import logger
+
+# Set to a directory (or '1' for `db/responses`) to keep the raw body of every
+# history response the adapter receives, so a failed run can be replayed.
+RESPONSE_STORE_ENV_VAR = 'COINALYZE_RESPONSE_STORE'
+RESPONSE_STORE_MAX_MB_ENV_VAR = 'COINALYZE_RESPONSE_STORE_MAX_MB'
+
+INDEX_FILE = 'index.db'
+INDEX_TABLE = 'responses'
+
+# Eviction trims the store to this fraction of `max_bytes`, so it does not run on every put.
+EVICT_TO_FRACTION = 0.9
+
+
+def get_default_response_dir() -> str:
+    """
+    Returns the default store directory, `db/responses` under the repository root.
+    """
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+    return os.path.join(repo_root, "db", "responses")
+
+
+def default_response_store() -> Optional['ResponseStore']:
+    """
+    Returns the store configured by `COINALYZE_RESPONSE_STORE`, or None when it is not set.
+    """
+    value = os.getenv(RESPONSE_STORE_ENV_VAR)
+    if not value or value == '0':
+        return None
+    max_mb = float(os.getenv(RESPONSE_STORE_MAX_MB_ENV_VAR, 2048))
+    return ResponseStore(get_default_response_dir() if value == '1' else value, max_bytes=int(max_mb * 1024 * 1024))
+
+
+def _codec():
+    """
+    Returns (name, compress): zstd when `zstandard` is installed, else zlib.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        return 'zlib', lambda data: zlib.compress(data, 6)
+    return 'zstd', zstandard.ZstdCompressor(level=3).compress
+
+
+def _decompressor(codec: str):
+    if codec == 'zlib':
+        return zlib.decompress
+    import zstandard
+    return lambda data: zstandard.ZstdDecompressor().decompress(data)
+
+
+def response_key(endpoint: str, params: Dict) -> str:
+    """
+    Content address of a request: the SHA-256 of its endpoint and canonical params.
+    """
+    canonical = json.dumps({'endpoint': endpoint, 'params': params}, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseStore:
+    """
+    Content-addressed, compressed store of raw API responses.
+
+    Every body is compressed (zstd if available, else zlib) into
+    `<root>/<key[:2]>/<key>.<codec>`, keyed by `response_key(endpoint,
+    params)`, and indexed in `<root>/index.db` with its endpoint, interval,
+    symbols and window. Storing the same request again replaces it, so puts
+    are idempotent. Once the store grows past `max_bytes`, the oldest
+    responses are evicted first.
+
+    Usage:
+        store = ResponseStore('db/responses')
+        store.put('ohlcv-history', params, response.content)
+        for endpoint, params, results in store.iter_batches(['ohlcv-history'], interval='4hour'):
+            ...
+    """
+
+    def __init__(self, root_dir: str = None, max_bytes: int = 2 * 1024 ** 3) -> None:
+        self.root_dir = os.path.abspath(root_dir or get_default_response_dir())
+        self.max_bytes = max_bytes
+        self.codec, self._compress = _codec()
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # puts come from the adapter's worker threads; every use holds `_lock`
+        self._conn = sqlite3.connect(os.path.join(self.root_dir, INDEX_FILE), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {INDEX_TABLE} (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                interval TEXT,
+                symbols TEXT,
+                from_t INTEGER,
+                to_t INTEGER,
+                params TEXT,
+                codec TEXT,
+                size INTEGER,
+                stored_at REAL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{INDEX_TABLE}_stored ON {INDEX_TABLE} (stored_at)")
+        self._conn.commit()
+        self._total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {INDEX_TABLE}").fetchone()[0]
+
+    def _path(self, key: str, codec: str) -> str:
+        return os.path.join(self.root_dir, key[:2], f"{key}.{codec}")
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def put(self, endpoint: str, params: Dict, body: bytes) -> str:
+        """
+        Stores a raw response body and returns its key.
+        """
+        key = response_key(endpoint, params)
+        data = self._compress(body)
+        path = self._path(key, self.codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            previous = self._conn.execute(f"SELECT size, codec FROM {INDEX_TABLE} WHERE key = ?", (key,)).fetchone()
+            if previous is not None:
+                self._total -= previous[0]
+                if previous[1] != self.codec:
+                    self._remove_file(key, previous[1])
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {INDEX_TABLE} "
+                f"(key, endpoint, interval, symbols, from_t, to_t, params, codec, size, stored_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, params.get('interval'), params.get('symbols'), params.get('from'), params.get('to'),
+                 json.dumps(params, sort_keys=True, default=str), self.codec, len(data), time.time())
+            )
+            self._conn.commit()
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_TO_FRACTION))
+        return key
+
+    def get(self, endpoint: str, params: Dict) -> Optional[bytes]:
+        """
+        Returns the stored body of a request, or None.
+        """
+        key = response_key(endpoint, params)
+        with self._lock:
+            row = self._conn.execute(f"SELECT codec FROM {INDEX_TABLE} WHERE key = ?", (key,)).fetchone()
+        return self._read(key, row[0]) if row else None
+
+    def _read(self, key: str, codec: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key, codec), 'rb') as f:
+                return _decompressor(codec)(f.read())
+        except OSError:
+            return None
+
+    def _remove_file(self, key: str, codec: str) -> None:
+        try:
+            os.remove(self._path(key, codec))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, target_bytes: int) -> None:
+        # Oldest responses go first; the newest are the ones a replay needs
+        rows = self._conn.execute(f"SELECT key, codec, size FROM {INDEX_TABLE} ORDER BY stored_at").fetchall()
+        evicted = []
+        for key, codec, size in rows:
+            if self._total <= target_bytes:
+                break
+            self._remove_file(key, codec)
+            self._total -= size
+            evicted.append((key,))
+        self._conn.executemany(f"DELETE FROM {INDEX_TABLE} WHERE key = ?", evicted)
+        self._conn.commit()
+        logger.info(f"Evicted {len(evicted)} stored response(s); the store now holds {self._total / 1024 ** 2:.1f} MiB")
+
+    def iter_batches(
+        self,
+        endpoints: Iterable[str],
+        interval: str = None,
+        symbols: Iterable[str] = None,
+        since: float = None,
+        until: float = None
+    ) -> Iterator[Tuple[str, Dict, List[Dict]]]:
+        """
+        Yields stored history responses, oldest first, as `(endpoint, params, results)`.
+
+        :param endpoints: Endpoints to replay, e.g. ['ohlcv-history'].
+        :param interval: Only responses of this interval.
+        :param symbols: Only these symbols are kept in each response's results.
+        :param since: Only responses stored at or after this unix time.
+        :param until: Only responses stored before this unix time.
+        """
+        endpoints = list(endpoints)
+        wanted = set(symbols) if symbols is not None else None
+        sql = (
+            f"SELECT key, endpoint, params, codec, symbols FROM {INDEX_TABLE} "
+            f"WHERE endpoint IN ({', '.join('?' * len(endpoints))})"
+        )
+        args: List = list(endpoints)
+        for clause, value in (("interval = ?", interval), ("stored_at >= ?", since), ("stored_at < ?", until)):
+            if value is not None:
+                sql += f" AND {clause}"
+                args.append(value)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY stored_at", args).fetchall()
+
+        for key, endpoint, params, codec, request_symbols in rows:
+            if wanted is not None and request_symbols and wanted.isdisjoint(request_symbols.split(',')):
+                continue
+            body = self._read(key, codec)
+            if body is None:
+                logger.warning(f"Stored response {key} is missing its body; skipped")
+                continue
+            results = json.loads(body)
+            if wanted is not None:
+                results = [data for data in results if data.get('symbol') in wanted]
+            yield endpoint, json.loads(params), results
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
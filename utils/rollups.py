@@ -0,0 +1,126 @@
+from typing import Dict, Iterable, Tuple
+
+from utils.logging import logger
+
+# Rollup interval -> (bucket size in seconds, bucket offset in seconds).
+# Buckets are aligned to UTC; weekly buckets start on Monday 00:00 UTC
+# (the Unix epoch was a Thursday, hence the 4-day offset).
+ROLLUP_INTERVALS = {
+    '8h': (8 * 60 * 60, 0),
+    '12h': (12 * 60 * 60, 0),
+    '1d': (24 * 60 * 60, 0),
+    '1w': (7 * 24 * 60 * 60, 4 * 24 * 60 * 60),
+}
+
+
+def rollup_table_name(table_name: str, interval: str) -> str:
+    """
+    Returns the name of the rollup table, e.g. `binance_perp_ohlcv_1d`.
+    """
+    return f"{table_name}_{interval}"
+
+
+def bucket_start(t: int, interval: str) -> int:
+    """
+    Returns the start of the rollup bucket containing timestamp `t`.
+    """
+    size, offset = ROLLUP_INTERVALS[interval]
+    return (t - offset) // size * size + offset
+
+
+def create_rollup_table(c, table_name: str, interval: str) -> None:
+    """
+    Creates a rollup table. `t` is the bucket start and `n_bars` is the
+    number of source bars aggregated into the bucket, so partial buckets
+    (including the still-forming one) can be told apart.
+    """
+    c.execute(f"""
+        CREATE TABLE IF NOT EXISTS {rollup_table_name(table_name, interval)} (
+            symbol TEXT,
+            t INTEGER,
+            o REAL,
+            h REAL,
+            l REAL,
+            c REAL,
+            v REAL,
+            bv REAL,
+            tx INTEGER,
+            btx INTEGER,
+            n_bars INTEGER,
+            PRIMARY KEY (symbol, t)
+        ) WITHOUT ROWID
+    """)
+
+
+def update_rollups(conn, table_name: str, touched: Dict[str, Tuple[int, int]],
+                   intervals: Iterable[str] = tuple(ROLLUP_INTERVALS)) -> int:
+    """
+    Recomputes only the rollup buckets that contain newly inserted or updated source rows.
+
+    Each touched `(min_t, max_t)` range is widened to whole buckets and
+    aggregated from the source table (first open, max high, min low, last
+    close, summed volumes/trade counts) with a single statement per interval.
+    The CROSS JOIN pins the touched ranges as the outer loop, so the source
+    table is only read through (symbol, t) primary-key range searches.
+
+    :param conn: An open connection.
+    :param table_name: The source candle table, e.g. `binance_perp_ohlcv`.
+    :param touched: symbol -> (min_t, max_t) of source rows written, as in `RefreshResult.touched`.
+    :param intervals: The rollup intervals to maintain.
+    :return: The number of bucket rows written across all intervals.
+    """
+    if not touched:
+        return 0
+
+    intervals = tuple(intervals)
+    c = conn.cursor()
+    total = 0
+    with conn:
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_touched (symbol TEXT PRIMARY KEY, from_t INTEGER, to_t INTEGER)")
+        for interval in intervals:
+            size, offset = ROLLUP_INTERVALS[interval]
+            dst = rollup_table_name(table_name, interval)
+            create_rollup_table(c, table_name, interval)
+
+            c.execute("DELETE FROM temp.rollup_touched")
+            c.executemany(
+                "INSERT INTO temp.rollup_touched (symbol, from_t, to_t) VALUES (?, ?, ?)",
+                [
+                    (symbol, bucket_start(min_t, interval), bucket_start(max_t, interval) + size)
+                    for symbol, (min_t, max_t) in touched.items()
+                ]
+            )
+            c.execute(f"""
+                INSERT OR REPLACE INTO {dst} (symbol, t, o, h, l, c, v, bv, tx, btx, n_bars)
+                SELECT g.symbol, g.bucket,
+                       (SELECT o FROM {table_name} WHERE symbol = g.symbol AND t = g.first_t),
+                       g.h, g.l,
+                       (SELECT c FROM {table_name} WHERE symbol = g.symbol AND t = g.last_t),
+                       g.v, g.bv, g.tx, g.btx, g.n_bars
+                FROM (
+                    SELECT s.symbol AS symbol,
+                           (s.t - :offset) / :size * :size + :offset AS bucket,
+                           MIN(s.t) AS first_t, MAX(s.t) AS last_t,
+                           MAX(s.h) AS h, MIN(s.l) AS l,
+                           SUM(s.v) AS v, SUM(s.bv) AS bv, SUM(s.tx) AS tx, SUM(s.btx) AS btx,
+                           COUNT(*) AS n_bars
+                    FROM temp.rollup_touched r
+                    CROSS JOIN {table_name} s ON s.symbol = r.symbol AND s.t >= r.from_t AND s.t < r.to_t
+                    GROUP BY s.symbol, bucket
+                ) g
+            """, {'size': size, 'offset': offset})
+            total += c.rowcount
+        c.execute("DROP TABLE temp.rollup_touched")
+
+    logger.info(f"Updated {total} rollup bucket(s) for '{table_name}' ({', '.join(intervals)}).")
+    return total
+
+
+def rebuild_rollups(conn, table_name: str, intervals: Iterable[str] = tuple(ROLLUP_INTERVALS)) -> int:
+    """
+    Rebuilds every rollup bucket from the full history of `table_name`.
+    """
+    c = conn.cursor()
+    c.execute(f"SELECT symbol, MIN(t), MAX(t) FROM {table_name} GROUP BY symbol")
+    touched = {symbol: (min_t, max_t) for symbol, min_t, max_t in c.fetchall()}
+    return update_rollups(conn, table_name, touched, intervals)
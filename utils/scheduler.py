@@ -0,0 +1,123 @@
+import fcntl
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from utils.logging import logger
+
+
+def next_boundary(now: float, step: int, offset: int = 0) -> int:
+    """
+    Returns the first interval boundary strictly after `now`.
+
+    Boundaries are `offset + k * step` seconds since the epoch, which is how
+    Coinalyze aligns its bars (4h bars open at 00:00, 04:00, ... UTC).
+    """
+    return int((now - offset) // step + 1) * step + offset
+
+
+class RunLock:
+    """
+    Non-blocking, process-wide exclusive lock backed by `flock` on a file.
+
+    The daemon and the crontab job take the same lock, so two refreshes never
+    write to the database at the same time. The lock is released by the OS if
+    the holder dies.
+
+    Usage:
+        with RunLock(path) as acquired:
+            if acquired:
+                ...
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+class CandleCloseScheduler:
+    """
+    Sleeps until an interval boundary, then polls cheaply until the bar that
+    just closed is final upstream.
+
+    `probe(boundary)` returns the latest bar open time the API currently
+    serves; once a bar at or after `boundary` is visible, the bar that opened
+    at `boundary - step` is closed. If the API never shows it within
+    `max_wait` seconds, the refresh proceeds anyway so a missing new bar on
+    the probe symbol cannot stall the whole universe.
+
+    All waits use `stop_event`, so a shutdown request interrupts them at once.
+    """
+
+    def __init__(self, step: int, probe: Callable[[int], Optional[int]], stop_event: threading.Event,
+                 offset: int = 0, settle_seconds: float = 2, poll_seconds: float = 10,
+                 max_wait: float = 15 * 60) -> None:
+        self.step = step
+        self.probe = probe
+        self.stop_event = stop_event
+        self.offset = offset
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.max_wait = max_wait
+
+    def wait_for_boundary(self) -> Optional[int]:
+        """
+        Blocks until the next boundary (plus a small settle delay).
+
+        :return: The boundary, or None if shutdown was requested.
+        """
+        boundary = next_boundary(time.time(), self.step, self.offset)
+        logger.info(f"Next candle close at {time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(boundary))}")
+        if self.stop_event.wait(max(0.0, boundary + self.settle_seconds - time.time())):
+            return None
+        return boundary
+
+    def wait_until_visible(self, boundary: int) -> bool:
+        """
+        Polls `probe` until a bar at or after `boundary` is served or `max_wait` expires.
+
+        :return: False if shutdown was requested, True otherwise.
+        """
+        deadline = time.monotonic() + self.max_wait
+        polls = 0
+        while not self.stop_event.is_set():
+            polls += 1
+            try:
+                latest_t = self.probe(boundary)
+            except Exception as e:
+                logger.warning(f"Probe for the {boundary} bar failed: {e}")
+                latest_t = None
+            if latest_t is not None and latest_t >= boundary:
+                logger.info(f"Bar at {boundary} is visible after {polls} poll(s).")
+                return True
+            if time.monotonic() >= deadline:
+                logger.warning(f"Bar at {boundary} not visible after {self.max_wait:.0f}s; refreshing anyway.")
+                return True
+            self.stop_event.wait(self.poll_seconds)
+        return False
@@ -0,0 +1,312 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote
+
+from utils.changelog import RUNS_TABLE, CURSORS_TABLE, create_changelog_tables
+from utils.db_util import connect_db
+from utils.logging import logger
+
+# 'single' keeps every table in `get_db_path()`; 'sharded' routes each job's
+# tables to its own file under `<db dir>/shards/`.
+DB_LAYOUT_ENV_VAR = 'CANDLE_DB_LAYOUT'
+
+# <venue>_<interval>.db holds the live rows; <venue>_<interval>_<year>.db the
+# closed years split off by `ShardManager.split_closed_years`.
+_SHARD_FILE_RE = re.compile(r'^(?P<venue>.+?)_(?P<interval>[^_]+)(?:_(?P<year>\d{4}))?\.db$')
+
+# Table name -> function creating that table on a cursor through the schema
+# helpers of the refresh, e.g. `partial(create_metric_table, table_name=..., metric='ohlcv')`.
+TableSchemas = Dict[str, Callable]
+
+# Run registry and consumer cursors stay in the catalog DB; only the change
+# ranges are recorded next to the rows they describe.
+_CATALOG_ONLY_TABLES = {RUNS_TABLE, CURSORS_TABLE}
+
+
+def sharding_enabled() -> bool:
+    """
+    Whether the candle tables use the sharded layout (`CANDLE_DB_LAYOUT=sharded`).
+    """
+    return os.getenv(DB_LAYOUT_ENV_VAR, 'single').lower() == 'sharded'
+
+
+def default_shard_manager(catalog_path: str) -> Optional['ShardManager']:
+    """
+    Returns the shard manager next to `catalog_path` when sharding is enabled, else None.
+    """
+    if not sharding_enabled():
+        return None
+    return ShardManager(os.path.join(os.path.dirname(os.path.abspath(catalog_path)), 'shards'))
+
+
+def year_bounds(year: int) -> tuple:
+    """
+    Returns the [start, end) unix timestamps of a UTC calendar year.
+    """
+    return (int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp()),
+            int(datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp()))
+
+
+@dataclass(frozen=True)
+class Shard:
+    venue: str
+    interval: str
+    year: Optional[int]
+    path: str
+
+
+class ShardManager:
+    """
+    Maps each venue × interval to its own SQLite file, so refresh jobs of
+    different venues write to different databases and never wait on each
+    other's lock, and VACUUM/backups can be run one shard at a time.
+
+    The market list and the changelog run registry stay in the catalog DB
+    (`get_db_path()`); `ShardReader` attaches the shards to it for queries
+    spanning several of them.
+
+    Usage:
+        shards = ShardManager('db/shards')
+        path = shards.route(job)          # live shard of a refresh job
+        shards.split_closed_years('binance_perp', '4hour', {
+            'binance_perp_ohlcv': partial(create_metric_table, table_name='binance_perp_ohlcv', metric='ohlcv')
+        })
+    """
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir = os.path.abspath(root_dir)
+        self._prepared = set()
+        self._lock = threading.Lock()
+
+    def path(self, venue: str, interval: str, year: int = None) -> str:
+        """
+        Returns the file of a shard; `year` selects a closed-year shard instead of the live one.
+        """
+        suffix = f'_{year}' if year is not None else ''
+        return os.path.join(self.root_dir, f'{venue}_{interval}{suffix}.db')
+
+    def job_path(self, job: Dict) -> str:
+        """
+        Returns the live shard of a refresh job without creating it.
+
+        The venue is the job's optional `shard` key, else its `name`.
+        """
+        return self.path(job.get('shard', job['name']), job['interval'])
+
+    def route(self, job: Dict) -> str:
+        """
+        Returns the live shard a refresh job writes to, creating it on first use.
+        """
+        path = self.job_path(job)
+        with self._lock:
+            if path not in self._prepared:
+                self._prepare(path)
+                self._prepared.add(path)
+        return path
+
+    def _prepare(self, path: str) -> None:
+        os.makedirs(self.root_dir, exist_ok=True)
+        conn, c = connect_db(path)
+        if not conn:
+            raise sqlite3.OperationalError(f'could not open shard {path}')
+        try:
+            # Changes are committed together with their rows, so each shard records its own
+            create_changelog_tables(c)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def shards(self, venues: List[str] = None, intervals: List[str] = None, years: List[Optional[int]] = None) -> List[Shard]:
+        """
+        Lists the existing shards, optionally restricted to some venues, intervals or years.
+
+        :param years: Years to include; `None` in the list stands for the live shards.
+        """
+        found = []
+        for path in sorted(glob.glob(os.path.join(self.root_dir, '*.db'))):
+            match = _SHARD_FILE_RE.match(os.path.basename(path))
+            if not match:
+                continue
+            year = int(match['year']) if match['year'] else None
+            if venues is not None and match['venue'] not in venues:
+                continue
+            if intervals is not None and match['interval'] not in intervals:
+                continue
+            if years is not None and year not in years:
+                continue
+            found.append(Shard(match['venue'], match['interval'], year, path))
+        return found
+
+    def import_tables(self, source_path: str, venue: str, interval: str, tables: TableSchemas) -> Dict[str, int]:
+        """
+        Copies the rows of tables from an existing database into a live shard.
+
+        Used to move the tables of the single-file layout into their shards; the
+        source is left untouched. Shard tables are created by the schema
+        helpers in `tables`, whatever the legacy layout of the source. Rows
+        already in the shard are replaced.
+
+        :param tables: The schema helper of each table to copy (see `TableSchemas`).
+        :return: The number of rows copied per table.
+        """
+        path = self.path(venue, interval)
+        self._prepare(path)
+        return _copy_tables(path, source_path, tables)
+
+    def split_closed_years(self, venue: str, interval: str, tables: TableSchemas, keep_years: int = 2,
+                           now: float = None) -> Dict[int, int]:
+        """
+        Moves the rows of closed years out of a live shard into per-year shards.
+
+        The live shard keeps the current year and the `keep_years - 1` before
+        it; keep at least 2 so the refresh lookback never writes bars back into
+        a year that has already been split off. Closed-year shards are never
+        written by the refresh, so they can be backed up once and left alone.
+
+        :param tables: Schema helper of each candle/metric table to split (tables keyed by `symbol, t`).
+        :param keep_years: Calendar years (including the current one) kept in the live shard.
+        :return: The number of rows moved per year.
+        """
+        live_path = self.path(venue, interval)
+        if not os.path.exists(live_path):
+            return {}
+        first_kept = datetime.fromtimestamp(now if now is not None else time.time(), tz=timezone.utc).year - keep_years + 1
+        cutoff = year_bounds(first_kept)[0]
+
+        conn, c = connect_db(live_path)
+        if not conn:
+            return {}
+        try:
+            years = set()
+            for table in tables:
+                if _has_table(c, 'main', table):
+                    c.execute(f"SELECT MIN(t) FROM {table}")
+                    min_t = c.fetchone()[0]
+                    if min_t is not None and min_t < cutoff:
+                        first = datetime.fromtimestamp(min_t, tz=timezone.utc).year
+                        years.update(range(first, first_kept))
+        finally:
+            conn.close()
+
+        moved = {}
+        for year in sorted(years):
+            start_t, end_t = year_bounds(year)
+            copied = _copy_tables(self.path(venue, interval, year), live_path, tables, (start_t, end_t))
+            # Deleted only once the year shard has committed; a crash in between leaves duplicates
+            # that the next split overwrites, never a gap
+            conn, c = connect_db(live_path)
+            try:
+                with conn:
+                    for table in copied:
+                        c.execute(f"DELETE FROM {table} WHERE t >= ? AND t < ?", (start_t, end_t))
+            finally:
+                conn.close()
+            moved[year] = sum(copied.values())
+            logger.info(f"Moved {moved[year]} rows of {year} from {os.path.basename(live_path)} to its year shard")
+        return moved
+
+
+def _has_table(c, schema: str, table: str) -> bool:
+    c.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return c.fetchone() is not None
+
+
+def _copy_tables(dest_path: str, source_path: str, tables: TableSchemas, t_range: tuple = None) -> Dict[str, int]:
+    """
+    Copies the rows of `tables` from `source_path` into `dest_path`.
+
+    Each table is created in `dest_path` by its schema helper, then filled
+    with `INSERT ... SELECT` on the columns it has, so legacy source layouts
+    (rowid tables, other column orders) are converted on the way.
+
+    :param t_range: Optional [start, end) range of `t` to copy.
+    :return: The number of rows copied per table present in the source.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    conn, c = connect_db(dest_path)
+    if not conn:
+        return {}
+    copied = {}
+    try:
+        c.execute("ATTACH DATABASE ? AS src", (source_path,))
+        with conn:
+            for table, create_table in tables.items():
+                if not _has_table(c, 'src', table):
+                    continue
+                create_table(c)
+                columns = ', '.join(f'"{row[1]}"' for row in c.execute(f"PRAGMA main.table_info({table})").fetchall())
+                where, params = ("WHERE t >= ? AND t < ?", t_range) if t_range else ("", ())
+                c.execute(
+                    f"INSERT OR REPLACE INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} {where}", params
+                )
+                copied[table] = c.rowcount
+        c.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+    return copied
+
+
+class ShardReader:
+    """
+    Read connection on the catalog DB with shards attached read-only and one
+    TEMP view per table unioning its copies across shards (and the catalog,
+    if it still has one). Queries, `iter_changed_rows` and `ChangeFeed` then
+    work unchanged on the unified tables; filters on `symbol`/`t` are pushed
+    down into each shard's primary key.
+
+    SQLite attaches at most 10 databases per connection by default, so select
+    the relevant shards rather than all of them.
+
+    Usage:
+        with ShardReader(get_db_path(), shards.shards(venues=['binance_perp'])) as reader:
+            reader.conn.execute("SELECT * FROM binance_perp_ohlcv WHERE symbol = ?", ('BTCUSDT_PERP.A',))
+    """
+
+    def __init__(self, catalog_path: str, shards: List[Shard]) -> None:
+        self.conn = sqlite3.connect(f'file:{quote(os.path.abspath(catalog_path))}', uri=True, timeout=10)
+        limit = self.conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(shards) > limit:
+            self.conn.close()
+            raise ValueError(f'{len(shards)} shards requested but SQLite attaches at most {limit}; narrow the selection')
+
+        self.shards = list(shards)
+        schemas = []
+        for i, shard in enumerate(self.shards):
+            schema = f'shard_{i}'
+            self.conn.execute("ATTACH DATABASE ? AS " + schema, (f'file:{quote(shard.path)}?mode=ro',))
+            schemas.append(schema)
+        self._create_views(schemas)
+
+    def _create_views(self, schemas: List[str]) -> None:
+        sources: Dict[str, List[str]] = {}
+        for schema in schemas:
+            for (table,) in self.conn.execute(
+                f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ):
+                if table not in _CATALOG_ONLY_TABLES:
+                    sources.setdefault(table, []).append(schema)
+
+        c = self.conn.cursor()
+        for table, table_schemas in sources.items():
+            if _has_table(c, 'main', table):
+                table_schemas = ['main'] + table_schemas
+            union = ' UNION ALL '.join(f'SELECT * FROM {schema}.{table}' for schema in table_schemas)
+            # TEMP objects shadow main's for unqualified names
+            c.execute(f"CREATE TEMP VIEW {table} AS {union}")
+        self.views = sorted(sources)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'ShardReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,128 @@
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Iterable, Optional, Sequence
+
+from .logging import logger
+from .metrics import run_metrics
+
+_STOP = object()
+
+
+class SQLiteWriter:
+    """
+    Background thread that owns a single SQLite connection and applies
+    `executemany` jobs in bounded-size transactions.
+
+    Producers call `submit(sql, rows)` from any thread; the bounded queue
+    applies backpressure so memory stays flat while network fetches and
+    database writes overlap. A transaction is committed whenever at least
+    `rows_per_txn` rows are pending, and on `close()`. Each job is applied
+    within one transaction, so the rows of one job are committed atomically.
+
+    Usage:
+        with SQLiteWriter(db_path) as writer:
+            writer.submit(insert_sql, rows)
+    """
+
+    def __init__(self, db_path: str, rows_per_txn: int = 50_000, max_queue: int = 8) -> None:
+        self.db_path = db_path
+        self.rows_per_txn = rows_per_txn
+        self.rows_written = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> 'SQLiteWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(commit=exc_type is None)
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f'SQLite writer for {self.db_path} failed: {self._error}') from self._error
+
+    def submit(self, sql: str, rows: Iterable[Sequence]) -> None:
+        """
+        Queues `rows` to be written with `executemany(sql, rows)`.
+
+        :raises RuntimeError: If the writer thread has already failed.
+        """
+        self._raise_if_failed()
+        rows = list(rows)
+        if rows:
+            self._queue.put((sql, rows))
+
+    def close(self, commit: bool = True) -> None:
+        """
+        Flushes the queue, commits (or rolls back) the open transaction and
+        stops the writer thread.
+
+        :raises RuntimeError: If any job failed.
+        """
+        self._queue.put((_STOP, commit))
+        self._thread.join()
+        self._raise_if_failed()
+
+    def _run(self) -> None:
+        # Imported lazily to avoid a circular import with utils.db_util.
+        from .db_util import connect_db
+
+        conn, c = connect_db(self.db_path)
+        if conn is None:
+            self._error = sqlite3.OperationalError(f'could not connect to {self.db_path}')
+            self._drain()
+            return
+
+        pending = 0
+        txn_started = None
+        stopped = False
+        try:
+            while True:
+                sql, payload = self._queue.get()
+                if sql is _STOP:
+                    stopped = True
+                    if payload:
+                        conn.commit()
+                        if txn_started is not None:
+                            run_metrics.observe('sqlite_transaction_seconds', time.perf_counter() - txn_started)
+                    else:
+                        conn.rollback()
+                    return
+                if not conn.in_transaction:
+                    conn.execute('BEGIN')
+                    txn_started = time.perf_counter()
+                c.executemany(sql, payload)
+                self.rows_written += len(payload)
+                run_metrics.inc('sqlite_rows_written_total', len(payload))
+                pending += len(payload)
+                if pending >= self.rows_per_txn:
+                    conn.commit()
+                    run_metrics.observe('sqlite_transaction_seconds', time.perf_counter() - txn_started)
+                    pending = 0
+                    txn_started = None
+        except BaseException as e:
+            logger.error(f'SQLite writer failed: {e}')
+            logger.error(traceback.format_exc())
+            self._error = e
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            # the close() sentinel may be the job that failed; then nothing is left to drain
+            if not stopped:
+                self._drain()
+        finally:
+            conn.close()
+
+    def _drain(self) -> None:
+        # Keep consuming so producers blocked on a full queue are released;
+        # stop once the close() sentinel arrives.
+        while True:
+            sql, _ = self._queue.get()
+            if sql is _STOP:
+                return